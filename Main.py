@@ -1,33 +1,348 @@
+"""Servidor estático do front-end (páginas, CSS e imagens), sem o Flask
+
+Uso:
+    python Main.py [--porta 8080] [--raiz .] [--sem-navegador] [--log]
+
+- Uma thread por conexão (ThreadingHTTPServer) com keep-alive HTTP/1.1, no
+  máximo ESTATICO_MAX_CONEXOES ao mesmo tempo (as demais esperam na fila do
+  accept); conexão parada por ESTATICO_TIMEOUT segundos é fechada.
+- Arquivos de até ESTATICO_CACHE_ARQUIVO bytes ficam em memória, com as
+  versões comprimidas, até ESTATICO_CACHE_TOTAL bytes (LRU); o cache é
+  invalidado pelo mtime. Arquivos maiores vão direto do disco com sendfile.
+- ETag, If-None-Match, If-Modified-Since e Range (um intervalo por pedido).
+- Se existir arquivo.br/arquivo.gz ao lado do original (como no build de
+  `flask --app app construir-assets`), ele é servido; senão o gzip dos tipos
+  de texto é feito uma única vez, na carga do cache.
+- Arquivos com hash no nome (style.0123456789ab.css) recebem cache imutável.
+
+Como antes, um caminho que não existe é procurado também pelo nome do arquivo
+(/qualquer/coisa/style.css -> style.css) e /landing acha landing.html.
+
+Só o front-end é servido: as três páginas, style.css (com ou sem hash) e o
+que estiver em imagens/ e build/. Com --raiz . a pasta também tem o código,
+o banco e as sessões, que respondem 404.
+"""
+import argparse
+import functools
+import gzip
 import http.server
-import socketserver
-import webbrowser
+import mimetypes
 import os
+import re
+import threading
+import webbrowser
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
+
+CACHE_ARQUIVO = int(os.environ.get('ESTATICO_CACHE_ARQUIVO', 1024 * 1024))
+CACHE_TOTAL = int(os.environ.get('ESTATICO_CACHE_TOTAL', 64 * 1024 * 1024))
+# Limite do mapa URL -> arquivo (o fallback pelo nome do arquivo aceita infinitas URLs)
+MAXIMO_RESOLVIDOS = 10000
+# Segundos sem receber nada antes de fechar a conexão (keep-alive ocioso ou cliente lento)
+TIMEOUT_CONEXAO = float(os.environ.get('ESTATICO_TIMEOUT', 20))
+MAXIMO_CONEXOES = int(os.environ.get('ESTATICO_MAX_CONEXOES', 256))
+
+TIPOS_COMPRIMIVEIS = {'text/html', 'text/css', 'text/javascript', 'text/plain', 'application/javascript',
+                      'application/json', 'image/svg+xml'}
+CACHE_CONTROL_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL_REVALIDAR = 'no-cache'
+NOME_COM_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+FAIXA = re.compile(r'bytes=(\d*)-(\d*)$')
+
+# Arquivos públicos na raiz e diretórios servidos por inteiro (caminhos relativos à raiz)
+ARQUIVO_PUBLICO = re.compile(r'(index|landing|avaliacao-geral)(\.[0-9a-f]{12})?\.html|style(\.[0-9a-f]{12})?\.css')
+DIRETORIOS_PUBLICOS = ('imagens', 'build')
+# Nunca servidos, nem dentro dos diretórios públicos
+ARQUIVO_PROIBIDO = re.compile(r'\.(py|pyc|db)(-\w+)?$')
+
+def publico(relativo):
+    """Se o caminho (relativo à raiz, já normalizado) faz parte do front-end"""
+    partes = relativo.split(os.sep)
+    if ARQUIVO_PROIBIDO.search(partes[-1]):
+        return False
+    if len(partes) == 1:
+        return ARQUIVO_PUBLICO.fullmatch(partes[0]) is not None
+    return partes[0] in DIRETORIOS_PUBLICOS
+
+class Arquivo:
+    """Entrada do cache: metadados e conteúdos por codificação (None = original; ausente = ler do disco)"""
+    __slots__ = ('caminho', 'mtime_ns', 'tamanho', 'tipo', 'etag', 'ultima_modificacao', 'cache_control',
+                 'conteudos', 'bytes_em_memoria')
+
+    def __init__(self, caminho, estado):
+        self.caminho = caminho
+        self.mtime_ns = estado.st_mtime_ns
+        self.tamanho = estado.st_size
+        self.tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+        if self.tipo.startswith('text/'):
+            self.tipo += '; charset=utf-8'
+        self.etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+        self.ultima_modificacao = formatdate(estado.st_mtime, usegmt=True)
+        self.cache_control = CACHE_CONTROL_IMUTAVEL if NOME_COM_HASH.search(caminho) else CACHE_CONTROL_REVALIDAR
+        self.conteudos = {}
+        if estado.st_size <= CACHE_ARQUIVO:
+            self.carregar_conteudos(estado)
+        self.bytes_em_memoria = sum(len(conteudo) for conteudo in self.conteudos.values())
+
+    def carregar_conteudos(self, estado):
+        with open(self.caminho, 'rb') as arquivo:
+            original = arquivo.read()
+        self.conteudos[None] = original
+        for codificacao, sufixo in (('br', '.br'), ('gzip', '.gz')):
+            try:
+                variante = os.stat(self.caminho + sufixo)
+            except FileNotFoundError:
+                continue
+            # Variante mais velha que o original está desatualizada
+            if variante.st_mtime_ns >= estado.st_mtime_ns:
+                with open(self.caminho + sufixo, 'rb') as arquivo:
+                    self.conteudos[codificacao] = arquivo.read()
+        if 'gzip' not in self.conteudos and self.tipo.split(';')[0] in TIPOS_COMPRIMIVEIS:
+            comprimido = gzip.compress(original, 6, mtime=0)
+            if len(comprimido) < len(original):
+                self.conteudos['gzip'] = comprimido
+
+class CacheArquivos:
+    """Arquivos em memória (LRU por bytes), revalidados pelo mtime a cada acesso"""
+
+    def __init__(self, limite_total=CACHE_TOTAL):
+        self.limite_total = limite_total
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obter(self, caminho):
+        """Arquivo atualizado; FileNotFoundError se ele sumiu"""
+        estado = os.stat(caminho)
+        with self._lock:
+            item = self._itens.get(caminho)
+            if item is not None and item.mtime_ns == estado.st_mtime_ns and item.tamanho == estado.st_size:
+                self._itens.move_to_end(caminho)
+                return item
+
+        item = Arquivo(caminho, estado)
+        with self._lock:
+            anterior = self._itens.pop(caminho, None)
+            if anterior is not None:
+                self._bytes -= anterior.bytes_em_memoria
+            self._itens[caminho] = item
+            self._bytes += item.bytes_em_memoria
+            while self._bytes > self.limite_total and len(self._itens) > 1:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= removido.bytes_em_memoria
+        return item
+
+@functools.lru_cache(maxsize=64)
+def codificacoes_aceitas(accept_encoding):
+    """Codificações com q > 0 no Accept-Encoding (os clientes repetem poucos valores)"""
+    aceitas = set()
+    for parte in accept_encoding.split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        q = 1.0
+        if parametros.strip().startswith('q='):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            aceitas.add(nome.strip().lower())
+    return frozenset(aceitas)
+
+def interpretar_faixa(cabecalho, tamanho):
+    """(inicio, fim) inclusivos de um Range de um só intervalo; None para ignorar, False se insatisfazível"""
+    faixa = FAIXA.match(cabecalho.replace(' ', ''))
+    if not faixa or not any(faixa.groups()):
+        return None
+    inicio, fim = faixa.groups()
+    if not inicio:
+        # bytes=-N: os últimos N bytes
+        if int(fim) == 0:
+            return False
+        return max(0, tamanho - int(fim)), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+class ManipuladorEstatico(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'NETENDENCIA-estatico'
+    timeout = TIMEOUT_CONEXAO
+    # Cabeçalho e corpo saem em writes separados: com Nagle o segundo espera o ACK atrasado do cliente
+    disable_nagle_algorithm = True
 
-class MyHttpRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
-        # Serve o arquivo index.html para todas as rotas
-        if self.path != '/':
-            self.path = '/' + self.path.split('/')[-1]
-        return http.server.SimpleHTTPRequestHandler.do_GET(self)
+        self.responder(enviar_corpo=True)
+
+    def do_HEAD(self):
+        self.responder(enviar_corpo=False)
+
+    def log_message(self, formato, *args):
+        if self.server.log:
+            super().log_message(formato, *args)
+
+    def resolver(self):
+        """Caminho no disco para a URL, ou None (nunca fora da raiz nem fora do front-end)"""
+        caminho = unquote(urlsplit(self.path).path)
+        resolvido = self.server.resolvidos.get(caminho)
+        if resolvido is not None:
+            return resolvido
+
+        relativo = os.path.normpath((caminho + ('index.html' if caminho.endswith('/') else '')).lstrip('/'))
+        # Nada fora da raiz nem arquivos ocultos (.git, .env...)
+        if relativo.startswith('..') or os.path.isabs(relativo) or any(
+                parte.startswith('.') for parte in relativo.split(os.sep)):
+            return None
+        for candidato in (relativo, relativo + '.html', os.path.basename(relativo)):
+            if not publico(candidato):
+                continue
+            completo = os.path.join(self.server.raiz, candidato)
+            if os.path.isfile(completo):
+                if len(self.server.resolvidos) >= MAXIMO_RESOLVIDOS:
+                    self.server.resolvidos.clear()
+                self.server.resolvidos[caminho] = completo
+                return completo
+        return None
+
+    def nao_modificado(self, etag, item):
+        se_nenhum = self.headers.get('If-None-Match')
+        if se_nenhum is not None:
+            etags = {valor.strip().removeprefix('W/') for valor in se_nenhum.split(',')}
+            return '*' in etags or etag in etags
+        se_modificado = self.headers.get('If-Modified-Since')
+        if se_modificado:
+            try:
+                return item.mtime_ns // 1_000_000_000 <= int(parsedate_to_datetime(se_modificado).timestamp())
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def responder(self, enviar_corpo):
+        caminho = self.resolver()
+        item = None
+        if caminho is not None:
+            try:
+                item = self.server.cache.obter(caminho)
+            except FileNotFoundError:
+                self.server.resolvidos.pop(unquote(urlsplit(self.path).path), None)
+        if item is None:
+            self.send_error(404, 'Arquivo não encontrado')
+            return
+
+        faixa = self.headers.get('Range')
+        se_faixa = self.headers.get('If-Range')
+        if faixa and se_faixa and se_faixa not in (item.etag, item.ultima_modificacao):
+            faixa = None
+
+        # Pedidos de intervalo recebem sempre o original (os deslocamentos são dele)
+        codificacao = None
+        if not faixa and len(item.conteudos) > 1:
+            aceitas = codificacoes_aceitas(self.headers.get('Accept-Encoding', ''))
+            codificacao = next((c for c in ('br', 'gzip') if c in item.conteudos and c in aceitas), None)
+        etag = f'{item.etag[:-1]}-{codificacao}"' if codificacao else item.etag
+
+        cabecalhos = [('ETag', etag), ('Last-Modified', item.ultima_modificacao),
+                      ('Cache-Control', item.cache_control)]
+        if len(item.conteudos) > 1:
+            cabecalhos.append(('Vary', 'Accept-Encoding'))
+
+        if self.nao_modificado(etag, item):
+            self.send_response(304)
+            for nome, valor in cabecalhos:
+                self.send_header(nome, valor)
+            self.end_headers()
+            return
+
+        conteudo = item.conteudos.get(codificacao)
+        tamanho = len(conteudo) if conteudo is not None else item.tamanho
+        inicio, fim = 0, tamanho - 1
+        status = 200
+        if faixa:
+            intervalo = interpretar_faixa(faixa, tamanho)
+            if intervalo is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{tamanho}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if intervalo:
+                status = 206
+                inicio, fim = intervalo
+                cabecalhos.append(('Content-Range', f'bytes {inicio}-{fim}/{tamanho}'))
+
+        self.send_response(status)
+        self.send_header('Content-Type', item.tipo)
+        self.send_header('Content-Length', str(fim - inicio + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if codificacao:
+            self.send_header('Content-Encoding', codificacao)
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.end_headers()
+
+        if not enviar_corpo or fim < inicio:
+            return
+        if conteudo is not None:
+            self.wfile.write(memoryview(conteudo)[inicio:fim + 1])
+        else:
+            with open(item.caminho, 'rb') as arquivo:
+                self.connection.sendfile(arquivo, inicio, fim - inicio + 1)
+
+class ServidorEstatico(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, endereco, raiz, log=False):
+        self.raiz = os.path.abspath(raiz)
+        self.log = log
+        self.cache = CacheArquivos()
+        # URL -> arquivo já encontrado (só acertos: arquivos novos continuam sendo achados)
+        self.resolvidos = {}
+        # Uma vaga por conexão atendida; sem vaga, o accept espera (o timeout libera as ociosas)
+        self.vagas = threading.BoundedSemaphore(MAXIMO_CONEXOES)
+        super().__init__(endereco, ManipuladorEstatico)
+
+    def process_request(self, request, client_address):
+        self.vagas.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self.vagas.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.vagas.release()
 
 def main():
-    PORT = 8080
-    
+    parser = argparse.ArgumentParser(description='Servidor estático do front-end do NETENDENCIA')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--host', default='')
+    parser.add_argument('--raiz', default='.', help='Diretório servido (padrão: o atual)')
+    parser.add_argument('--sem-navegador', action='store_true', help='Não abre o navegador')
+    parser.add_argument('--log', action='store_true', help='Registra cada requisição no stderr')
+    args = parser.parse_args()
+
     # Verifica se os arquivos existem
-    if not os.path.exists('index.html'):
+    if not os.path.exists(os.path.join(args.raiz, 'index.html')):
         print("Erro: arquivo index.html não encontrado!")
         return
-    
+
     # Configura o servidor
-    with socketserver.TCPServer(("", PORT), MyHttpRequestHandler) as httpd:
-        print(f" Servidor rodando em http://localhost:{PORT}")
-        print("📱 Abrindo no navegador...")
-        webbrowser.open(f'http://localhost:{PORT}')
-        
+    with ServidorEstatico((args.host, args.porta), args.raiz, log=args.log) as httpd:
+        print(f" Servidor rodando em http://localhost:{args.porta}")
+        if not args.sem_navegador:
+            print("📱 Abrindo no navegador...")
+            webbrowser.open(f'http://localhost:{args.porta}')
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print(" Servidor encerrado!")
 
-if _name_ == "_main_":
-    main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
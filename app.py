@@ -1,57 +1,2241 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, has_request_context
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from datetime import date, datetime, timedelta
+import atexit
+import base64
+import bisect
+import click
+import contextvars
+import csv
+import functools
+import glob
+import gzip
+import hashlib
+import hmac
+import io
 import json
+import logging
+import logging.handlers
+import math
+import mimetypes
+import queue
 import random
+import re
+import secrets
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import os
+import select
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from types import MappingProxyType
+from werkzeug.datastructures import LanguageAccept
+from werkzeug.http import parse_accept_header
 
 app = Flask(__name__)
-app.secret_key = 'neteNDENCIA_secret_key_2025'
-app.config['TEMPLATES_AUTO_RELOAD'] = True
+app.secret_key = os.environ.get('SECRET_KEY', 'neteNDENCIA_secret_key_2025')
+# Sem valor explícito o Jinja só verifica os arquivos a cada render no modo debug
+if os.environ.get('TEMPLATES_AUTO_RELOAD'):
+    app.config['TEMPLATES_AUTO_RELOAD'] = os.environ['TEMPLATES_AUTO_RELOAD'] == '1'
+
+# ========== LOGS ESTRUTURADOS ==========
+
+LOG_CONFIG = {
+    'nivel': os.environ.get('LOG_NIVEL', 'INFO').upper(),
+    # json ou texto; no terminal o padrão é texto
+    'formato': os.environ.get('LOG_FORMATO', 'texto' if sys.stdout.isatty() else 'json'),
+    'arquivo': os.environ.get('LOG_ARQUIVO'),                   # vazio = stdout
+    'amostra_debug': int(os.environ.get('LOG_AMOSTRA_DEBUG', 100)),
+    'fila_max': int(os.environ.get('LOG_FILA_MAX', 10000))
+}
+
+# Atributos padrão do LogRecord; o resto veio de extra= e vira campo do JSON
+CAMPOS_PADRAO_LOG = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'amostra'}
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro: instante, nível, mensagem, processo e campos de extra="""
+
+    def format(self, record):
+        registro = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process
+        }
+        for chave, valor in vars(record).items():
+            if chave not in CAMPOS_PADRAO_LOG:
+                registro[chave] = valor
+        if getattr(record, 'amostra', 1) > 1:
+            registro['amostra'] = record.amostra
+        if record.exc_text:
+            registro['excecao'] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+class FormatadorTexto(logging.Formatter):
+    """Formato de desenvolvimento, com os emojis de sempre por nível"""
+
+    EMOJIS = {'DEBUG': '🔍', 'INFO': '✅', 'WARNING': '⚠️', 'ERROR': '❌', 'CRITICAL': '🔥'}
+
+    def format(self, record):
+        campos = {chave: valor for chave, valor in vars(record).items() if chave not in CAMPOS_PADRAO_LOG}
+        linha = f"{self.EMOJIS.get(record.levelname, '')} {record.getMessage()}"
+        if campos:
+            linha += ' ' + ' '.join(f'{chave}={valor}' for chave, valor in campos.items())
+        if record.exc_text:
+            linha += '\n' + record.exc_text
+        return linha
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar 1 de cada N registros DEBUG de um mesmo evento (mesmo texto de mensagem)"""
+
+    def __init__(self, taxa):
+        super().__init__()
+        self.taxa = max(1, taxa)
+        self._contadores = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.taxa == 1:
+            return True
+        contador = self._contadores.get(record.msg, 0)
+        self._contadores[record.msg] = contador + 1
+        record.amostra = self.taxa
+        return contador % self.taxa == 0
+
+class FilaLogsSemBloqueio(logging.handlers.QueueHandler):
+    """Enfileira sem esperar: com a fila cheia o registro é descartado e contado"""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Só junta a mensagem; serializar e escrever fica com a thread do QueueListener.
+        # Este é o único handler do logger, então o registro pode ser alterado no lugar.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+class OuvinteFilaLogs(logging.handlers.QueueListener):
+    """QueueListener que, ao encerrar, espera vaga na fila para o sentinela em vez de falhar"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+logger = logging.getLogger('netendencia')
+
+def configurar_logs(config=LOG_CONFIG):
+    """Logger 'netendencia' -> fila em memória -> thread que formata e escreve (stdout ou arquivo)"""
+    if getattr(configurar_logs, 'listener', None):
+        return configurar_logs.listener
+    
+    destino = logging.FileHandler(config['arquivo'], encoding='utf-8') if config['arquivo'] else logging.StreamHandler(sys.stdout)
+    destino.setFormatter(FormatadorTexto() if config['formato'] == 'texto' else FormatadorJSON())
+    
+    # Linha/arquivo de origem e nome da thread não vão para o registro: dispensa o custo de coletá-los
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+    
+    fila = FilaLogsSemBloqueio(queue.Queue(maxsize=config['fila_max']))
+    fila.addFilter(FiltroAmostragem(config['amostra_debug']))
+    logger.addHandler(fila)
+    logger.setLevel(config['nivel'])
+    logger.propagate = False
+    
+    listener = OuvinteFilaLogs(fila.queue, destino)
+    listener.start()
+    atexit.register(listener.stop)
+    configurar_logs.fila = fila
+    configurar_logs.listener = listener
+    return listener
+
+configurar_logs()
+
+# ========== MÉTRICAS E INSTRUMENTAÇÃO ==========
+
+METRICAS_CONFIG = {
+    'consulta_lenta': float(os.environ.get('METRICAS_CONSULTA_LENTA_MS', 200)) / 1000,
+    'max_consultas': int(os.environ.get('METRICAS_MAX_CONSULTAS', 500)),
+    # Com vários workers cada um grava seu estado aqui e /metrics soma todos
+    'diretorio': os.environ.get('METRICAS_DIR'),
+    'intervalo_gravacao': float(os.environ.get('METRICAS_INTERVALO_GRAVACAO', 5))
+}
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 500, 1000)
+
+# [quantidade de consultas, segundos no banco] da requisição em andamento
+consultas_requisicao = contextvars.ContextVar('consultas_requisicao', default=None)
+
+# Consultas maiores (execute_values com muitas linhas interpoladas) não entram no cache:
+# a chave seria o texto inteiro, com todos os valores
+TAMANHO_MAXIMO_CONSULTA_CACHE = 4096
+
+def normalizar_consulta(sql):
+    """Texto da consulta sem valores literais nem espaços repetidos, para agrupar execuções"""
+    if len(sql) > TAMANHO_MAXIMO_CONSULTA_CACHE:
+        return _normalizar_consulta(sql)
+    return _normalizar_consulta_em_cache(sql)
+
+def _normalizar_consulta(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = re.sub(r"'(?:''|[^'])*'", '?', sql)
+    sql = re.sub(r'%\(\w+\)s|%s|\$\d+|\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    # Listas de valores (IN, VALUES em lote) viram uma só
+    sql = re.sub(r'\(\?(?:, ?\?)+\)', '(?, ...)', sql)
+    sql = re.sub(r'(\(\?(?:, \.\.\.)?\))(?:, ?\(\?(?:, \.\.\.)?\))+', r'\1, ...', sql)
+    return sql[:500]
+
+_normalizar_consulta_em_cache = functools.lru_cache(maxsize=2048)(_normalizar_consulta)
+
+def novo_histograma(buckets):
+    return {'buckets': [0] * (len(buckets) + 1), 'soma': 0.0, 'total': 0}
+
+def observar(histograma, limites, valor):
+    histograma['buckets'][bisect.bisect_left(limites, valor)] += 1
+    histograma['soma'] += valor
+    histograma['total'] += 1
+
+class Metricas:
+    """Latência por rota, consultas por requisição e tempo por consulta normalizada (deste processo)"""
+
+    def __init__(self, config=METRICAS_CONFIG):
+        self.config = config
+        self._lock = threading.Lock()
+        self.requisicoes = {}            # (metodo, rota, status) -> histograma de segundos
+        self.consultas_por_requisicao = {}  # (metodo, rota) -> histograma de quantidade
+        self.consultas = {}              # consulta normalizada -> [execuções, segundos]
+        self.consultas_lentas = 0
+        self.lentas_recentes = deque(maxlen=100)
+
+    def registrar_requisicao(self, metodo, rota, status, duracao, consultas):
+        with self._lock:
+            chave = (metodo, rota, str(status))
+            if chave not in self.requisicoes:
+                self.requisicoes[chave] = novo_histograma(BUCKETS_LATENCIA)
+            observar(self.requisicoes[chave], BUCKETS_LATENCIA, duracao)
+            
+            chave = (metodo, rota)
+            if chave not in self.consultas_por_requisicao:
+                self.consultas_por_requisicao[chave] = novo_histograma(BUCKETS_CONSULTAS)
+            observar(self.consultas_por_requisicao[chave], BUCKETS_CONSULTAS, consultas)
+
+    def registrar_consulta(self, sql, duracao):
+        consulta = normalizar_consulta(sql)
+        with self._lock:
+            dados = self.consultas.get(consulta)
+            if dados is None:
+                if len(self.consultas) >= self.config['max_consultas']:
+                    consulta = '(outras consultas)'
+                dados = self.consultas.setdefault(consulta, [0, 0.0])
+            dados[0] += 1
+            dados[1] += duracao
+        
+        contadores = consultas_requisicao.get()
+        if contadores is not None:
+            contadores[0] += 1
+            contadores[1] += duracao
+        
+        if duracao >= self.config['consulta_lenta']:
+            rota = request.path if has_request_context() else None
+            with self._lock:
+                self.consultas_lentas += 1
+                self.lentas_recentes.append({'consulta': consulta, 'duracao_ms': round(duracao * 1000, 1),
+                                             'rota': rota, 'quando': datetime.now().isoformat()})
+            logger.warning('Consulta lenta', extra={'consulta': consulta, 'duracao_ms': round(duracao * 1000, 1),
+                                                    'rota': rota})
+
+    def estado(self):
+        """Cópia serializável em JSON (para somar os estados de vários workers)"""
+        with self._lock:
+            return {
+                'requisicoes': [[list(chave), dict(h, buckets=list(h['buckets']))] for chave, h in self.requisicoes.items()],
+                'consultas_por_requisicao': [[list(chave), dict(h, buckets=list(h['buckets']))]
+                                             for chave, h in self.consultas_por_requisicao.items()],
+                'consultas': [[consulta, list(dados)] for consulta, dados in self.consultas.items()],
+                'consultas_lentas': self.consultas_lentas
+            }
+
+    def gravar(self):
+        diretorio = self.config['diretorio']
+        caminho = os.path.join(diretorio, f'{os.getpid()}.json')
+        with open(caminho + '.tmp', 'w') as arquivo:
+            json.dump(self.estado(), arquivo)
+        os.replace(caminho + '.tmp', caminho)
+
+    def estados(self):
+        """Estado deste processo, ou de todos os workers quando há METRICAS_DIR"""
+        if not self.config['diretorio']:
+            return [self.estado()]
+        self.gravar()
+        estados = []
+        for caminho in glob.glob(os.path.join(self.config['diretorio'], '*.json')):
+            try:
+                with open(caminho) as arquivo:
+                    estados.append(json.load(arquivo))
+            except (OSError, ValueError):
+                continue
+        return estados
+
+    def iniciar_gravacao_periodica(self):
+        if not self.config['diretorio']:
+            return None
+        os.makedirs(self.config['diretorio'], exist_ok=True)
+        
+        def executar():
+            while True:
+                time.sleep(self.config['intervalo_gravacao'])
+                try:
+                    self.gravar()
+                except OSError:
+                    logger.exception('Erro ao gravar as métricas do worker')
+        
+        thread = threading.Thread(target=executar, name='gravacao-metricas', daemon=True)
+        thread.start()
+        return thread
+
+metricas = Metricas()
+
+def somar_histogramas(estados, campo):
+    somados = {}
+    for estado in estados:
+        for chave, histograma in estado[campo]:
+            chave = tuple(chave)
+            if chave not in somados:
+                somados[chave] = {'buckets': [0] * len(histograma['buckets']), 'soma': 0.0, 'total': 0}
+            destino = somados[chave]
+            destino['buckets'] = [a + b for a, b in zip(destino['buckets'], histograma['buckets'])]
+            destino['soma'] += histograma['soma']
+            destino['total'] += histograma['total']
+    return somados
+
+def rotulos_prometheus(**rotulos):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in rotulos.items())
+
+def linhas_histograma(nome, ajuda, limites, somados, nomes_rotulos):
+    linhas = [f'# HELP {nome} {ajuda}', f'# TYPE {nome} histogram']
+    for chave, histograma in sorted(somados.items()):
+        rotulos = dict(zip(nomes_rotulos, chave))
+        acumulado = 0
+        for limite, quantidade in zip(list(limites) + ['+Inf'], histograma['buckets']):
+            acumulado += quantidade
+            linhas.append(f'{nome}_bucket{{{rotulos_prometheus(**rotulos, le=limite)}}} {acumulado}')
+        linhas.append(f'{nome}_sum{{{rotulos_prometheus(**rotulos)}}} {histograma["soma"]}')
+        linhas.append(f'{nome}_count{{{rotulos_prometheus(**rotulos)}}} {histograma["total"]}')
+    return linhas
+
+def exportar_prometheus(estados):
+    """Formato de exposição em texto do Prometheus (0.0.4)"""
+    linhas = linhas_histograma('netendencia_http_requisicao_segundos', 'Latência das requisições por rota',
+                               BUCKETS_LATENCIA, somar_histogramas(estados, 'requisicoes'),
+                               ('metodo', 'rota', 'status'))
+    linhas += linhas_histograma('netendencia_http_consultas_por_requisicao',
+                                'Consultas ao banco executadas por requisição',
+                                BUCKETS_CONSULTAS, somar_histogramas(estados, 'consultas_por_requisicao'),
+                                ('metodo', 'rota'))
+    
+    consultas = {}
+    for estado in estados:
+        for consulta, (execucoes, segundos) in estado['consultas']:
+            dados = consultas.setdefault(consulta, [0, 0.0])
+            dados[0] += execucoes
+            dados[1] += segundos
+    linhas += ['# HELP netendencia_db_consultas_total Execuções por consulta normalizada',
+               '# TYPE netendencia_db_consultas_total counter']
+    linhas += [f'netendencia_db_consultas_total{{{rotulos_prometheus(consulta=consulta)}}} {dados[0]}'
+               for consulta, dados in sorted(consultas.items())]
+    linhas += ['# HELP netendencia_db_consulta_segundos_total Tempo total por consulta normalizada',
+               '# TYPE netendencia_db_consulta_segundos_total counter']
+    linhas += [f'netendencia_db_consulta_segundos_total{{{rotulos_prometheus(consulta=consulta)}}} {dados[1]}'
+               for consulta, dados in sorted(consultas.items())]
+    linhas += ['# HELP netendencia_db_consultas_lentas_total Consultas acima de METRICAS_CONSULTA_LENTA_MS',
+               '# TYPE netendencia_db_consultas_lentas_total counter',
+               f'netendencia_db_consultas_lentas_total {sum(estado["consultas_lentas"] for estado in estados)}']
+    return '\n'.join(linhas) + '\n'
+
+class CursorInstrumentado:
+    """Mixin de cursor (psycopg2 ou CursorSQLite) que mede cada execute/executemany"""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metricas.registrar_consulta(query, time.perf_counter() - inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metricas.registrar_consulta(query, time.perf_counter() - inicio)
+
+class CursorDictInstrumentado(CursorInstrumentado, RealDictCursor):
+    pass
+
+class CursorTuplasInstrumentado(CursorInstrumentado, psycopg2.extensions.cursor):
+    pass
+
+@app.before_request
+def iniciar_medicao_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+    consultas_requisicao.set([0, 0.0])
+
+@app.after_request
+def registrar_medicao_requisicao(response):
+    inicio = g.get('inicio_requisicao')
+    contadores = consultas_requisicao.get()
+    if inicio is None or contadores is None:
+        return response
+    
+    duracao = time.perf_counter() - inicio
+    rota = request.url_rule.rule if request.url_rule else '(sem rota)'
+    metricas.registrar_requisicao(request.method, rota, response.status_code, duracao, contadores[0])
+    response.headers['Server-Timing'] = (f'db;dur={contadores[1] * 1000:.1f};desc="{contadores[0]} consultas", '
+                                         f'total;dur={duracao * 1000:.1f}')
+    return response
+
+@app.teardown_request
+def encerrar_medicao_requisicao(erro=None):
+    consultas_requisicao.set(None)
 
 # ========== CONFIGURAÇÃO DO BANCO DE DADOS POSTGRESQL AWS ==========
 
+DB_CONFIG = {
+    'host': 'netendencia.c09gmwigavdx.us-east-1.rds.amazonaws.com',
+    'database': 'dbnetendencia',
+    'user': 'postgres',
+    'password': 'netendencia1',
+    'port': '5432',
+    'connect_timeout': 10
+}
+
+POOL_CONFIG = {
+    'min_conexoes': int(os.environ.get('DB_POOL_MIN', 2)),
+    'max_conexoes': int(os.environ.get('DB_POOL_MAX', 20)),
+    'timeout_espera': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    'tempo_max_vida': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    'tempo_max_ocioso': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    'verificar_apos': float(os.environ.get('DB_POOL_CHECK_AFTER', 30))
+}
+
+# ========== BACKENDS DE ARMAZENAMENTO ==========
+
+# postgres (servidor remoto, padrão) ou sqlite (arquivo local, para instalações de um só nó)
+BANCO = os.environ.get('NETENDENCIA_BANCO', 'postgres')
+
+SQLITE_CAMINHO = os.environ.get('SQLITE_CAMINHO',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neteNDENCIA.db'))
+SQLITE_CONFIG = {
+    'mmap_bytes': int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)),
+    'cache_kib': int(os.environ.get('SQLITE_CACHE_KIB', 64 * 1024)),
+    'espera_lock': float(os.environ.get('SQLITE_ESPERA_LOCK', 5)),
+    # Comandos preparados mantidos por conexão e reaproveitados pelo texto do SQL
+    'comandos_preparados': int(os.environ.get('SQLITE_COMANDOS_PREPARADOS', 256))
+}
+
+class BackendPostgres:
+    """Conexões psycopg2 com o PostgreSQL (DB_CONFIG)
+    
+    Também concentra o que muda de um dialeto de SQL para o outro (DDL, EXPLAIN,
+    INSERT de várias linhas), para as funções do app não dependerem do banco."""
+
+    nome = 'postgres'
+    rotulo = 'PostgreSQL AWS'
+    erro = psycopg2.Error
+    erros_conexao = (psycopg2.OperationalError, psycopg2.InterfaceError)
+    # LISTEN/NOTIFY para sincronizar vários workers
+    eventos_entre_processos = True
+    # INSERT/UPDATE/DELETE dentro de WITH (vários passos num comando só)
+    escrita_em_cte = True
+    cursor_tuplas = CursorTuplasInstrumentado
+    chave_serial = 'SERIAL PRIMARY KEY'
+
+    def conectar(self, db_config):
+        conn = psycopg2.connect(**db_config)
+        conn.cursor_factory = CursorDictInstrumentado
+        return conn
+
+    def em_transacao(self, conn):
+        return conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def descrever(self, db_config):
+        """Campos extras do log de conexão"""
+        return {}
+
+    # ----- Esquema e migrações -----
+
+    def criar_tabelas_principais(self, cursor):
+        """As tabelas principais já existem no servidor"""
+
+    def adicionar_coluna(self, cursor, tabela, coluna, tipo):
+        cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS {coluna} {tipo}')
+
+    def colunas_indice(self, chave, incluidas=()):
+        """Colunas de um índice que cobre também as incluídas (fora da chave, com INCLUDE)"""
+        colunas = f"({', '.join(chave)})"
+        return colunas + (f" INCLUDE ({', '.join(incluidas)})" if incluidas else '')
+
+    def indice_na_coluna(self, cursor, tabela, coluna):
+        """Nome de um índice existente cuja primeira coluna é esta (ou None)"""
+        cursor.execute('''
+            SELECT i.relname as nome
+            FROM pg_index x
+            JOIN pg_class t ON t.oid = x.indrelid
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = x.indkey[0]
+            WHERE t.oid = to_regclass(%s) AND a.attname = %s
+            LIMIT 1
+        ''', (tabela, coluna))
+        indice = cursor.fetchone()
+        return indice['nome'] if indice else None
+
+    def analisar(self, cursor, tabela):
+        cursor.execute(f'ANALYZE {tabela}')
+
+    def travar_migracoes(self, cursor):
+        """Abre a transação da migração com exclusividade entre processos"""
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (CHAVE_LOCK_MIGRACOES,))
+
+    # ----- Planos -----
+
+    def forcar_indices(self, cursor):
+        """Desliga a varredura sequencial até o fim da transação"""
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def varreduras_completas(self, cursor, sql, parametros):
+        """Tabelas (ou aliases) lidas por varredura completa no plano da consulta"""
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, parametros)
+        varreduras = set()
+        pendentes = [cursor.fetchone()['QUERY PLAN'][0]['Plan']]
+        while pendentes:
+            no = pendentes.pop()
+            if no['Node Type'] == 'Seq Scan':
+                varreduras.update({no['Relation Name'], no.get('Alias', no['Relation Name'])})
+            pendentes.extend(no.get('Plans', []))
+        return varreduras
+
+    # ----- Expressões -----
+
+    def agregar_objetos_json(self, campos):
+        """Expressão de agregação: lista JSON com um objeto {nome: expressão} por linha"""
+        pares = ', '.join(f"'{nome}', {expressao}" for nome, expressao in campos)
+        return f'json_agg(json_build_object({pares}))'
+
+    def truncar_data(self, unidade, coluna):
+        """Início da semana (segunda-feira), do mês ou do ano da data"""
+        return f"date_trunc('{unidade}', {coluna})::date"
+
+    # ----- Escrita -----
+
+    def inserir_varias(self, cursor, tabela, colunas, registros, retorno='id', depois=None):
+        """INSERT de várias linhas com RETURNING retorno; devolve as linhas novas.
+        
+        depois é um comando que lê as linhas novas como a tabela novos (só as
+        colunas de retorno); aqui ele vai no mesmo comando, num WITH. Quem chama
+        divide lotes muito grandes."""
+        if not registros:
+            return []
+        sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES %s RETURNING {retorno}"
+        if depois:
+            sql = f'WITH novos AS ({sql}), depois AS ({depois}) SELECT * FROM novos'
+        return execute_values(cursor, sql, registros, page_size=len(registros), fetch=True)
+
+MARCADOR_PSYCOPG = re.compile(r'%\((\w+)\)s|%s|%%')
+ANY_PSYCOPG = re.compile(r'=\s*ANY\((%s|%\(\w+\)s)(::\w+\[\])?\)')
+CAST_POSTGRES = re.compile(r'::\w+(\[\])?')
+
+@functools.lru_cache(maxsize=1024)
+def traduzir_sql_sqlite(sql):
+    """SQL no estilo psycopg2 -> sqlite3: %s vira ?, %(nome)s vira :nome, %% vira %,
+    casts ::tipo somem e "= ANY(lista)" vira IN sobre a lista em JSON (json_each)"""
+    sql = ANY_PSYCOPG.sub(r'IN (SELECT value FROM json_each(\1))', sql)
+    sql = CAST_POSTGRES.sub('', sql)
+    
+    def trocar(marcador):
+        if marcador.group(1):
+            return ':' + marcador.group(1)
+        return '?' if marcador.group(0) == '%s' else '%'
+    return MARCADOR_PSYCOPG.sub(trocar, sql)
+
+def adaptar_parametros_sqlite(parametros):
+    """Listas vão como JSON (para o json_each do ANY); o resto o sqlite3 já adapta"""
+    if parametros is None:
+        return ()
+    if isinstance(parametros, dict):
+        return {chave: json.dumps(valor) if isinstance(valor, list) else valor
+                for chave, valor in parametros.items()}
+    return [json.dumps(valor) if isinstance(valor, list) else valor for valor in parametros]
+
+class ColunaSQLite(tuple):
+    """Item de cursor.description com .name, como no psycopg2"""
+
+    @property
+    def name(self):
+        return self[0]
+
+class CursorSQLite:
+    """Cursor com a interface do psycopg2 usada pelo app, sobre o sqlite3; linhas como dicts"""
+
+    tuplas = False
+
+    def __init__(self, conexao, name=None):
+        self.connection = conexao
+        self.itersize = 2000
+        self._cursor = conexao.sqlite.cursor()
+        self._colunas = None
+        self._lidas = None
+
+    def execute(self, query, vars=None):
+        sql = traduzir_sql_sqlite(query)
+        self._cursor.execute(sql, adaptar_parametros_sqlite(vars))
+        self._preparar_leitura(sql)
+
+    def executemany(self, query, vars_list):
+        self._cursor.executemany(traduzir_sql_sqlite(query), [adaptar_parametros_sqlite(v) for v in vars_list])
+        self._colunas = self._lidas = None
+
+    def _preparar_leitura(self, sql):
+        descricao = self._cursor.description
+        self._colunas = [coluna[0] for coluna in descricao] if descricao else None
+        # Um INSERT/UPDATE ... RETURNING só termina (e deixa fazer commit) depois de lido até o fim
+        self._lidas = None
+        if self._colunas and not sql.lstrip().upper().startswith('SELECT'):
+            self._lidas = deque(self._cursor.fetchall())
+
+    def _linha(self, linha):
+        if linha is None or self.tuplas:
+            return linha
+        return dict(zip(self._colunas, linha))
+
+    @property
+    def description(self):
+        descricao = self._cursor.description
+        return [ColunaSQLite(coluna) for coluna in descricao] if descricao else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        if self._lidas is not None:
+            return self._linha(self._lidas.popleft()) if self._lidas else None
+        return self._linha(self._cursor.fetchone())
+
+    def fetchall(self):
+        if self._lidas is not None:
+            linhas, self._lidas = list(self._lidas), deque()
+        else:
+            linhas = self._cursor.fetchall()
+        return linhas if self.tuplas else [dict(zip(self._colunas, linha)) for linha in linhas]
+
+    def __iter__(self):
+        if self._lidas is not None:
+            yield from self.fetchall()
+            return
+        while True:
+            linhas = self._cursor.fetchmany(self.itersize)
+            if not linhas:
+                return
+            for linha in linhas:
+                yield self._linha(linha)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CursorDictSQLiteInstrumentado(CursorInstrumentado, CursorSQLite):
+    pass
+
+class CursorTuplasSQLiteInstrumentado(CursorInstrumentado, CursorSQLite):
+    tuplas = True
+
+class ConexaoSQLite:
+    """Conexão sqlite3 com a parte da interface de conexão do psycopg2 que o pool e as rotas usam"""
+
+    def __init__(self, conn):
+        self.sqlite = conn
+        self.closed = False
+
+    def cursor(self, name=None, cursor_factory=None):
+        return (cursor_factory or CursorDictSQLiteInstrumentado)(self, name)
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.sqlite.rollback()
+
+    def close(self):
+        self.closed = True
+        self.sqlite.close()
+
+# TIMESTAMP volta como datetime, como no psycopg2
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(' '))
+sqlite3.register_converter('TIMESTAMP', lambda valor: datetime.fromisoformat(valor.decode()))
+
+class BackendSQLite:
+    """Banco embutido num arquivo SQLite: sem round-trip de rede, para instalações de um só nó.
+    
+    WAL deixa leitores e o escritor trabalharem ao mesmo tempo; o arquivo é lido por
+    mmap; cada conexão do pool guarda os comandos preparados (cached_statements)."""
+
+    nome = 'sqlite'
+    rotulo = 'SQLite'
+    erro = sqlite3.Error
+    erros_conexao = (sqlite3.InterfaceError, sqlite3.ProgrammingError)
+    eventos_entre_processos = False
+    escrita_em_cte = False
+    cursor_tuplas = CursorTuplasSQLiteInstrumentado
+    chave_serial = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    # Limite de parâmetros por comando (SQLITE_MAX_VARIABLE_NUMBER desde a 3.32)
+    max_parametros = 32766
+
+    def __init__(self, mmap_bytes, cache_kib, espera_lock, comandos_preparados):
+        self.mmap_bytes = mmap_bytes
+        self.cache_kib = cache_kib
+        self.espera_lock = espera_lock
+        self.comandos_preparados = comandos_preparados
+
+    def conectar(self, db_config):
+        conn = sqlite3.connect(db_config['database'], timeout=self.espera_lock, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=self.comandos_preparados)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_bytes)}')
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_kib)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return ConexaoSQLite(conn)
+
+    def em_transacao(self, conn):
+        return conn.sqlite.in_transaction
+
+    def descrever(self, db_config):
+        return {'arquivo': db_config['database']}
+
+    # ----- Esquema e migrações -----
+
+    def criar_tabelas_principais(self, cursor):
+        """O arquivo é do próprio app: as tabelas principais são criadas aqui
+        (as do neteNDENCIA.db, mais instituições e profissionais)"""
+        for comando in TABELAS_SQLITE.split(';'):
+            cursor.execute(comando)
+        # O neteNDENCIA.db distribuído é anterior ao plano de ação
+        self.adicionar_coluna(cursor, 'usuarios', 'plano_acao', 'TEXT')
+
+    def adicionar_coluna(self, cursor, tabela, coluna, tipo):
+        """ALTER TABLE ADD COLUMN IF NOT EXISTS, que o SQLite não tem"""
+        cursor.execute(f'PRAGMA table_info({tabela})')
+        if coluna not in {existente['name'] for existente in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}')
+
+    def colunas_indice(self, chave, incluidas=()):
+        """Sem INCLUDE: as colunas incluídas vão no fim da chave"""
+        return f"({', '.join((*chave, *incluidas))})"
+
+    def indice_na_coluna(self, cursor, tabela, coluna):
+        cursor.execute(f'PRAGMA index_list({tabela})')
+        for indice in cursor.fetchall():
+            cursor.execute(f"PRAGMA index_info('{indice['name']}')")
+            colunas = sorted(cursor.fetchall(), key=lambda c: c['seqno'])
+            if colunas and colunas[0]['name'] == coluna:
+                return indice['name']
+        return None
+
+    def analisar(self, cursor, tabela):
+        # O arquivo é local e pequeno: estatísticas de todas as tabelas
+        cursor.execute('ANALYZE')
+
+    def travar_migracoes(self, cursor):
+        cursor.execute('BEGIN IMMEDIATE')
+
+    # ----- Planos -----
+
+    def forcar_indices(self, cursor):
+        """Sem ajuste equivalente: com as estatísticas do ANALYZE o SQLite pode
+        preferir varrer tabelas muito pequenas"""
+
+    def varreduras_completas(self, cursor, sql, parametros):
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parametros)
+        # "SCAN x" é varredura completa (da tabela ou de um índice inteiro); "SEARCH x" usa índice
+        return {linha['detail'].split()[1] for linha in cursor.fetchall() if linha['detail'].startswith('SCAN ')}
+
+    # ----- Expressões -----
+
+    def agregar_objetos_json(self, campos):
+        """Como no PostgreSQL, mas a lista volta como texto JSON"""
+        pares = ', '.join(f"'{nome}', {expressao}" for nome, expressao in campos)
+        return f'json_group_array(json_object({pares}))'
+
+    def truncar_data(self, unidade, coluna):
+        # %% porque o SQL ainda passa por traduzir_sql_sqlite
+        return {
+            'week': f"date({coluna}, 'weekday 0', '-6 days')",
+            'month': f"strftime('%%Y-%%m-01', {coluna})",
+            'year': f"strftime('%%Y-01-01', {coluna})",
+        }[unidade]
+
+    # ----- Escrita -----
+
+    def inserir_varias(self, cursor, tabela, colunas, registros, retorno='id', depois=None):
+        """Sem INSERT dentro de WITH: comandos de várias linhas (até max_parametros cada)
+        e depois um comando à parte, com novos lido da tabela pelos ids (retorno inclui id)"""
+        linhas = []
+        por_comando = max(1, self.max_parametros // len(colunas))
+        marcadores = '(' + ', '.join(['%s'] * len(colunas)) + ')'
+        for inicio in range(0, len(registros), por_comando):
+            parte = registros[inicio:inicio + por_comando]
+            cursor.execute(f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+                           f"VALUES {', '.join([marcadores] * len(parte))} RETURNING {retorno}",
+                           [valor for registro in parte for valor in registro])
+            linhas.extend(cursor.fetchall())
+        if depois and linhas:
+            cursor.execute(f'WITH novos AS (SELECT * FROM {tabela} WHERE id = ANY(%s)) {depois}',
+                           ([linha['id'] for linha in linhas],))
+        return linhas
+
+def criar_backend(banco=BANCO):
+    if banco == 'sqlite':
+        return BackendSQLite(**SQLITE_CONFIG), {'database': SQLITE_CAMINHO}
+    if banco == 'postgres':
+        return BackendPostgres(), DB_CONFIG
+    raise ValueError(f'NETENDENCIA_BANCO deve ser postgres ou sqlite, não {banco!r}')
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera do pool"""
+
+class PoolConexoes:
+    """Pool de conexões (do backend configurado) com health check, reciclagem e fila de espera"""
+
+    def __init__(self, backend, min_conexoes, max_conexoes, timeout_espera,
+                 tempo_max_vida, tempo_max_ocioso, verificar_apos, **db_config):
+        self.backend = backend
+        self.min_conexoes = min_conexoes
+        self.max_conexoes = max_conexoes
+        self.timeout_espera = timeout_espera
+        self.tempo_max_vida = tempo_max_vida
+        self.tempo_max_ocioso = tempo_max_ocioso
+        self.verificar_apos = verificar_apos
+        self.db_config = db_config
+
+        self._livres = deque()   # (conn, ultimo_uso)
+        self._criadas_em = {}    # id(conn) -> instante de criação
+        self._em_uso = 0
+        self._cond = threading.Condition()
+        self._estatisticas = {
+            'conexoes_criadas': 0,
+            'conexoes_recicladas': 0,
+            'conexoes_quebradas': 0,
+            'checkouts': 0,
+            'esperas': 0,
+            'timeouts_espera': 0,
+            'tempo_espera_total': 0.0
+        }
+
+    def _criar_conexao(self):
+        conn = self.backend.conectar(self.db_config)
+        with self._cond:
+            self._criadas_em[id(conn)] = time.monotonic()
+            self._estatisticas['conexoes_criadas'] += 1
+        return conn
+
+    def _descartar(self, conn):
+        with self._cond:
+            self._criadas_em.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expirada(self, conn, ultimo_uso, agora):
+        criada_em = self._criadas_em.get(id(conn), agora)
+        return (agora - criada_em > self.tempo_max_vida or
+                agora - ultimo_uso > self.tempo_max_ocioso)
+
+    def _saudavel(self, conn, ultimo_uso, agora):
+        if conn.closed:
+            return False
+        # Conexões usadas há pouco não precisam de round-trip extra
+        if agora - ultimo_uso < self.verificar_apos:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except self.backend.erro:
+            return False
+
+    def obter(self):
+        inicio = time.monotonic()
+        prazo = inicio + self.timeout_espera
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._livres:
+                        conn, ultimo_uso = self._livres.pop()
+                        self._em_uso += 1
+                        break
+                    if self._em_uso < self.max_conexoes:
+                        # Reserva a vaga antes de conectar para não ultrapassar o máximo
+                        self._em_uso += 1
+                        break
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self._estatisticas['timeouts_espera'] += 1
+                        raise PoolEsgotadoError(
+                            f'Nenhuma conexão livre após {self.timeout_espera}s '
+                            f'({self.max_conexoes} em uso)')
+                    self._estatisticas['esperas'] += 1
+                    self._cond.wait(restante)
+
+            # Validação e conexão ficam fora do lock para não travar a fila
+            try:
+                if conn is None:
+                    conn = self._criar_conexao()
+                else:
+                    agora = time.monotonic()
+                    if self._expirada(conn, ultimo_uso, agora):
+                        self._liberar_vaga(conn, 'conexoes_recicladas')
+                        continue
+                    if not self._saudavel(conn, ultimo_uso, agora):
+                        self._liberar_vaga(conn, 'conexoes_quebradas')
+                        continue
+            except Exception:
+                self._liberar_vaga(conn, None)
+                raise
+
+            with self._cond:
+                self._estatisticas['checkouts'] += 1
+                self._estatisticas['tempo_espera_total'] += time.monotonic() - inicio
+            return conn
+
+    def _liberar_vaga(self, conn, motivo):
+        if conn is not None:
+            self._descartar(conn)
+        with self._cond:
+            self._em_uso -= 1
+            if motivo:
+                self._estatisticas[motivo] += 1
+            self._cond.notify()
+
+    def devolver(self, conn, quebrada=False):
+        if not quebrada and not conn.closed:
+            try:
+                # Descarta transações abertas (ex.: rotas que só fazem SELECT)
+                if self.backend.em_transacao(conn):
+                    conn.rollback()
+            except self.backend.erro:
+                quebrada = True
+        else:
+            quebrada = True
+
+        if quebrada:
+            self._liberar_vaga(conn, 'conexoes_quebradas')
+            return
+
+        with self._cond:
+            self._em_uso -= 1
+            self._livres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def preencher(self):
+        """Abre as conexões mínimas do pool"""
+        with self._cond:
+            faltam = self.min_conexoes - len(self._livres) - self._em_uso
+        for _ in range(max(faltam, 0)):
+            conn = self._criar_conexao()
+            with self._cond:
+                self._livres.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def fechar(self):
+        with self._cond:
+            while self._livres:
+                conn, _ = self._livres.pop()
+                self._descartar(conn)
+
+    def estatisticas(self):
+        with self._cond:
+            dados = dict(self._estatisticas)
+            dados.update({
+                'min_conexoes': self.min_conexoes,
+                'max_conexoes': self.max_conexoes,
+                'conexoes_livres': len(self._livres),
+                'conexoes_em_uso': self._em_uso,
+                'tempo_espera_medio': (dados['tempo_espera_total'] / dados['checkouts']
+                                       if dados['checkouts'] else 0.0)
+            })
+        return dados
+
+backend_padrao, db_config_padrao = criar_backend()
+db_pool = PoolConexoes(backend_padrao, **POOL_CONFIG, **db_config_padrao)
+
 @contextmanager
 def get_db_connection():
-    conn = psycopg2.connect(
-        host='netendencia.c09gmwigavdx.us-east-1.rds.amazonaws.com',
-        database='dbnetendencia',
-        user='postgres',
-        password='netendencia1',
-        port='5432',
-        connect_timeout=10
-    )
-    conn.cursor_factory = RealDictCursor
+    conn = db_pool.obter()
+    quebrada = False
     try:
         yield conn
     except Exception as e:
-        print(f"❌ Erro na conexão PostgreSQL: {e}")
+        logger.error('Erro na conexão com o banco', extra={'erro': str(e), 'banco': db_pool.backend.nome})
+        quebrada = isinstance(e, db_pool.backend.erros_conexao)
         raise
     finally:
-        conn.close()
+        db_pool.devolver(conn, quebrada=quebrada)
 
 def init_database():
-    """Verifica a conexão com o PostgreSQL"""
+    """Verifica a conexão com o PostgreSQL e abre as conexões mínimas do pool"""
     try:
+        db_pool.preencher()
+        
+        # Com vários workers o esquema é preparado uma única vez, antes do fork (gunicorn.conf.py)
+        if os.environ.get('NETENDENCIA_ESQUEMA_PRONTO') != '1':
+            preparar_esquema()
+        
+        agregados_avaliacao.reconciliar()
+        iniciar_reconciliacao_periodica()
+        iniciar_limpeza_sessoes()
+        catalogo_perguntas.carregar()
+        catalogo_conteudo.carregar()
+        catalogo_assets.carregar()
+        
+        if os.environ.get('NETENDENCIA_EVENTOS_ENTRE_PROCESSOS') == '1':
+            if db_pool.backend.eventos_entre_processos:
+                eventos_processos.iniciar()
+            else:
+                logger.warning('Eventos entre processos exigem PostgreSQL; use um só worker',
+                               extra={'banco': db_pool.backend.nome})
+        metricas.iniciar_gravacao_periodica()
+            
+    except Exception:
+        logger.exception('Erro ao conectar com o banco', extra={'banco': db_pool.backend.nome})
+
+def preparar_esquema():
+    """Aplica as migrações pendentes, sincroniza ultimos_diagnosticos e confere os planos (idempotente)"""
+    with get_db_connection() as conn:
+        versao = aplicar_migracoes(conn)
+        logger.info(f'Conectado ao {db_pool.backend.rotulo}',
+                    extra={'versao_esquema': versao, **db_pool.backend.descrever(db_pool.db_config)})
+        
+        cursor = conn.cursor()
+        sincronizar_ultimos_diagnosticos(cursor)
+        conn.commit()
+        
+        for plano in verificar_planos(conn):
+            if not plano['usa_indice']:
+                logger.warning('Consulta quente sem índice', extra={'consulta': plano['consulta'],
+                                                                    'tabelas': plano['varreduras']})
+
+TABELAS_SQLITE = '''
+    CREATE TABLE IF NOT EXISTS familias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        codigo_familia TEXT UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        idade INTEGER,
+        familia_id INTEGER,
+        email TEXT UNIQUE,
+        senha TEXT,
+        relacionamento TEXT,
+        plano_acao TEXT,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (familia_id) REFERENCES familias (id)
+    );
+    CREATE TABLE IF NOT EXISTS perguntas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        texto TEXT NOT NULL,
+        categoria TEXT
+    );
+    CREATE TABLE IF NOT EXISTS opcoes_resposta (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pergunta_id INTEGER,
+        texto TEXT NOT NULL,
+        pontuacao INTEGER,
+        FOREIGN KEY (pergunta_id) REFERENCES perguntas (id)
+    );
+    CREATE TABLE IF NOT EXISTS diagnosticos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER,
+        pontuacao INTEGER,
+        nivel TEXT,
+        data_diagnostico TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        respostas TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    );
+    CREATE TABLE IF NOT EXISTS reflexoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER,
+        pergunta TEXT,
+        resposta TEXT,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    );
+    CREATE TABLE IF NOT EXISTS instituicoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        tipo TEXT,
+        endereco TEXT,
+        telefone TEXT,
+        email TEXT,
+        descricao TEXT,
+        especialidades TEXT,
+        data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS profissionais (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        profissao TEXT,
+        especialidade TEXT,
+        telefone TEXT,
+        email TEXT,
+        instituicao_id INTEGER,
+        registro_profissional TEXT,
+        abordagem TEXT,
+        descricao TEXT,
+        data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def criar_tabelas_principais(cursor):
+    """No SQLite o arquivo é do próprio app e as tabelas principais são criadas aqui;
+    no PostgreSQL elas já existem no servidor"""
+    db_pool.backend.criar_tabelas_principais(cursor)
+
+# ========== ÚLTIMO DIAGNÓSTICO POR USUÁRIO ==========
+
+def criar_ultimos_diagnosticos(cursor):
+    """Tabela com o diagnóstico mais recente de cada usuário"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ultimos_diagnosticos (
+            usuario_id INTEGER PRIMARY KEY,
+            diagnostico_id INTEGER NOT NULL,
+            pontuacao INTEGER,
+            nivel TEXT,
+            data_diagnostico TIMESTAMP
+        )
+    ''')
+
+def sincronizar_ultimos_diagnosticos(cursor):
+    """Preenche usuários que ainda não estão na tabela (primeira execução ou inserções antigas)"""
+    # ROW_NUMBER em vez do DISTINCT ON do PostgreSQL: o mesmo comando nos dois bancos
+    cursor.execute('''
+        INSERT INTO ultimos_diagnosticos (usuario_id, diagnostico_id, pontuacao, nivel, data_diagnostico)
+        SELECT usuario_id, id, pontuacao, nivel, data_diagnostico
+        FROM (
+            SELECT d.usuario_id, d.id, d.pontuacao, d.nivel, d.data_diagnostico,
+                   ROW_NUMBER() OVER (PARTITION BY d.usuario_id
+                                      ORDER BY d.data_diagnostico DESC, d.id DESC) as ordem
+            FROM diagnosticos d
+            WHERE d.usuario_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM ultimos_diagnosticos ud WHERE ud.usuario_id = d.usuario_id)
+        ) ultimos
+        WHERE ordem = 1
+        ON CONFLICT (usuario_id) DO NOTHING
+    ''')
+    logger.info('Últimos diagnósticos sincronizados', extra={'usuarios_preenchidos': cursor.rowcount})
+
+COLUNAS_NOVO_DIAGNOSTICO = ('usuario_id', 'pontuacao', 'nivel', 'respostas')
+
+# O resumo anterior e a família vêm no RETURNING, lidos antes de ultimos_diagnosticos
+# mudar (no PostgreSQL todo o comando vê o mesmo snapshot; no SQLite o upsert vem depois)
+RETORNO_NOVO_DIAGNOSTICO = '''
+    id, usuario_id, pontuacao, nivel, data_diagnostico,
+    (SELECT ud.pontuacao FROM ultimos_diagnosticos ud WHERE ud.usuario_id = diagnosticos.usuario_id)
+        as pontuacao_anterior,
+    (SELECT ud.nivel FROM ultimos_diagnosticos ud WHERE ud.usuario_id = diagnosticos.usuario_id)
+        as nivel_anterior,
+    (SELECT u.familia_id FROM usuarios u WHERE u.id = diagnosticos.usuario_id) as familia_id
+'''
+
+# Lê os diagnósticos novos (novos, de inserir_varias); "WHERE true" separa o SELECT
+# do ON CONFLICT na gramática do SQLite
+ATUALIZAR_ULTIMOS_DIAGNOSTICOS = '''
+    INSERT INTO ultimos_diagnosticos (usuario_id, diagnostico_id, pontuacao, nivel, data_diagnostico)
+    SELECT usuario_id, id, pontuacao, nivel, data_diagnostico FROM novos WHERE true
+    ON CONFLICT (usuario_id) DO UPDATE SET
+        diagnostico_id = excluded.diagnostico_id,
+        pontuacao = excluded.pontuacao,
+        nivel = excluded.nivel,
+        data_diagnostico = excluded.data_diagnostico
+    WHERE ultimos_diagnosticos.data_diagnostico IS NULL
+       OR ultimos_diagnosticos.data_diagnostico <= excluded.data_diagnostico
+'''
+
+def inserir_diagnostico(cursor, usuario_id, pontuacao, nivel, respostas):
+    """Insere o diagnóstico e atualiza ultimos_diagnosticos (no PostgreSQL, no mesmo comando).
+    Devolve também o diagnóstico anterior (para os agregados) e a família do usuário."""
+    return inserir_diagnosticos(cursor, [(usuario_id, pontuacao, nivel, respostas)])[usuario_id]
+
+def inserir_diagnosticos(cursor, diagnosticos):
+    """Insere vários diagnósticos (usuario_id, pontuacao, nivel, respostas) de uma vez e
+    atualiza ultimos_diagnosticos; os usuários não podem se repetir no lote.
+    Devolve usuario_id -> linha nova (id, data_diagnostico, pontuacao_anterior,
+    nivel_anterior, familia_id...). Não faz commit."""
+    registros = [(usuario_id, pontuacao, nivel, json.dumps(respostas))
+                 for usuario_id, pontuacao, nivel, respostas in diagnosticos]
+    linhas = db_pool.backend.inserir_varias(cursor, 'diagnosticos', COLUNAS_NOVO_DIAGNOSTICO, registros,
+                                            retorno=RETORNO_NOVO_DIAGNOSTICO, depois=ATUALIZAR_ULTIMOS_DIAGNOSTICOS)
+    return {linha['usuario_id']: linha for linha in linhas}
+
+# ========== REFLEXÕES ==========
+
+VERSIONAR_REFLEXOES = os.environ.get('REFLEXOES_VERSIONAR', '0') == '1'
+JANELA_VERSAO_REFLEXOES = float(os.environ.get('REFLEXOES_JANELA_VERSAO', 300))
+
+def criar_estrutura_reflexoes(cursor):
+    """Índice único por (usuario_id, pergunta) para o upsert e tabela de versões"""
+    # Duplicatas antigas: fica a resposta mais recente de cada pergunta
+    cursor.execute('''
+        DELETE FROM reflexoes
+        WHERE id NOT IN (SELECT MAX(id) FROM reflexoes GROUP BY usuario_id, pergunta)
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS reflexoes_usuario_pergunta_idx
+        ON reflexoes (usuario_id, pergunta)
+    ''')
+    db_pool.backend.adicionar_coluna(cursor, 'reflexoes', 'data_atualizacao', 'TIMESTAMP')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS reflexoes_versoes (
+            id {db_pool.backend.chave_serial},
+            usuario_id INTEGER NOT NULL,
+            pergunta TEXT NOT NULL,
+            resposta TEXT,
+            data_versao TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS reflexoes_versoes_usuario_idx
+        ON reflexoes_versoes (usuario_id, pergunta, data_versao DESC)
+    ''')
+
+def salvar_reflexoes(cursor, usuario_id, reflexoes, parcial=False):
+    """Grava só o que mudou, num único comando.
+    
+    Respostas novas são inseridas, alteradas são atualizadas (mantendo data_criacao)
+    e vazias são removidas; sem parcial, perguntas ausentes também são removidas.
+    Com REFLEXOES_VERSIONAR=1 a resposta substituída vai para reflexoes_versoes,
+    exceto se ela mesma tiver menos de REFLEXOES_JANELA_VERSAO segundos (autosave)."""
+    preenchidas = {pergunta: resposta for pergunta, resposta in reflexoes.items()
+                   if resposta and resposta.strip()}
+    vazias = [pergunta for pergunta in reflexoes if pergunta not in preenchidas]
+    
+    if not db_pool.backend.escrita_em_cte:
+        return salvar_reflexoes_em_passos(cursor, usuario_id, preenchidas, vazias, parcial)
+    
+    cursor.execute('''
+        WITH enviadas AS (
+            SELECT pergunta, resposta
+            FROM unnest(%(perguntas)s::text[], %(respostas)s::text[]) AS e(pergunta, resposta)
+        ), anteriores AS (
+            SELECT pergunta, resposta, COALESCE(data_atualizacao, data_criacao) as alterada_em
+            FROM reflexoes
+            WHERE usuario_id = %(usuario_id)s
+        ), removidas AS (
+            DELETE FROM reflexoes
+            WHERE usuario_id = %(usuario_id)s
+              AND (pergunta = ANY(%(vazias)s::text[])
+                   OR (NOT %(parcial)s AND pergunta NOT IN (SELECT pergunta FROM enviadas)))
+            RETURNING pergunta
+        ), gravadas AS (
+            INSERT INTO reflexoes (usuario_id, pergunta, resposta)
+            SELECT %(usuario_id)s, pergunta, resposta FROM enviadas
+            ON CONFLICT (usuario_id, pergunta) DO UPDATE SET
+                resposta = EXCLUDED.resposta,
+                data_atualizacao = CURRENT_TIMESTAMP
+            WHERE reflexoes.resposta IS DISTINCT FROM EXCLUDED.resposta
+            RETURNING pergunta, (xmax = 0) as inserida
+        ), versoes AS (
+            INSERT INTO reflexoes_versoes (usuario_id, pergunta, resposta, data_versao)
+            SELECT %(usuario_id)s, a.pergunta, a.resposta, a.alterada_em
+            FROM anteriores a
+            WHERE %(versionar)s
+              AND a.alterada_em < CURRENT_TIMESTAMP - make_interval(secs => %(janela)s)
+              AND (a.pergunta IN (SELECT pergunta FROM gravadas WHERE NOT inserida)
+                   OR a.pergunta IN (SELECT pergunta FROM removidas))
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM gravadas WHERE inserida) as inseridas,
+            (SELECT COUNT(*) FROM gravadas WHERE NOT inserida) as atualizadas,
+            (SELECT COUNT(*) FROM removidas) as removidas,
+            (SELECT COUNT(*) FROM versoes) as versoes
+    ''', {
+        'usuario_id': usuario_id,
+        'perguntas': list(preenchidas),
+        'respostas': list(preenchidas.values()),
+        'vazias': vazias,
+        'parcial': parcial,
+        'versionar': VERSIONAR_REFLEXOES,
+        'janela': JANELA_VERSAO_REFLEXOES
+    })
+    return dict(cursor.fetchone())
+
+def salvar_reflexoes_em_passos(cursor, usuario_id, preenchidas, vazias, parcial):
+    """salvar_reflexoes sem escrita dentro de WITH (SQLite): o mesmo diff, comparado em
+    Python a partir das respostas atuais, com um comando por tipo de alteração"""
+    cursor.execute('''
+        SELECT pergunta, resposta, COALESCE(data_atualizacao, data_criacao) as alterada_em
+        FROM reflexoes
+        WHERE usuario_id = %s
+    ''', (usuario_id,))
+    anteriores = {linha['pergunta']: linha for linha in cursor.fetchall()}
+    
+    removidas = [pergunta for pergunta in anteriores
+                 if pergunta in vazias or (not parcial and pergunta not in preenchidas)]
+    inseridas = [(usuario_id, pergunta, resposta) for pergunta, resposta in preenchidas.items()
+                 if pergunta not in anteriores]
+    atualizadas = [(resposta, usuario_id, pergunta) for pergunta, resposta in preenchidas.items()
+                   if pergunta in anteriores and anteriores[pergunta]['resposta'] != resposta]
+    
+    versoes = []
+    if VERSIONAR_REFLEXOES:
+        limite = datetime.utcnow() - timedelta(seconds=JANELA_VERSAO_REFLEXOES)
+        for pergunta in removidas + [pergunta for _, _, pergunta in atualizadas]:
+            anterior = anteriores[pergunta]
+            # COALESCE perde o tipo da coluna: o sqlite3 devolve o texto gravado
+            alterada_em = anterior['alterada_em']
+            if isinstance(alterada_em, str):
+                alterada_em = datetime.fromisoformat(alterada_em)
+            if alterada_em is not None and alterada_em < limite:
+                versoes.append((usuario_id, pergunta, anterior['resposta'], anterior['alterada_em']))
+    
+    if removidas:
+        cursor.execute('DELETE FROM reflexoes WHERE usuario_id = %s AND pergunta = ANY(%s)',
+                       (usuario_id, removidas))
+    if inseridas:
+        cursor.executemany('INSERT INTO reflexoes (usuario_id, pergunta, resposta) VALUES (%s, %s, %s)', inseridas)
+    if atualizadas:
+        cursor.executemany('''
+            UPDATE reflexoes SET resposta = %s, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE usuario_id = %s AND pergunta = %s
+        ''', atualizadas)
+    if versoes:
+        cursor.executemany('''
+            INSERT INTO reflexoes_versoes (usuario_id, pergunta, resposta, data_versao)
+            VALUES (%s, %s, %s, %s)
+        ''', versoes)
+    
+    return {'inseridas': len(inseridas), 'atualizadas': len(atualizadas),
+            'removidas': len(removidas), 'versoes': len(versoes)}
+
+# ========== MIGRAÇÕES ==========
+
+SQL_TABELA_MIGRACOES = '''
+    CREATE TABLE IF NOT EXISTS schema_migracoes (
+        versao INTEGER PRIMARY KEY,
+        nome TEXT NOT NULL,
+        aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Chave do pg_advisory_xact_lock que serializa migrações de vários processos
+CHAVE_LOCK_MIGRACOES = 7405_2025
+
+def criar_indices_consultas_quentes(cursor):
+    """Índices das consultas mais frequentes do app.
+    
+    O de diagnosticos cobre "último diagnóstico do usuário" e o histórico do
+    dashboard sem visitar a tabela (no SQLite, que não tem INCLUDE, as colunas
+    extras vão na chave). E-mails que já têm índice (UNIQUE) não ganham outro."""
+    backend = db_pool.backend
+    colunas = backend.colunas_indice(('usuario_id', 'data_diagnostico DESC', 'id DESC'), ('pontuacao', 'nivel'))
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS diagnosticos_usuario_data_idx ON diagnosticos {colunas}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS usuarios_familia_idx ON usuarios (familia_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS profissionais_instituicao_idx ON profissionais (instituicao_id)')
+    for tabela in ('usuarios', 'profissionais'):
+        if not backend.indice_na_coluna(cursor, tabela, 'email'):
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {tabela}_email_idx ON {tabela} (email)')
+    backend.analisar(cursor, 'diagnosticos')
+
+def criar_indice_detalhes_avaliacao(cursor):
+    """Índice na ordem do keyset de /api/avaliacao-geral/detalhes: cada página lê
+    só as suas linhas, sem ordenar a tabela inteira. A expressão é a mesma de
+    CHAVE_FAMILIA_DETALHES; sem isso o banco não usa o índice."""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS usuarios_detalhes_idx
+        ON usuarios ((COALESCE(familia_id, 2147483647)), nome, id)
+    ''')
+    db_pool.backend.analisar(cursor, 'usuarios')
+
+def criar_tabela_dicas(cursor):
+    """Dicas do dia editáveis no banco (vazia: o app usa as dicas embutidas)"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS dicas (
+            id {db_pool.backend.chave_serial},
+            nivel TEXT NOT NULL,
+            texto TEXT NOT NULL,
+            ordem INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def adicionar_idioma_dicas(cursor):
+    """Dicas do banco passam a ser por idioma (as existentes ficam no idioma padrão)"""
+    db_pool.backend.adicionar_coluna(cursor, 'dicas', 'idioma', "TEXT NOT NULL DEFAULT 'pt-BR'")
+
+# Versões aplicadas em ordem, uma vez por banco; nunca altere uma versão já publicada, crie outra
+MIGRACOES = [
+    (1, 'tabelas_principais', criar_tabelas_principais),
+    (2, 'ultimos_diagnosticos', criar_ultimos_diagnosticos),
+    (3, 'estrutura_reflexoes', criar_estrutura_reflexoes),
+    (4, 'indices_consultas_quentes', criar_indices_consultas_quentes),
+    (5, 'dicas', criar_tabela_dicas),
+    (6, 'dicas_por_idioma', adicionar_idioma_dicas),
+    (7, 'indice_detalhes_avaliacao', criar_indice_detalhes_avaliacao),
+]
+
+def aplicar_migracoes(conn, migracoes=MIGRACOES):
+    """Aplica, cada uma na sua transação, as migrações ainda não registradas em
+    schema_migracoes; devolve a versão do esquema"""
+    cursor = conn.cursor()
+    versao_atual = 0
+    for versao, nome, migrar in migracoes:
+        db_pool.backend.travar_migracoes(cursor)
+        cursor.execute(SQL_TABELA_MIGRACOES)
+        cursor.execute('SELECT 1 FROM schema_migracoes WHERE versao = %s', (versao,))
+        if cursor.fetchone():
+            conn.rollback()
+            versao_atual = versao
+            continue
+        
+        inicio = time.perf_counter()
+        try:
+            migrar(cursor)
+            cursor.execute('INSERT INTO schema_migracoes (versao, nome) VALUES (%s, %s)', (versao, nome))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception('Falha na migração', extra={'versao': versao, 'nome': nome})
+            raise
+        versao_atual = versao
+        logger.info('Migração aplicada', extra={'versao': versao, 'nome': nome,
+                                                'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)})
+    return versao_atual
+
+def consultas_quentes():
+    """(nome, sql, parâmetros, tabelas ou aliases que precisam ser lidos por índice)"""
+    return [
+        ('ultimo_diagnostico',
+         'SELECT nivel FROM diagnosticos WHERE usuario_id = %s ORDER BY data_diagnostico DESC LIMIT 1',
+         (1,), ('diagnosticos',)),
+        ('dashboard', SQL_DASHBOARD, {'usuario_id': 1}, ('u', 'd')),
+        ('membros_familia', SQL_MEMBROS_FAMILIA, (1,), ('u',)),
+        ('profissionais_das_instituicoes', *consulta_profissionais_das_instituicoes([1, 2, 3]), ('profissionais',)),
+        ('login', 'SELECT id, nome, email, senha, familia_id FROM usuarios WHERE email = %s', ('a@b.c',), ('usuarios',)),
+        ('email_profissional', 'SELECT id FROM profissionais WHERE email = %s', ('a@b.c',), ('profissionais',)),
+        ('detalhes_avaliacao', *montar_consulta_detalhes(apos=(1, 'a', 1), limite=LIMITE_PADRAO_DETALHES), ('u',)),
+    ]
+
+def verificar_planos(conn):
+    """EXPLAIN das consultas quentes: cada uma deve achar um índice para as tabelas indicadas.
+    
+    No PostgreSQL a varredura sequencial é desligada só nesta transação, para que
+    o resultado não dependa do tamanho das tabelas: o que se verifica é se existe
+    índice utilizável para o formato da consulta. O SQLite não tem esse ajuste e,
+    com as estatísticas do ANALYZE, pode preferir varrer tabelas muito pequenas."""
+    cursor = conn.cursor()
+    resultado = []
+    try:
+        db_pool.backend.forcar_indices(cursor)
+        for nome, sql, parametros, tabelas in consultas_quentes():
+            varreduras = db_pool.backend.varreduras_completas(cursor, sql, parametros)
+            sem_indice = sorted(tabela for tabela in tabelas if tabela in varreduras)
+            resultado.append({'consulta': nome, 'usa_indice': not sem_indice, 'varreduras': sem_indice})
+    finally:
+        conn.rollback()
+    return resultado
+
+@app.cli.command('migrar')
+def comando_migrar():
+    """Aplica as migrações pendentes do banco configurado"""
+    with get_db_connection() as conn:
+        versao = aplicar_migracoes(conn)
+    click.echo(f'Esquema na versão {versao}')
+
+@app.cli.command('verificar-planos')
+def comando_verificar_planos():
+    """Confere com EXPLAIN que as consultas quentes usam índice (sai com erro se alguma não usar)"""
+    with get_db_connection() as conn:
+        planos = verificar_planos(conn)
+    for plano in planos:
+        situacao = 'ok' if plano['usa_indice'] else 'SEM ÍNDICE em ' + ', '.join(plano['varreduras'])
+        click.echo(f"{plano['consulta']:32} {situacao}")
+    if not all(plano['usa_indice'] for plano in planos):
+        raise SystemExit(1)
+
+# ========== AGREGADOS DA AVALIAÇÃO GERAL ==========
+
+CORES_NIVEIS = {
+    'Não dependente': '#28a745',  # Verde
+    'Moderado': '#ffc107',        # Amarelo 
+    'Dependente': '#dc3545',      # Vermelho
+    'Não avaliado': '#6c757d'     # Cinza
+}
+
+class AgregadosAvaliacao:
+    """Contadores da avaliação geral mantidos em memória e atualizados a cada escrita"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carregado = False
+        self._versao = 0
+        self._zerar()
+
+    def _zerar(self):
+        self.total_usuarios = 0
+        self.total_avaliados = 0
+        self.soma_pontuacao = 0
+        self.contador_niveis = {'Não dependente': 0, 'Moderado': 0, 'Dependente': 0}
+
+    @staticmethod
+    def _ler_do_banco(cursor):
+        cursor.execute('SELECT COUNT(*) as total FROM usuarios')
+        total_usuarios = cursor.fetchone()['total']
+        
+        cursor.execute('''
+            SELECT ud.nivel,
+                   COUNT(*) as quantidade,
+                   COUNT(ud.pontuacao) as avaliados,
+                   COALESCE(SUM(ud.pontuacao), 0) as soma
+            FROM ultimos_diagnosticos ud
+            JOIN usuarios u ON u.id = ud.usuario_id
+            GROUP BY ud.nivel
+        ''')
+        contador_niveis = {'Não dependente': 0, 'Moderado': 0, 'Dependente': 0}
+        total_avaliados = 0
+        soma_pontuacao = 0
+        for linha in cursor.fetchall():
+            total_avaliados += linha['avaliados']
+            soma_pontuacao += linha['soma']
+            if linha['nivel']:
+                contador_niveis[linha['nivel']] = contador_niveis.get(linha['nivel'], 0) + linha['quantidade']
+        
+        return {
+            'total_usuarios': total_usuarios,
+            'total_avaliados': total_avaliados,
+            'soma_pontuacao': soma_pontuacao,
+            'contador_niveis': contador_niveis
+        }
+
+    def _aplicar(self, dados):
+        self.total_usuarios = dados['total_usuarios']
+        self.total_avaliados = dados['total_avaliados']
+        self.soma_pontuacao = dados['soma_pontuacao']
+        self.contador_niveis = dict(dados['contador_niveis'])
+        self._carregado = True
+
+    def _estado(self):
+        return {
+            'total_usuarios': self.total_usuarios,
+            'total_avaliados': self.total_avaliados,
+            'soma_pontuacao': self.soma_pontuacao,
+            'contador_niveis': dict(self.contador_niveis)
+        }
+
+    @property
+    def carregado(self):
+        return self._carregado
+
+    def garantir_carregado(self):
+        if self._carregado:
+            return
         with get_db_connection() as conn:
-            cursor = conn.cursor()
+            dados = self._ler_do_banco(conn.cursor())
+        with self._lock:
+            if not self._carregado:
+                self._aplicar(dados)
+
+    # ----- Atualizações incrementais (chamar somente após o commit) -----
+
+    def registrar_usuario(self, quantidade=1, propagar=True):
+        with self._lock:
+            self.total_usuarios += quantidade
+            self._versao += 1
+        if propagar:
+            eventos_processos.publicar('agregados', 'registrar_usuario', quantidade)
+
+    def registrar_diagnostico(self, pontuacao, nivel, pontuacao_anterior=None, nivel_anterior=None, propagar=True):
+        with self._lock:
+            self._remover_diagnostico(pontuacao_anterior, nivel_anterior)
+            if pontuacao is not None:
+                self.total_avaliados += 1
+                self.soma_pontuacao += pontuacao
+            if nivel:
+                self.contador_niveis[nivel] = self.contador_niveis.get(nivel, 0) + 1
+            self._versao += 1
+        if propagar:
+            eventos_processos.publicar('agregados', 'registrar_diagnostico',
+                                       pontuacao, nivel, pontuacao_anterior, nivel_anterior)
+
+    def remover_usuario(self, pontuacao=None, nivel=None, propagar=True):
+        with self._lock:
+            self._remover_diagnostico(pontuacao, nivel)
+            self.total_usuarios -= 1
+            self._versao += 1
+        if propagar:
+            eventos_processos.publicar('agregados', 'remover_usuario', pontuacao, nivel)
+
+    def _remover_diagnostico(self, pontuacao, nivel):
+        if pontuacao is not None:
+            self.total_avaliados -= 1
+            self.soma_pontuacao -= pontuacao
+        if nivel:
+            self.contador_niveis[nivel] = self.contador_niveis.get(nivel, 0) - 1
+
+    # ----- Leitura -----
+
+    def resumo(self):
+        """Estatísticas e dados do gráfico no formato da API (O(número de níveis))"""
+        self.garantir_carregado()
+        with self._lock:
+            total_usuarios = self.total_usuarios
+            total_avaliados = self.total_avaliados
+            soma_pontuacao = self.soma_pontuacao
+            contador_niveis = dict(self.contador_niveis)
+        
+        contador_niveis['Não avaliado'] = total_usuarios - sum(contador_niveis.values())
+        
+        percentual_avaliados = 0
+        if total_usuarios > 0:
+            percentual_avaliados = round((total_avaliados / total_usuarios) * 100, 1)
+        
+        media_geral = 0
+        if total_avaliados > 0:
+            media_geral = round(soma_pontuacao / total_avaliados, 1)
+        
+        # Encontrar nível mais comum (excluindo "Não avaliado")
+        niveis_avaliados = {k: v for k, v in contador_niveis.items() if k != 'Não avaliado' and v > 0}
+        nivel_mais_comum = 'N/A'
+        if niveis_avaliados:
+            nivel_mais_comum = max(niveis_avaliados, key=niveis_avaliados.get)
+        
+        dados_grafico = []
+        for nivel, quantidade in contador_niveis.items():
+            if quantidade > 0:
+                percentual = round((quantidade / total_usuarios) * 100, 1) if total_usuarios > 0 else 0
+                dados_grafico.append({
+                    'nivel': nivel,
+                    'quantidade': quantidade,
+                    'percentual': percentual,
+                    'cor': CORES_NIVEIS.get(nivel, '#6c757d')
+                })
+        dados_grafico.sort(key=lambda x: x['quantidade'], reverse=True)
+        
+        return {
+            'estatisticas': {
+                'total_usuarios': total_usuarios,
+                'total_avaliados': total_avaliados,
+                'percentual_avaliados': percentual_avaliados,
+                'media_geral': media_geral,
+                'nivel_mais_comum': nivel_mais_comum,
+                'descricao': 'Dados de todos os usuários do sistema'
+            },
+            'dados_grafico': {
+                'niveis': dados_grafico
+            }
+        }
+
+    # ----- Reconciliação -----
+
+    def reconciliar(self):
+        """Recalcula os agregados a partir do banco e informa a diferença encontrada"""
+        with self._lock:
+            versao_inicial = self._versao
+        
+        with get_db_connection() as conn:
+            dados = self._ler_do_banco(conn.cursor())
+        
+        with self._lock:
+            if self._versao != versao_inicial:
+                # Houve escrita durante a leitura: o retrato do banco pode estar defasado
+                return {'status': 'adiado', 'divergencias': {}}
             
-            cursor.execute("""
-                SELECT COUNT(*) as count 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-            """)
-            tabela_count = cursor.fetchone()['count']
+            anterior = self._estado()
+            divergencias = {}
+            if self._carregado:
+                for campo in ('total_usuarios', 'total_avaliados', 'soma_pontuacao'):
+                    if anterior[campo] != dados[campo]:
+                        divergencias[campo] = {'memoria': anterior[campo], 'banco': dados[campo]}
+                for nivel in set(anterior['contador_niveis']) | set(dados['contador_niveis']):
+                    em_memoria = anterior['contador_niveis'].get(nivel, 0)
+                    no_banco = dados['contador_niveis'].get(nivel, 0)
+                    if em_memoria != no_banco:
+                        divergencias[f'nivel:{nivel}'] = {'memoria': em_memoria, 'banco': no_banco}
+            self._aplicar(dados)
+        
+        if divergencias:
+            logger.warning('Agregados da avaliação geral divergiam do banco', extra={'divergencias': divergencias})
+        return {'status': 'reconciliado', 'divergencias': divergencias}
+
+agregados_avaliacao = AgregadosAvaliacao()
+
+def iniciar_reconciliacao_periodica(intervalo=None):
+    """Reconciliação em segundo plano (AGREGADOS_RECONCILIAR_SEGUNDOS, 0 desativa)"""
+    if intervalo is None:
+        intervalo = float(os.environ.get('AGREGADOS_RECONCILIAR_SEGUNDOS', 300))
+    if intervalo <= 0:
+        return None
+    
+    def executar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                agregados_avaliacao.reconciliar()
+            except Exception:
+                logger.exception('Erro na reconciliação dos agregados')
+    
+    thread = threading.Thread(target=executar, name='reconciliacao-agregados', daemon=True)
+    thread.start()
+    return thread
+
+# ========== CACHE DO DASHBOARD ==========
+
+class CacheTTL:
+    """Cache LRU com tempo de vida por item, limitado a max_itens entradas"""
+
+    def __init__(self, max_itens, ttl):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()   # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self._estatisticas = {'acertos': 0, 'falhas': 0, 'remocoes_lru': 0, 'expirados': 0, 'invalidacoes': 0}
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self._estatisticas['falhas'] += 1
+                return None
+            expira_em, valor = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                self._estatisticas['expirados'] += 1
+                self._estatisticas['falhas'] += 1
+                return None
+            self._itens.move_to_end(chave)
+            self._estatisticas['acertos'] += 1
+            return valor
+
+    def definir(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._estatisticas['remocoes_lru'] += 1
+
+    def invalidar(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                if self._itens.pop(chave, None) is not None:
+                    self._estatisticas['invalidacoes'] += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            dados = dict(self._estatisticas)
+            dados.update({'itens': len(self._itens), 'max_itens': self.max_itens, 'ttl': self.ttl})
+        consultas = dados['acertos'] + dados['falhas']
+        dados['taxa_acerto'] = round(dados['acertos'] / consultas, 3) if consultas else 0.0
+        return dados
+
+cache_dashboard = CacheTTL(
+    max_itens=int(os.environ.get('CACHE_DASHBOARD_MAX', 10000)),
+    ttl=float(os.environ.get('CACHE_DASHBOARD_TTL', 60))
+)
+
+def chave_dashboard(usuario_id):
+    return ('dashboard', usuario_id)
+
+def chave_familia(familia_id):
+    return ('familia', familia_id)
+
+def invalidar_cache_dashboard(usuario_id=None, familia_id=None, propagar=True):
+    """Chamado pelas rotas de escrita após o commit (propagar avisa os outros workers).
+    usuario_id pode ser uma lista, para vários membros com uma invalidação só."""
+    chaves = [chave_dashboard(usuario) for usuario in
+              (usuario_id if isinstance(usuario_id, list) else [usuario_id]) if usuario]
+    if familia_id:
+        chaves.append(chave_familia(familia_id))
+    cache_dashboard.invalidar(*chaves)
+    if propagar:
+        eventos_processos.publicar('cache', usuario_id, familia_id)
+
+# ========== SESSÕES NO SERVIDOR ==========
+
+SESSAO_CONFIG = {
+    # cookie (assinado, padrão do Flask: funciona com qualquer número de processos),
+    # memoria (LRU deste processo, só com um worker) ou sqlite (arquivo compartilhado
+    # pelos workers da máquina; o gunicorn.conf.py escolhe este com mais de um worker)
+    'armazem': os.environ.get('SESSAO_ARMAZEM', 'cookie'),
+    'ttl': float(os.environ.get('SESSAO_TTL', 7 * 24 * 3600)),
+    'max_itens': int(os.environ.get('SESSAO_MAX_ITENS', 100000)),
+    'sqlite_caminho': os.environ.get('SESSAO_SQLITE',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessoes.db')),
+    'intervalo_limpeza': float(os.environ.get('SESSAO_LIMPEZA_SEGUNDOS', 600))
+}
+
+class SessaoServidor(SecureCookieSession):
+    """Sessão cujos dados ficam num armazém do servidor; o cookie leva só o id"""
+    
+    def __init__(self, dados=None, sid=None, renovar=False):
+        super().__init__(dados)
+        self.sid = sid
+        self.renovar = renovar   # perto de expirar: regrava só para estender a validade
+        self.sid_anterior = None
+    
+    def regenerar(self):
+        """Troca o id (no login, contra fixação de sessão); o antigo é apagado ao salvar"""
+        if self.sid is not None:
+            self.sid_anterior = self.sid
+        self.sid = None
+        self.modified = True
+
+class ArmazemSessoesMemoria:
+    """Sessões num LRU deste processo (um só worker): leitura sem I/O"""
+    
+    nome = 'memoria'
+    
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()   # sid -> (expira_em, dados)
+        self._lock = threading.Lock()
+        self._estatisticas = {'leituras': 0, 'acertos': 0, 'gravacoes': 0, 'remocoes': 0,
+                              'remocoes_lru': 0, 'expiradas': 0}
+    
+    def ler(self, sid):
+        with self._lock:
+            self._estatisticas['leituras'] += 1
+            item = self._itens.get(sid)
+            if item is None:
+                return None
+            expira_em, dados = item
+            if expira_em <= time.time():
+                del self._itens[sid]
+                self._estatisticas['expiradas'] += 1
+                return None
+            self._itens.move_to_end(sid)
+            self._estatisticas['acertos'] += 1
+            return dict(dados), expira_em
+    
+    def gravar(self, sid, dados, expira_em):
+        with self._lock:
+            self._estatisticas['gravacoes'] += 1
+            self._itens[sid] = (expira_em, dict(dados))
+            self._itens.move_to_end(sid)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._estatisticas['remocoes_lru'] += 1
+    
+    def remover(self, sid):
+        with self._lock:
+            if self._itens.pop(sid, None) is not None:
+                self._estatisticas['remocoes'] += 1
+    
+    def expirar(self, agora=None):
+        """Remove de uma vez todas as sessões vencidas; devolve quantas"""
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            vencidas = [sid for sid, (expira_em, _) in self._itens.items() if expira_em <= agora]
+            for sid in vencidas:
+                del self._itens[sid]
+            self._estatisticas['expiradas'] += len(vencidas)
+        return len(vencidas)
+    
+    def estatisticas(self):
+        with self._lock:
+            return {**self._estatisticas, 'sessoes': len(self._itens), 'max_itens': self.max_itens}
+
+class ArmazemSessoesSQLite:
+    """Sessões num arquivo SQLite (WAL) visível a todos os workers da máquina.
+    
+    Uma conexão por thread; a leitura é uma busca pela chave primária. Os dados
+    são serializados como no cookie do Flask (JSON com tipos marcados)."""
+    
+    nome = 'sqlite'
+    serializador = TaggedJSONSerializer()
+    
+    def __init__(self, caminho, espera_lock=5):
+        self.caminho = caminho
+        self.espera_lock = espera_lock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._estatisticas = {'leituras': 0, 'acertos': 0, 'gravacoes': 0, 'remocoes': 0, 'expiradas': 0}
+        with self._conexao() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessoes (
+                    sid TEXT PRIMARY KEY,
+                    dados TEXT NOT NULL,
+                    expira_em REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_expira_em ON sessoes (expira_em)')
+    
+    def _conexao(self):
+        # Conexões não atravessam o fork: cada processo (e thread) abre a sua
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=self.espera_lock, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def _contar(self, chave, quantidade=1):
+        with self._lock:
+            self._estatisticas[chave] += quantidade
+    
+    def ler(self, sid):
+        self._contar('leituras')
+        linha = self._conexao().execute('SELECT dados, expira_em FROM sessoes WHERE sid = ?', (sid,)).fetchone()
+        if linha is None or linha[1] <= time.time():
+            return None
+        self._contar('acertos')
+        return self.serializador.loads(linha[0]), linha[1]
+    
+    def gravar(self, sid, dados, expira_em):
+        self._contar('gravacoes')
+        with self._conexao() as conn:
+            conn.execute('INSERT OR REPLACE INTO sessoes (sid, dados, expira_em) VALUES (?, ?, ?)',
+                         (sid, self.serializador.dumps(dict(dados)), expira_em))
+    
+    def remover(self, sid):
+        self._contar('remocoes')
+        with self._conexao() as conn:
+            conn.execute('DELETE FROM sessoes WHERE sid = ?', (sid,))
+    
+    def expirar(self, agora=None):
+        """Remove de uma vez (pelo índice de expira_em) todas as sessões vencidas; devolve quantas"""
+        with self._conexao() as conn:
+            removidas = conn.execute('DELETE FROM sessoes WHERE expira_em <= ?',
+                                     (time.time() if agora is None else agora,)).rowcount
+        self._contar('expiradas', removidas)
+        return removidas
+    
+    def estatisticas(self):
+        total = self._conexao().execute('SELECT count(*) FROM sessoes').fetchone()[0]
+        with self._lock:
+            return {**self._estatisticas, 'sessoes': total, 'caminho': self.caminho}
+
+class InterfaceSessaoServidor(SessionInterface):
+    """session_interface do Flask com os dados no armazém e só um id aleatório no cookie.
+    
+    Requisições que só leem a sessão não gravam nada; a validade (SESSAO_TTL)
+    é estendida quando passa da metade, sem regravar a cada acesso."""
+    
+    def __init__(self, armazem, ttl):
+        self.armazem = armazem
+        self.ttl = ttl
+    
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            registro = self.armazem.ler(sid)
+            if registro is not None:
+                dados, expira_em = registro
+                return SessaoServidor(dados, sid, renovar=expira_em - time.time() < self.ttl / 2)
+        return SessaoServidor()
+    
+    def criar(self, dados):
+        """Grava uma sessão nova com dados e devolve o valor do cookie"""
+        sid = secrets.token_urlsafe(32)
+        self.armazem.gravar(sid, dados, time.time() + self.ttl)
+        return sid
+    
+    def save_session(self, app, sessao, resposta):
+        cookie = {
+            'domain': self.get_cookie_domain(app),
+            'path': self.get_cookie_path(app),
+            'secure': self.get_cookie_secure(app),
+            'partitioned': self.get_cookie_partitioned(app),
+            'samesite': self.get_cookie_samesite(app),
+            'httponly': self.get_cookie_httponly(app)
+        }
+        nome = self.get_cookie_name(app)
+        
+        if sessao.accessed:
+            resposta.vary.add('Cookie')
+        if sessao.sid_anterior:
+            self.armazem.remover(sessao.sid_anterior)
+        
+        if not sessao:
+            if sessao.modified:
+                if sessao.sid:
+                    self.armazem.remover(sessao.sid)
+                resposta.delete_cookie(nome, **cookie)
+                resposta.vary.add('Cookie')
+            return
+        
+        nova = sessao.sid is None
+        if nova or sessao.modified or sessao.renovar:
+            if nova:
+                sessao.sid = secrets.token_urlsafe(32)
+            self.armazem.gravar(sessao.sid, sessao, time.time() + self.ttl)
+        
+        if nova or self.should_set_cookie(app, sessao):
+            resposta.set_cookie(nome, sessao.sid, expires=self.get_expiration_time(app, sessao), **cookie)
+            resposta.vary.add('Cookie')
+
+def criar_armazem_sessoes(config=SESSAO_CONFIG):
+    if config['armazem'] == 'cookie':
+        return None
+    if config['armazem'] == 'memoria':
+        return ArmazemSessoesMemoria(config['max_itens'])
+    if config['armazem'] == 'sqlite':
+        return ArmazemSessoesSQLite(config['sqlite_caminho'])
+    raise ValueError(f"SESSAO_ARMAZEM deve ser cookie, memoria ou sqlite, não {config['armazem']!r}")
+
+armazem_sessoes = criar_armazem_sessoes()
+if armazem_sessoes is not None:
+    app.session_interface = InterfaceSessaoServidor(armazem_sessoes, SESSAO_CONFIG['ttl'])
+
+def cookie_de_sessao(dados):
+    """Valor do cookie de uma sessão nova com dados, em qualquer armazém (para benchmarks)"""
+    if isinstance(app.session_interface, InterfaceSessaoServidor):
+        return app.session_interface.criar(dados)
+    return app.session_interface.get_signing_serializer(app).dumps(dict(dados))
+
+def iniciar_sessao(usuario_id, nome, email, familia_id):
+    """Identidade do usuário na sessão, com a família: as rotas não precisam consultar usuarios"""
+    session.clear()
+    if isinstance(session, SessaoServidor):
+        session.regenerar()
+    session['usuario_id'] = usuario_id
+    session['usuario_nome'] = nome
+    session['usuario_email'] = email
+    session['familia_id'] = familia_id
+
+def familia_da_sessao():
+    """familia_id do usuário logado (guardado no login; sessões anteriores a isso consultam uma vez)"""
+    if 'familia_id' not in session:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT familia_id FROM usuarios WHERE id = %s', (session['usuario_id'],))
+            usuario = cursor.fetchone()
+        session['familia_id'] = usuario['familia_id'] if usuario else None
+    return session['familia_id']
+
+def iniciar_limpeza_sessoes(intervalo=None):
+    """Remove as sessões vencidas em segundo plano (SESSAO_LIMPEZA_SEGUNDOS, 0 desativa)"""
+    if intervalo is None:
+        intervalo = SESSAO_CONFIG['intervalo_limpeza']
+    if armazem_sessoes is None or intervalo <= 0:
+        return None
+    
+    def executar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                removidas = armazem_sessoes.expirar()
+                if removidas:
+                    logger.info('Sessões vencidas removidas', extra={'sessoes': removidas})
+            except Exception:
+                logger.exception('Erro na limpeza das sessões')
+    
+    thread = threading.Thread(target=executar, name='limpeza-sessoes', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('limpar-sessoes')
+def comando_limpar_sessoes():
+    """Remove de uma vez as sessões vencidas do armazém configurado"""
+    if armazem_sessoes is None:
+        click.echo('SESSAO_ARMAZEM=cookie: não há sessões no servidor')
+        return
+    click.echo(f'{armazem_sessoes.expirar()} sessões vencidas removidas ({armazem_sessoes.nome})')
+
+# ========== EVENTOS ENTRE PROCESSOS (VÁRIOS WORKERS) ==========
+
+CANAL_EVENTOS = 'netendencia_eventos'
+# Eventos à espera de envio; com o canal fora do ar, os que passarem disso são descartados
+EVENTOS_FILA_MAX = int(os.environ.get('EVENTOS_FILA_MAX', 10000))
+
+class EventosEntreProcessos:
+    """Repassa invalidações de cache e deltas dos agregados aos outros workers via LISTEN/NOTIFY
+
+    Só fica ativo quando iniciado (servidor com vários workers). publicar() apenas
+    enfileira, sem nunca bloquear a requisição: quem envia os NOTIFY e aplica os
+    eventos recebidos é a thread do canal. Se a fila enche (canal fora do ar), os
+    eventos novos são descartados e, na volta, os outros workers recebem um
+    'limpar_cache'; os agregados se acertam na reconciliação periódica."""
+
+    def __init__(self):
+        self.ativo = False
+        self._tratadores = {}
+        self._saida = queue.Queue(EVENTOS_FILA_MAX)
+        # Evento já retirado da fila cujo NOTIFY falhou: vai primeiro na próxima conexão
+        self._nao_enviado = None
+        self._descartou = False
+        self._despertar = None
+        self._estatisticas = {'publicados': 0, 'recebidos': 0, 'reconexoes': 0, 'descartados': 0}
+
+    def registrar(self, tipo, tratador):
+        self._tratadores[tipo] = tratador
+
+    def publicar(self, tipo, *args):
+        if not self.ativo:
+            return
+        try:
+            self._saida.put_nowait(self._montar(tipo, *args))
+        except queue.Full:
+            self._descartou = True
+            self._estatisticas['descartados'] += 1
+            return
+        try:
+            os.write(self._despertar[1], b'\0')
+        except BlockingIOError:
+            # Pipe cheio: a thread do canal já tem o que acordar
+            pass
+
+    def enviar_agora(self, tipo, *args):
+        """NOTIFY imediato, numa conexão própria, para processos sem a thread do canal
+        (comandos do flask); os workers em execução recebem como qualquer evento"""
+        conn = psycopg2.connect(**db_pool.db_config)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                self._notificar(cursor, self._montar(tipo, *args))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _montar(tipo, *args):
+        return json.dumps({'pid': os.getpid(), 'tipo': tipo, 'args': args})
+
+    def iniciar(self):
+        if self.ativo:
+            return
+        self._despertar = os.pipe()
+        os.set_blocking(self._despertar[1], False)
+        self.ativo = True
+        threading.Thread(target=self._executar, name='eventos-processos', daemon=True).start()
+
+    def _executar(self):
+        primeira_conexao = True
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**db_pool.db_config)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CANAL_EVENTOS}')
+                if not primeira_conexao:
+                    # Eventos podem ter se perdido enquanto o canal estava fora
+                    cache_dashboard.limpar()
+                primeira_conexao = False
+                self._escutar(conn)
+            except Exception:
+                logger.exception('Erro no canal de eventos entre processos')
+                self._estatisticas['reconexoes'] += 1
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _escutar(self, conn):
+        while True:
+            # Envia antes de esperar: eventos acumulados com o canal fora saem já na reconexão
+            with conn.cursor() as cursor:
+                if self._descartou:
+                    self._notificar(cursor, self._montar('limpar_cache'))
+                    self._descartou = False
+                while True:
+                    if self._nao_enviado is None:
+                        try:
+                            self._nao_enviado = self._saida.get_nowait()
+                        except queue.Empty:
+                            break
+                    self._notificar(cursor, self._nao_enviado)
+                    self._nao_enviado = None
             
-            print(f"✅ Conectado ao PostgreSQL AWS! {tabela_count} tabelas encontradas.")
+            conn.poll()
+            while conn.notifies:
+                self._tratar(conn.notifies.pop(0).payload)
             
-    except Exception as e:
-        print(f"❌ Erro ao conectar com PostgreSQL AWS: {e}")
+            prontos, _, _ = select.select([conn, self._despertar[0]], [], [], 60)
+            if self._despertar[0] in prontos:
+                os.read(self._despertar[0], 4096)
+
+    def _notificar(self, cursor, payload):
+        cursor.execute('SELECT pg_notify(%s, %s)', (CANAL_EVENTOS, payload))
+        self._estatisticas['publicados'] += 1
+
+    def _tratar(self, payload):
+        evento = json.loads(payload)
+        if evento['pid'] == os.getpid():
+            return
+        self._estatisticas['recebidos'] += 1
+        tratador = self._tratadores.get(evento['tipo'])
+        try:
+            if tratador:
+                tratador(*evento['args'])
+        except Exception:
+            logger.exception('Erro ao aplicar evento entre processos', extra={'tipo': evento['tipo']})
+
+    def estatisticas(self):
+        return {'ativo': self.ativo, 'pid': os.getpid(), 'na_fila': self._saida.qsize(), **self._estatisticas}
+
+eventos_processos = EventosEntreProcessos()
+eventos_processos.registrar('cache', lambda usuario_id, familia_id:
+                            invalidar_cache_dashboard(usuario_id, familia_id, propagar=False))
+eventos_processos.registrar('limpar_cache', lambda: cache_dashboard.limpar())
+eventos_processos.registrar('agregados', lambda metodo, *args:
+                            getattr(agregados_avaliacao, metodo)(*args, propagar=False))
 
 # ========== FUNÇÕES AUXILIARES CORRIGIDAS ==========
 
+SQL_MEMBROS_FAMILIA = '''
+    SELECT 
+        u.id, 
+        u.nome, 
+        u.idade, 
+        u.relacionamento,
+        ud.pontuacao,
+        ud.nivel
+    FROM usuarios u
+    LEFT JOIN ultimos_diagnosticos ud ON ud.usuario_id = u.id
+    WHERE u.familia_id = %s
+    ORDER BY u.id
+'''
+
 def obter_dados_familia(cursor, familia_id):
     """CORRIGIDA - Obter dados da família com tratamento robusto"""
     if not familia_id:
@@ -65,88 +2249,12 @@ def obter_dados_familia(cursor, familia_id):
     
     try:
         # Query mais simples e eficiente
-        cursor.execute('''
-            SELECT 
-                u.id, 
-                u.nome, 
-                u.idade, 
-                u.relacionamento,
-                (SELECT pontuacao FROM diagnosticos 
-                 WHERE usuario_id = u.id 
-                 ORDER BY data_diagnostico DESC 
-                 LIMIT 1) as pontuacao,
-                (SELECT nivel FROM diagnosticos 
-                 WHERE usuario_id = u.id 
-                 ORDER BY data_diagnostico DESC 
-                 LIMIT 1) as nivel
-            FROM usuarios u
-            WHERE u.familia_id = %s
-            ORDER BY u.id
-        ''', (familia_id,))
-        
-        membros = cursor.fetchall()
-        
-        if not membros:
-            return {
-                'membros': [], 
-                'media_pontuacao': 0, 
-                'nivel_predominante': 'N/A', 
-                'total_membros': 0,
-                'status': 'sem_membros'
-            }
-        
-        # Processar membros
-        membros_processados = []
-        pontuacoes_validas = []
-        niveis_validos = []
-        
-        for membro in membros:
-            membro_dict = dict(membro)
-            
-            # Garantir valores padrão
-            pontuacao = membro_dict.get('pontuacao')
-            nivel = membro_dict.get('nivel')
-            
-            membro_dict['pontuacao'] = pontuacao if pontuacao is not None else 0
-            membro_dict['nivel'] = nivel if nivel else 'Não avaliado'
-            membro_dict['relacionamento'] = membro_dict.get('relacionamento') or 'Não informado'
-            membro_dict['tem_diagnostico'] = pontuacao is not None
-            
-            membros_processados.append(membro_dict)
-            
-            # Coletar dados para estatísticas apenas de membros com diagnóstico
-            if pontuacao is not None and pontuacao > 0:
-                pontuacoes_validas.append(pontuacao)
-            if nivel and nivel != 'Não avaliado':
-                niveis_validos.append(nivel)
-        
-        # Calcular estatísticas
-        media_pontuacao = 0
-        if pontuacoes_validas:
-            media_pontuacao = sum(pontuacoes_validas) / len(pontuacoes_validas)
-        
-        nivel_predominante = 'N/A'
-        if niveis_validos:
-            # Encontrar nível mais comum
-            contador_niveis = {}
-            for nivel in niveis_validos:
-                contador_niveis[nivel] = contador_niveis.get(nivel, 0) + 1
-            
-            nivel_predominante = max(contador_niveis, key=contador_niveis.get)
-        
-        print(f"👨‍👩‍👧‍👦 Panorama familiar: {len(membros_processados)} membros, Média: {media_pontuacao:.1f}, Nível: {nivel_predominante}")
-        
-        return {
-            'membros': membros_processados,
-            'media_pontuacao': round(media_pontuacao, 1),
-            'nivel_predominante': nivel_predominante,
-            'total_membros': len(membros_processados),
-            'membros_com_diagnostico': len(pontuacoes_validas),
-            'status': 'sucesso'
-        }
+        cursor.execute(SQL_MEMBROS_FAMILIA, (familia_id,))
+        
+        return resumir_familia(cursor.fetchall())
     
     except Exception as e:
-        print(f"❌ Erro ao obter dados da família: {e}")
+        logger.exception('Erro ao obter dados da família', extra={'familia_id': familia_id})
         return {
             'membros': [], 
             'media_pontuacao': 0, 
@@ -156,72 +2264,407 @@ def obter_dados_familia(cursor, familia_id):
             'erro': str(e)
         }
 
-def obter_dica_do_dia(cursor, usuario_id):
-    """CORRIGIDA - Obter dica do dia com verificação robusta"""
-    try:
-        nivel = 'Moderado'  # Valor padrão
-        
-        if usuario_id:
-            cursor.execute('''
-                SELECT nivel FROM diagnosticos 
-                WHERE usuario_id = %s 
-                ORDER BY data_diagnostico DESC 
-                LIMIT 1
-            ''', (usuario_id,))
-            ultimo_diagnostico = cursor.fetchone()
-            
-            if ultimo_diagnostico and ultimo_diagnostico.get('nivel'):
-                nivel = ultimo_diagnostico['nivel']
-        
-        print(f"🎯 Dica do dia - Usuário {usuario_id}, Nível: {nivel}")
-        
-        dicas = {
-            'Dependente': [
-                "Que tal definir um alarme para lembrar de fazer pausas a cada hora?",
-                "Experimente deixar o celular em outro cômodo durante as refeições",
-                "Tente passar a primeira hora do dia sem verificar redes sociais",
-                "Estabeleça um horário fixo para desligar todos os dispositivos eletrônicos",
-                "Pratique a regra 20-20-20: a cada 20 minutos, olhe por 20 segundos para algo a 20 pés de distância",
-                "Desative notificações não essenciais do seu smartphone",
-                "Estabeleça metas realistas para reduzir gradualmente o tempo online",
-                "Pratique meditação ou exercícios de respiração quando sentir ansiedade"
-            ],
-            'Moderado': [
-                "Parabéns pelo equilíbrio! Continue monitorando seu tempo online",
-                "Que tal estabelecer uma 'hora digital' para desligar dispositivos?",
-                "Pratique atividades sem telas antes de dormir para melhorar a qualidade do sono",
-                "Experimente ter um dia por semana com uso mínimo de internet",
-                "Mantenha um diário das atividades offline que mais lhe dão prazer",
-                "Estabeleça zonas livres de tecnologia em sua casa",
-                "Pratique a técnica Pomodoro (25 minutos focado, 5 minutos de pausa)",
-                "Desenvolva um hobby que não envolva telas"
-            ],
-            'Não dependente': [
-                "Excelente trabalho mantendo hábitos saudáveis!",
-                "Compartilhe suas estratégias de equilíbrio digital com amigos e familiares",
-                "Continue aproveitando o melhor da tecnologia sem excessos",
-                "Ajude outros membros da família a encontrar o equilíbrio",
-                "Periodicamente reavalie seu relacionamento com a tecnologia",
-                "Mantenha atividades sociais presenciais regularmente",
-                "Continue com exercícios físicos e hobbies offline",
-                "Comemore suas conquistas de equilíbrio digital"
-            ]
+def resumir_familia(membros):
+    """Calcula o panorama familiar a partir das linhas (id, nome, idade, relacionamento, pontuacao, nivel)"""
+    if not membros:
+        return {
+            'membros': [], 
+            'media_pontuacao': 0, 
+            'nivel_predominante': 'N/A', 
+            'total_membros': 0,
+            'status': 'sem_membros'
         }
+    
+    # Processar membros
+    membros_processados = []
+    pontuacoes_validas = []
+    niveis_validos = []
+    
+    for membro in membros:
+        membro_dict = dict(membro)
+        
+        # Garantir valores padrão
+        pontuacao = membro_dict.get('pontuacao')
+        nivel = membro_dict.get('nivel')
         
-        # Garantir que o nível existe, caso contrário usar Moderado
-        dicas_nivel = dicas.get(nivel, dicas['Moderado'])
+        membro_dict['pontuacao'] = pontuacao if pontuacao is not None else 0
+        membro_dict['nivel'] = nivel if nivel else 'Não avaliado'
+        membro_dict['relacionamento'] = membro_dict.get('relacionamento') or 'Não informado'
+        membro_dict['tem_diagnostico'] = pontuacao is not None
         
-        # Escolher dica baseada no dia do ano (sempre muda)
-        dia_do_ano = datetime.now().timetuple().tm_yday
-        indice_dica = dia_do_ano % len(dicas_nivel)
-        dica_escolhida = dicas_nivel[indice_dica]
+        membros_processados.append(membro_dict)
         
-        print(f"💡 Dica escolhida: {dica_escolhida} (índice: {indice_dica})")
-        return dica_escolhida
+        # Coletar dados para estatísticas apenas de membros com diagnóstico
+        if pontuacao is not None and pontuacao > 0:
+            pontuacoes_validas.append(pontuacao)
+        if nivel and nivel != 'Não avaliado':
+            niveis_validos.append(nivel)
     
-    except Exception as e:
-        print(f"❌ Erro ao obter dica do dia: {e}")
-        return "Mantenha o equilíbrio entre vida online e offline! Pratique atividades offline regularmente."
+    # Calcular estatísticas
+    media_pontuacao = 0
+    if pontuacoes_validas:
+        media_pontuacao = sum(pontuacoes_validas) / len(pontuacoes_validas)
+    
+    nivel_predominante = 'N/A'
+    if niveis_validos:
+        # Encontrar nível mais comum
+        contador_niveis = {}
+        for nivel in niveis_validos:
+            contador_niveis[nivel] = contador_niveis.get(nivel, 0) + 1
+        
+        nivel_predominante = max(contador_niveis, key=contador_niveis.get)
+    
+    logger.debug('Panorama familiar', extra={'membros': len(membros_processados), 'media': round(media_pontuacao, 1), 'nivel': nivel_predominante})
+    
+    return {
+        'membros': membros_processados,
+        'media_pontuacao': round(media_pontuacao, 1),
+        'nivel_predominante': nivel_predominante,
+        'total_membros': len(membros_processados),
+        'membros_com_diagnostico': len(pontuacoes_validas),
+        'status': 'sucesso'
+    }
+
+# ========== CATÁLOGO DE CONTEÚDO (SOLUÇÕES E DICAS) ==========
+
+# Um arquivo por idioma (pt-BR.json, en.json...) com {"solucoes": {nível: [...]}, "dicas": {nível: [...]}};
+# editados em produção, são recarregados sozinhos
+CONTEUDO_DIR = os.environ.get('NETENDENCIA_CONTEUDO',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'conteudo'))
+CONTEUDO_VERIFICAR_ARQUIVOS = float(os.environ.get('CONTEUDO_VERIFICAR_ARQUIVOS', 5))
+CACHE_CONTROL_CONTEUDO = f"public, max-age={int(os.environ.get('CONTEUDO_MAX_AGE', 300))}"
+
+IDIOMA_PADRAO = 'pt-BR'
+NIVEL_PADRAO_DICAS = 'Moderado'
+DICA_RESERVA = "Mantenha o equilíbrio entre vida online e offline! Pratique atividades offline regularmente."
+
+def congelar_textos_por_nivel(textos_por_nivel, descricao):
+    """{nível: [textos]} em {nível: (textos,)} com as strings internadas; ValueError se o formato não servir"""
+    if not isinstance(textos_por_nivel, dict) or not textos_por_nivel:
+        raise ValueError(f'{descricao}: esperado um objeto com os textos de cada nível')
+    congelado = {}
+    for nivel, textos in textos_por_nivel.items():
+        if not isinstance(textos, (list, tuple)) or not textos or not all(isinstance(t, str) and t for t in textos):
+            raise ValueError(f'{descricao}: o nível {nivel!r} precisa de uma lista de textos não vazia')
+        congelado[sys.intern(nivel)] = tuple(sys.intern(texto) for texto in textos)
+    return congelado
+
+def serializar_conteudo(dados):
+    """Mesmos bytes que o jsonify produziria"""
+    return (app.json.dumps(dados, separators=(',', ':')) + '\n').encode('utf-8')
+
+class CatalogoConteudo:
+    """Soluções e dicas do dia de todos os idiomas, com as respostas já serializadas.
+    
+    Tudo fica num único mapeamento imutável por (tipo, idioma, nível[, dia do ano]):
+    recarregar monta um novo e troca a referência de uma vez, então a leitura não
+    precisa de lock nem aloca nada. Níveis com dicas na tabela `dicas` do banco
+    usam essas no lugar das do arquivo do idioma."""
+
+    def __init__(self, diretorio=CONTEUDO_DIR):
+        self.diretorio = diretorio
+        self.tabela = None
+        self.idiomas = ()
+        self.origem_dicas = {}
+        self.carregado_em = None
+        self._mtimes = None
+        self._proxima_verificacao = 0.0
+
+    def mtimes_arquivos(self):
+        return {nome: os.stat(os.path.join(self.diretorio, nome)).st_mtime
+                for nome in sorted(os.listdir(self.diretorio)) if nome.endswith('.json')}
+
+    def ler_arquivos(self):
+        """(mtimes, {idioma: conteúdo}); o nome do arquivo é o idioma"""
+        mtimes = self.mtimes_arquivos()
+        conteudo = {}
+        for nome in mtimes:
+            with open(os.path.join(self.diretorio, nome), encoding='utf-8') as arquivo:
+                conteudo[nome[:-len('.json')]] = json.load(arquivo)
+        return mtimes, conteudo
+
+    def ler_dicas_banco(self):
+        """{idioma: {nível: [dicas]}} da tabela `dicas`"""
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT idioma, nivel, texto FROM dicas ORDER BY idioma, nivel, ordem, id')
+                linhas = cursor.fetchall()
+        except db_pool.backend.erro:
+            # Banco ainda sem as migrações da tabela `dicas`
+            logger.warning('Tabela de dicas indisponível; usando só os arquivos de conteúdo', exc_info=True)
+            return {}
+        dicas = {}
+        for linha in linhas:
+            dicas.setdefault(linha['idioma'], {}).setdefault(linha['nivel'], []).append(linha['texto'])
+        return dicas
+
+    def carregar(self):
+        mtimes, conteudo = self.ler_arquivos()
+        if IDIOMA_PADRAO not in conteudo:
+            raise ValueError(f'Falta o conteúdo do idioma padrão ({IDIOMA_PADRAO}.json em {self.diretorio})')
+        dicas_banco = self.ler_dicas_banco()
+        
+        tabela = {}
+        origem_dicas = {}
+        for idioma, dados in conteudo.items():
+            idioma = sys.intern(idioma)
+            solucoes = congelar_textos_por_nivel(dados.get('solucoes'), f'{idioma}: solucoes')
+            origem_dicas[idioma] = 'banco' if idioma in dicas_banco else 'arquivo'
+            dicas = congelar_textos_por_nivel({**(dados.get('dicas') or {}), **dicas_banco.get(idioma, {})},
+                                              f'{idioma}: dicas')
+            if NIVEL_PADRAO_DICAS not in dicas:
+                raise ValueError(f'{idioma}: dicas precisam incluir o nível {NIVEL_PADRAO_DICAS!r}')
+            
+            for nivel, textos in solucoes.items():
+                corpo = serializar_conteudo({'success': True, 'nivel': nivel, 'solucoes': textos})
+                tabela[('solucoes', idioma, nivel)] = (textos, corpo, hashlib.sha256(corpo).hexdigest()[:32], idioma)
+            for nivel, textos in dicas.items():
+                for dia in range(1, 367):
+                    dica = textos[dia % len(textos)]
+                    tabela[('dica', idioma, nivel, dia)] = (dica, serializar_conteudo({'dica': dica}), idioma)
+        
+        self.tabela = MappingProxyType(tabela)
+        self.idiomas = tuple(sorted(conteudo))
+        self.origem_dicas = origem_dicas
+        self.carregado_em = datetime.now()
+        self._mtimes = mtimes
+        logger.info('Catálogo de conteúdo carregado', extra={'idiomas': list(self.idiomas),
+                                                             'origem_dicas': origem_dicas})
+        return len(self.idiomas)
+
+    def verificar_arquivos(self):
+        """Recarrega se algum arquivo mudou (no máximo uma verificação a cada CONTEUDO_VERIFICAR_ARQUIVOS segundos)"""
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return
+        self._proxima_verificacao = agora + CONTEUDO_VERIFICAR_ARQUIVOS
+        try:
+            if self.mtimes_arquivos() != self._mtimes:
+                self.carregar()
+        except (OSError, ValueError):
+            # Arquivo no meio de uma edição ou inválido: continua com o catálogo atual
+            logger.exception('Falha ao recarregar o catálogo de conteúdo', extra={'diretorio': self.diretorio})
+
+    def pronto(self):
+        if self.tabela is None:
+            self.carregar()
+        else:
+            self.verificar_arquivos()
+        return self.tabela
+
+    def solucoes(self, idioma, nivel):
+        """(soluções, corpo JSON, ETag, idioma servido) do nível, ou None para nível desconhecido;
+        níveis que faltam no idioma vêm do idioma padrão"""
+        tabela = self.pronto()
+        return tabela.get(('solucoes', idioma, nivel)) or tabela.get(('solucoes', IDIOMA_PADRAO, nivel))
+
+    def dica(self, idioma, nivel, dia=None):
+        """(dica, corpo JSON, idioma servido) do nível no dia do ano (hoje, se omitido); nível
+        desconhecido usa o padrão e idioma sem arquivo, o idioma padrão"""
+        tabela = self.pronto()
+        dia = dia or date.today().timetuple().tm_yday
+        if idioma not in self.idiomas:
+            idioma = IDIOMA_PADRAO
+        return tabela.get(('dica', idioma, nivel, dia)) or tabela[('dica', idioma, NIVEL_PADRAO_DICAS, dia)]
+
+catalogo_conteudo = CatalogoConteudo()
+eventos_processos.registrar('conteudo', catalogo_conteudo.carregar)
+
+@functools.lru_cache(maxsize=256)
+def idioma_aceito(accept_language, idiomas):
+    """Melhor idioma do catálogo para o cabeçalho Accept-Language (os cabeçalhos se repetem muito)"""
+    return parse_accept_header(accept_language, LanguageAccept).best_match(idiomas, default=IDIOMA_PADRAO)
+
+def escolher_idioma(parametro=None, accept_language=None):
+    """Idioma pedido em ?idioma= ou, senão, pelo Accept-Language; o padrão quando nenhum está no catálogo"""
+    if parametro in catalogo_conteudo.idiomas:
+        return parametro
+    if accept_language:
+        return idioma_aceito(accept_language, catalogo_conteudo.idiomas)
+    return IDIOMA_PADRAO
+
+def idioma_da_requisicao():
+    return escolher_idioma(request.args.get('idioma'), request.headers.get('Accept-Language'))
+
+def nivel_atual(usuario_id, cursor=None):
+    """Nível do último diagnóstico: do dashboard em cache ou de ultimos_diagnosticos (busca pela chave).
+    
+    Sem cursor, só abre conexão quando o usuário não está no cache."""
+    if not usuario_id:
+        return NIVEL_PADRAO_DICAS
+    
+    dashboard = cache_dashboard.obter(chave_dashboard(usuario_id))
+    if dashboard is not None:
+        ultimo = dashboard['ultimo_diagnostico']
+    elif cursor is None:
+        with get_db_connection() as conn:
+            return nivel_atual(usuario_id, conn.cursor())
+    else:
+        cursor.execute('SELECT nivel FROM ultimos_diagnosticos WHERE usuario_id = %s', (usuario_id,))
+        ultimo = cursor.fetchone()
+    return ultimo['nivel'] if ultimo and ultimo.get('nivel') else NIVEL_PADRAO_DICAS
+
+def obter_dica_do_dia(cursor, usuario_id):
+    """Dica do dia do usuário (anônimo recebe a do nível padrão, sem consultar o banco)"""
+    try:
+        nivel = nivel_atual(usuario_id, cursor)
+        logger.debug('Dica do dia', extra={'usuario_id': usuario_id, 'nivel': nivel})
+        return escolher_dica_do_dia(nivel)
+    
+    except Exception:
+        logger.exception('Erro ao obter dica do dia')
+        return DICA_RESERVA
+
+def escolher_dica_do_dia(nivel, idioma=IDIOMA_PADRAO):
+    """Dica do dia para o nível informado, sem acessar o banco (níveis desconhecidos usam o padrão)"""
+    return catalogo_conteudo.dica(idioma, nivel)[0]
+
+# ========== CREDENCIAIS ==========
+
+CREDENCIAIS_CONFIG = {
+    # scrypt com n = 2 ** custo: cada hash usa 128 * blocos * n bytes de memória (16 MiB no padrão)
+    'custo': int(os.environ.get('SENHA_CUSTO', 14)),
+    'blocos': int(os.environ.get('SENHA_BLOCOS', 8)),
+    'paralelismo': int(os.environ.get('SENHA_PARALELISMO', 1)),
+    # 0 = calcula na própria thread da requisição, sem pool
+    'trabalhadores': int(os.environ.get('SENHA_TRABALHADORES', os.cpu_count() or 1)),
+    # Hashes aguardando além dos que estão rodando; acima disso o login responde 503
+    'fila_max': int(os.environ.get('SENHA_FILA_MAX', 64))
+}
+
+class CredenciaisOcupadasError(Exception):
+    """A fila de hashes de senha está cheia (rajada de logins acima da capacidade do pool)"""
+
+def _b64(dados):
+    return base64.b64encode(dados).decode('ascii').rstrip('=')
+
+def _de_b64(texto):
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+def calcular_scrypt(senha, sal, custo, blocos, paralelismo):
+    n = 2 ** custo
+    return hashlib.scrypt(senha.encode('utf-8'), salt=sal, n=n, r=blocos, p=paralelismo,
+                          maxmem=129 * blocos * (n + paralelismo) + 1024 * 1024, dklen=32)
+
+class Credenciais:
+    """Hash (scrypt) e verificação de senhas num pool limitado de threads.
+    
+    O hashlib.scrypt libera o GIL: o pool limita quantos hashes rodam ao mesmo
+    tempo (CPU e memória) e, numa rajada de logins, a fila tem tamanho máximo:
+    quem passa dele recebe CredenciaisOcupadasError na hora, em vez de esperar
+    até o timeout do worker. Formato armazenado:
+    scrypt$custo$blocos$paralelismo$sal$chave (base64 sem '='). Senhas antigas em
+    texto puro continuam aceitas e voltam com o hash para gravar no lugar."""
+    
+    PREFIXO = 'scrypt$'
+    
+    def __init__(self, custo, blocos, paralelismo, trabalhadores, fila_max):
+        self.custo = custo
+        self.blocos = blocos
+        self.paralelismo = paralelismo
+        self.trabalhadores = trabalhadores
+        self.fila_max = fila_max
+        self._vagas = threading.BoundedSemaphore(max(1, trabalhadores) + fila_max)
+        self._executor = None
+        self._pid = None
+        self._hash_ficticio = None
+        self._lock = threading.Lock()
+        self._estatisticas = {
+            'hashes': 0,
+            'verificacoes': 0,
+            'texto_puro_migradas': 0,
+            'hashes_atualizados': 0,
+            'recusadas_fila_cheia': 0,
+            'tempo_total': 0.0
+        }
+    
+    def _pool(self):
+        # Threads não sobrevivem ao fork: cada worker cria o seu pool no primeiro uso
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.trabalhadores,
+                                                    thread_name_prefix='credenciais')
+                self._pid = os.getpid()
+            return self._executor
+    
+    def _executar(self, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                self._estatisticas['recusadas_fila_cheia'] += 1
+            raise CredenciaisOcupadasError('Fila de hashes de senha cheia')
+        inicio = time.perf_counter()
+        try:
+            if self.trabalhadores <= 0:
+                return funcao(*args)
+            return self._pool().submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+            with self._lock:
+                self._estatisticas['tempo_total'] += time.perf_counter() - inicio
+    
+    def _gerar(self, senha):
+        sal = os.urandom(16)
+        chave = calcular_scrypt(senha, sal, self.custo, self.blocos, self.paralelismo)
+        return f'{self.PREFIXO}{self.custo}${self.blocos}${self.paralelismo}${_b64(sal)}${_b64(chave)}'
+    
+    def _conferir(self, senha, armazenado):
+        """(confere, hash novo a gravar ou None); roda numa thread do pool"""
+        if not armazenado or not armazenado.startswith(self.PREFIXO):
+            if not armazenado:
+                # Usuário inexistente ou sem senha: mesmo custo de um login real
+                self._verificar_ficticio(senha)
+                return False, None
+            if not hmac.compare_digest(senha.encode('utf-8'), armazenado.encode('utf-8')):
+                # Senha errada numa conta ainda em texto puro: mesmo custo, para o tempo
+                # de resposta não revelar quais contas ainda não migraram
+                self._verificar_ficticio(senha)
+                return False, None
+            with self._lock:
+                self._estatisticas['texto_puro_migradas'] += 1
+            return True, self._gerar(senha)
+        
+        try:
+            custo, blocos, paralelismo, sal, chave = armazenado[len(self.PREFIXO):].split('$')
+            custo, blocos, paralelismo = int(custo), int(blocos), int(paralelismo)
+            sal, chave = _de_b64(sal), _de_b64(chave)
+        except ValueError:
+            logger.warning('Hash de senha em formato desconhecido')
+            return False, None
+        if not hmac.compare_digest(calcular_scrypt(senha, sal, custo, blocos, paralelismo), chave):
+            return False, None
+        if (custo, blocos, paralelismo) != (self.custo, self.blocos, self.paralelismo):
+            with self._lock:
+                self._estatisticas['hashes_atualizados'] += 1
+            return True, self._gerar(senha)
+        return True, None
+    
+    def _verificar_ficticio(self, senha):
+        if self._hash_ficticio is None:
+            self._hash_ficticio = self._gerar(os.urandom(16).hex())
+        self._conferir(senha, self._hash_ficticio)
+    
+    def gerar_hash(self, senha):
+        """Hash da senha para gravar em usuarios.senha"""
+        with self._lock:
+            self._estatisticas['hashes'] += 1
+        return self._executar(self._gerar, senha)
+    
+    def verificar(self, senha, armazenado):
+        """(confere, hash novo) — o hash novo vem quando a senha estava em texto puro
+        ou com outro custo, e deve substituir o armazenado"""
+        with self._lock:
+            self._estatisticas['verificacoes'] += 1
+        return self._executar(self._conferir, senha, armazenado)
+    
+    def estatisticas(self):
+        with self._lock:
+            dados = dict(self._estatisticas)
+        dados.update({'custo': self.custo, 'blocos': self.blocos, 'paralelismo': self.paralelismo,
+                      'trabalhadores': self.trabalhadores, 'fila_max': self.fila_max})
+        return dados
+
+credenciais = Credenciais(**CREDENCIAIS_CONFIG)
 
 # ========== SERVIÇOS DE DIAGNÓSTICO ==========
 
@@ -236,40 +2679,10 @@ class ServicoDiagnostico:
             return "Dependente"
     
     @staticmethod
-    def obter_solucoes_por_nivel(nivel):
-        solucoes = {
-            'Dependente': [
-                "Estabeleça limites de tempo rigorosos para uso da internet",
-                "Desative notificações de redes sociais durante o trabalho",
-                "Pratique atividades offline como exercícios físicos ou leitura",
-                "Busque apoio familiar para monitoramento",
-                "Use aplicativos de controle de tempo de tela",
-                "Estabeleça zonas livres de dispositivos em casa",
-                "Procure ajuda profissional se necessário",
-                "Participe de grupos de apoio online"
-            ],
-            'Moderado': [
-                "Faça pausas regulares a cada 45 minutos de uso",
-                "Estabeleça zonas livres de dispositivos em casa",
-                "Pratique a técnica Pomodoro para melhor gestão do tempo",
-                "Mantenha um diário de uso da internet",
-                "Defina horários específicos para verificar redes sociais",
-                "Pratique atividades físicas regularmente",
-                "Estabeleça metas realistas de redução de tempo online",
-                "Desenvolva hobbies offline"
-            ],
-            'Não dependente': [
-                "Continue mantendo hábitos saudáveis de uso digital",
-                "Compartilhe suas estratégias com familiares",
-                "Periodicamente reavalie seu relacionamento com a tecnologia",
-                "Mantenha atividades sociais e hobbies offline",
-                "Ajude outros membros da família a alcançar o equilíbrio",
-                "Continue com atividades físicas regulares",
-                "Mantenha uma rotina equilibrada entre online e offline",
-                "Comemore suas conquistas de equilíbrio digital"
-            ]
-        }
-        return solucoes.get(nivel, [])
+    def obter_solucoes_por_nivel(nivel, idioma=IDIOMA_PADRAO):
+        """Soluções do catálogo de conteúdo (tupla imutável; vazia para nível desconhecido)"""
+        solucoes = catalogo_conteudo.solucoes(idioma, nivel)
+        return solucoes[0] if solucoes else ()
     
     @staticmethod
     def verificar_reavaliacao_necesaria(ultimo_diagnostico):
@@ -290,22 +2703,245 @@ class ServicoDiagnostico:
         except:
             return True
 
+# ========== ASSETS ESTÁTICOS ==========
+
+ASSETS_ORIGEM = os.path.dirname(os.path.abspath(__file__))
+# Saída de `flask --app app construir-assets`; sem ela os assets são construídos em memória na subida
+ASSETS_DIR = os.environ.get('NETENDENCIA_ASSETS', os.path.join(ASSETS_ORIGEM, 'build'))
+
+# Páginas têm URL fixa e são revalidadas por ETag; os demais arquivos ganham o hash no nome
+# e podem ficar em cache para sempre (referencie-os nas páginas como /assets/<nome>)
+PAGINAS_ESTATICAS = ('index.html', 'landing.html', 'avaliacao-geral.html')
+ARQUIVOS_ESTATICOS = ('style.css', 'imagens/*')
+TIPOS_COMPRIMIVEIS = {'text/html', 'text/css', 'text/javascript', 'application/javascript',
+                      'application/json', 'image/svg+xml'}
+CACHE_CONTROL_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL_PAGINAS = 'no-cache'
+
+BLOCOS_HTML_PRESERVADOS = re.compile(
+    r'(<style\b[^>]*>)(.*?)(</style\s*>)|<(script|pre|textarea)\b.*?</\4\s*>', re.S | re.I)
+
+REFERENCIA_ASSET = re.compile(r'/assets/([^"\'()\s?#]+)')
+
+def minificar_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+def minificar_trecho_html(html):
+    html = re.sub(r'<!--(?!\[if).*?-->', '', html, flags=re.S)
+    return re.sub(r'[ \t]*\n\s*', '\n', html)
+
+def minificar_html(html):
+    """Tira comentários e indentação do HTML e minifica os <style>.
+    
+    <script>, <pre> e <textarea> ficam intactos: minificar JavaScript com
+    segurança exige um parser, e o gzip/brotli já remove quase toda a redundância."""
+    partes = []
+    posicao = 0
+    for bloco in BLOCOS_HTML_PRESERVADOS.finditer(html):
+        partes.append(minificar_trecho_html(html[posicao:bloco.start()]))
+        if bloco.group(1):
+            partes.append(bloco.group(1) + minificar_css(bloco.group(2)) + bloco.group(3))
+        else:
+            partes.append(bloco.group(0))
+        posicao = bloco.end()
+    partes.append(minificar_trecho_html(html[posicao:]))
+    return ''.join(partes).strip() + '\n'
+
+def comprimir(conteudo):
+    """Versões pré-comprimidas que valem a pena: {'br': ..., 'gzip': ...} (br só com o pacote brotli)"""
+    versoes = {'gzip': gzip.compress(conteudo, 9, mtime=0)}
+    try:
+        import brotli
+        versoes['br'] = brotli.compress(conteudo, quality=11)
+    except ImportError:
+        pass
+    return {codificacao: dados for codificacao, dados in versoes.items() if len(dados) < len(conteudo)}
+
+def arquivos_de_origem(origem=ASSETS_ORIGEM):
+    """[(nome lógico, é página)] dos assets presentes em origem"""
+    arquivos = [(nome, True) for nome in PAGINAS_ESTATICAS if os.path.exists(os.path.join(origem, nome))]
+    for padrao in ARQUIVOS_ESTATICOS:
+        for caminho in sorted(glob.glob(os.path.join(origem, padrao))):
+            if os.path.isfile(caminho):
+                arquivos.append((os.path.relpath(caminho, origem).replace(os.sep, '/'), False))
+    return arquivos
+
+def construir_assets(origem=ASSETS_ORIGEM):
+    """Minifica, põe o hash no nome e pré-comprime os assets.
+    
+    Devolve {nome lógico: asset}, em que asset tem o arquivo final, o tipo, o hash
+    (ETag) e os conteúdos por codificação (None = sem compressão)."""
+    assets = {}
+    for nome, pagina in arquivos_de_origem(origem):
+        with open(os.path.join(origem, nome), 'rb') as arquivo:
+            conteudo = arquivo.read()
+        tipo = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+        if tipo == 'text/html':
+            conteudo = minificar_html(conteudo.decode('utf-8')).encode('utf-8')
+        elif tipo == 'text/css':
+            conteudo = minificar_css(conteudo.decode('utf-8')).encode('utf-8')
+        
+        digest = hashlib.sha256(conteudo).hexdigest()
+        raiz, extensao = os.path.splitext(nome)
+        conteudos = comprimir(conteudo) if tipo in TIPOS_COMPRIMIVEIS else {}
+        conteudos[None] = conteudo
+        assets[nome] = {
+            'arquivo': nome if pagina else f'{raiz}.{digest[:12]}{extensao}',
+            'tipo': tipo,
+            'hash': digest[:32],
+            'conteudos': conteudos
+        }
+    
+    # Nas páginas, /assets/<nome lógico> passa a apontar para o arquivo com hash
+    arquivos = {nome: asset['arquivo'] for nome, asset in assets.items()}
+    for nome, asset in assets.items():
+        if asset['tipo'] == 'text/html':
+            html = REFERENCIA_ASSET.sub(lambda ref: '/assets/' + arquivos.get(ref.group(1), ref.group(1)),
+                                        asset['conteudos'][None].decode('utf-8'))
+            conteudo = html.encode('utf-8')
+            if conteudo != asset['conteudos'][None]:
+                asset['hash'] = hashlib.sha256(conteudo).hexdigest()[:32]
+                asset['conteudos'] = {**comprimir(conteudo), None: conteudo}
+    return assets
+
+def gravar_assets(assets, destino=ASSETS_DIR):
+    """Grava os arquivos (mais .gz/.br) e o manifest.json lido na subida do app"""
+    manifesto = {}
+    for nome, asset in assets.items():
+        # Original primeiro: variantes .gz/.br mais velhas que ele são tratadas como desatualizadas
+        for codificacao, conteudo in sorted(asset['conteudos'].items(), key=lambda item: item[0] is not None):
+            caminho = os.path.join(destino, asset['arquivo'] + {None: '', 'gzip': '.gz', 'br': '.br'}[codificacao])
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(conteudo)
+        manifesto[nome] = {'arquivo': asset['arquivo'], 'tipo': asset['tipo'], 'hash': asset['hash'],
+                           'codificacoes': sorted(c for c in asset['conteudos'] if c)}
+    with open(os.path.join(destino, 'manifest.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+
+def ler_assets(destino=ASSETS_DIR):
+    """Assets gravados por gravar_assets, no mesmo formato de construir_assets"""
+    with open(os.path.join(destino, 'manifest.json'), encoding='utf-8') as arquivo:
+        manifesto = json.load(arquivo)
+    assets = {}
+    for nome, asset in manifesto.items():
+        conteudos = {}
+        for codificacao in [None, *asset['codificacoes']]:
+            sufixo = {None: '', 'gzip': '.gz', 'br': '.br'}[codificacao]
+            with open(os.path.join(destino, asset['arquivo'] + sufixo), 'rb') as arquivo:
+                conteudos[codificacao] = arquivo.read()
+        assets[nome] = {**asset, 'conteudos': conteudos}
+    return assets
+
+class CatalogoAssets:
+    """Páginas e arquivos estáticos já minificados e comprimidos, todos em memória.
+    
+    Na subida lê o build (manifest.json); sem build, constrói em memória a partir
+    dos fontes e, no modo debug, reconstrói quando algum deles muda."""
+
+    def __init__(self, origem=ASSETS_ORIGEM, destino=ASSETS_DIR):
+        self.origem = origem
+        self.destino = destino
+        self.assets = None
+        self.por_arquivo = None
+        self.construido_em_memoria = False
+        self._mtimes = None
+
+    def mtimes_origem(self):
+        return {nome: os.stat(os.path.join(self.origem, nome)).st_mtime for nome, _ in arquivos_de_origem(self.origem)}
+
+    def carregar(self):
+        if os.path.exists(os.path.join(self.destino, 'manifest.json')):
+            assets = ler_assets(self.destino)
+            self.construido_em_memoria = False
+        else:
+            self._mtimes = self.mtimes_origem()
+            assets = construir_assets(self.origem)
+            self.construido_em_memoria = True
+            if not app.debug:
+                logger.warning('Assets construídos em memória; em produção rode `flask --app app construir-assets`',
+                               extra={'destino': self.destino})
+        
+        self.por_arquivo = MappingProxyType({asset['arquivo']: asset for asset in assets.values()})
+        self.assets = MappingProxyType(assets)
+        logger.info('Assets carregados', extra={'assets': len(assets), 'em_memoria': self.construido_em_memoria})
+        return len(assets)
+
+    def obter(self, nome):
+        """Asset pelo nome lógico ou pelo arquivo com hash (ou None)"""
+        if self.assets is None or (self.construido_em_memoria and app.debug
+                                   and self.mtimes_origem() != self._mtimes):
+            self.carregar()
+        return self.assets.get(nome) or self.por_arquivo.get(nome)
+
+catalogo_assets = CatalogoAssets()
+
+def responder_asset(asset, cache_control):
+    """Representação pré-comprimida aceita pelo cliente (br, gzip ou sem compressão), com ETag própria"""
+    codificacao = None
+    for candidata in ('br', 'gzip'):
+        if candidata in asset['conteudos'] and request.accept_encodings[candidata]:
+            codificacao = candidata
+            break
+    etag = f"{asset['hash']}-{codificacao}" if codificacao else asset['hash']
+    
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(asset['conteudos'][codificacao], mimetype=asset['tipo'])
+        if codificacao:
+            resposta.content_encoding = codificacao
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = cache_control
+    if len(asset['conteudos']) > 1:
+        resposta.vary.add('Accept-Encoding')
+    return resposta
+
+def pagina_estatica(nome):
+    asset = catalogo_assets.obter(nome)
+    if asset is None:
+        return jsonify({'error': f'Página {nome} não encontrada'}), 404
+    return responder_asset(asset, CACHE_CONTROL_PAGINAS)
+
+@app.route('/assets/<path:nome>')
+def servir_asset(nome):
+    """Arquivo com hash no nome: cache imutável; pelo nome lógico: revalidado por ETag"""
+    asset = catalogo_assets.obter(nome)
+    if asset is None or asset['tipo'] == 'text/html':
+        return jsonify({'error': 'Arquivo não encontrado'}), 404
+    return responder_asset(asset, CACHE_CONTROL_PAGINAS if nome in catalogo_assets.assets else CACHE_CONTROL_IMUTAVEL)
+
+@app.cli.command('construir-assets')
+@click.option('--destino', default=ASSETS_DIR, show_default=True, help='Diretório do build')
+def comando_construir_assets(destino):
+    """Minifica, põe hash no nome e pré-comprime (gzip e, com o pacote brotli, br) páginas e estáticos"""
+    assets = construir_assets()
+    gravar_assets(assets, destino)
+    for nome, asset in assets.items():
+        tamanhos = '  '.join(f"{codificacao or 'original'} {len(conteudo) / 1024:.1f} KiB"
+                             for codificacao, conteudo in sorted(asset['conteudos'].items(), key=lambda item: item[0] or ''))
+        click.echo(f"{asset['arquivo']:45} {tamanhos}")
+    click.echo(f'{len(assets)} assets gravados em {destino}')
+
 # ========== ROTAS PRINCIPAIS ==========
 
 @app.route('/')
 def index():
     if 'usuario_id' not in session:
         return redirect('/landing')
-    return render_template('index.html')
+    return pagina_estatica('index.html')
 
 @app.route('/landing')
 def landing():
-    return render_template('landing.html')
+    return pagina_estatica('landing.html')
 
 @app.route('/avaliacao-geral')
 def avaliacao_geral():
     """Rota para a página de avaliação geral - ACESSO PÚBLICO"""
-    return render_template('avaliacao-geral.html')
+    return pagina_estatica('avaliacao-geral.html')
 
 @app.route('/instituicoes')
 def pagina_instituicoes():
@@ -329,143 +2965,330 @@ def pagina_lista_instituicoes():
 
 @app.route('/api/avaliacao-geral/dados')
 def api_avaliacao_geral_dados():
-    """API para obter dados da avaliação geral - TODOS OS USUÁRIOS DO SISTEMA"""
+    """API para obter dados da avaliação geral - TODOS OS USUÁRIOS DO SISTEMA
+    
+    Responde a partir dos agregados em memória, sem consultar a tabela usuarios.
+    A lista de usuários fica em /api/avaliacao-geral/detalhes."""
+    try:
+        resumo = agregados_avaliacao.resumo()
+        estatisticas = resumo['estatisticas']
+        
+        logger.debug('Avaliação geral', extra={'total_usuarios': estatisticas['total_usuarios'], 'total_avaliados': estatisticas['total_avaliados'], 'media': estatisticas['media_geral']})
+        
+        return jsonify({
+            'success': True,
+            'estatisticas': estatisticas,
+            'dados_grafico': resumo['dados_grafico'],
+            'usuario_logado_id': session.get('usuario_id'),
+            'modo_demo': False
+        })
+        
+    except Exception as e:
+        logger.exception('Erro ao obter dados da avaliação geral')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Famílias nulas vão para o fim, como no ORDER BY padrão do PostgreSQL
+CHAVE_FAMILIA_DETALHES = 'COALESCE(u.familia_id, 2147483647)'
+LIMITE_PADRAO_DETALHES = 100
+LIMITE_MAXIMO_DETALHES = 1000
+# Cada transmissão ndjson segura uma conexão do pool até o cliente terminar de ler
+MAXIMO_TRANSMISSOES_DETALHES = int(os.environ.get('DETALHES_TRANSMISSOES_MAX', 2))
+transmissoes_detalhes = threading.BoundedSemaphore(MAXIMO_TRANSMISSOES_DETALHES)
+
+def codificar_cursor_detalhes(linha):
+    chave = [linha['chave_familia'], linha['nome'], linha['id']]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+def decodificar_cursor_detalhes(cursor_texto):
+    try:
+        chave_familia, nome, usuario_id = json.loads(base64.urlsafe_b64decode(cursor_texto.encode()))
+        return int(chave_familia), str(nome), int(usuario_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def montar_consulta_detalhes(nivel=None, familia_id=None, apos=None, limite=None):
+    """Monta a consulta keyset de /api/avaliacao-geral/detalhes, ordenada por (familia_id, nome, id)"""
+    condicoes = []
+    parametros = []
+    
+    if nivel == 'Não avaliado':
+        condicoes.append('ud.nivel IS NULL')
+    elif nivel:
+        condicoes.append('ud.nivel = %s')
+        parametros.append(nivel)
+    
+    if familia_id is not None:
+        condicoes.append('u.familia_id = %s')
+        parametros.append(familia_id)
+    
+    if apos:
+        # A primeira condição, redundante, é a que o SQLite sabe buscar no índice
+        # de expressão (a comparação de linhas ele só filtra)
+        condicoes.append(f'{CHAVE_FAMILIA_DETALHES} >= %s')
+        condicoes.append(f'({CHAVE_FAMILIA_DETALHES}, u.nome, u.id) > (%s, %s, %s)')
+        parametros.extend([apos[0], *apos])
+    
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    sql = f'''
+        SELECT 
+            u.id,
+            u.nome,
+            u.relacionamento,
+            u.familia_id,
+            {CHAVE_FAMILIA_DETALHES} as chave_familia,
+            ud.pontuacao,
+            ud.nivel,
+            ud.data_diagnostico
+        FROM usuarios u
+        LEFT JOIN ultimos_diagnosticos ud ON ud.usuario_id = u.id
+        {where}
+        ORDER BY {CHAVE_FAMILIA_DETALHES}, u.nome, u.id
+    '''
+    if limite is not None:
+        sql += ' LIMIT %s'
+        parametros.append(limite)
+    return sql, parametros
+
+def formatar_detalhe(usuario, usuario_logado_id):
+    nivel = usuario['nivel'] if usuario['nivel'] else 'Não avaliado'
+    
+    # Marcar se é o usuário logado (se houver)
+    is_usuario_logado = usuario_logado_id and usuario['id'] == usuario_logado_id
+    categoria = 'Você' if is_usuario_logado else usuario.get('relacionamento', 'Usuário')
+    
+    # Adicionar família ao nome para identificação
+    nome_com_familia = f"{usuario['nome']} (Família {usuario['familia_id']})"
+    
+    return {
+        'nome': nome_com_familia,
+        'categoria': categoria,
+        'pontuacao': usuario['pontuacao'],
+        'nivel': nivel,
+        'data_diagnostico': usuario['data_diagnostico'],
+        'is_usuario_logado': is_usuario_logado
+    }
+
+def transmitir_detalhes_ndjson(sql, parametros, usuario_logado_id, ao_terminar):
+    """Gera uma linha JSON por usuário lendo de um cursor nomeado (memória constante)"""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(name='detalhes_avaliacao_geral') as cursor:
+                cursor.itersize = 2000
+                cursor.execute(sql, parametros)
+                for usuario in cursor:
+                    yield app.json.dumps(formatar_detalhe(usuario, usuario_logado_id)) + '\n'
+    finally:
+        ao_terminar()
+
+def reservar_transmissao_detalhes():
+    """Ocupa uma vaga de transmissão ndjson; devolve a função que a libera (uma vez só) ou None"""
+    if not transmissoes_detalhes.acquire(blocking=False):
+        return None
+    liberada = threading.Event()
+    
+    def liberar():
+        if not liberada.is_set():
+            liberada.set()
+            transmissoes_detalhes.release()
+    return liberar
+
+@app.route('/api/avaliacao-geral/detalhes')
+def api_avaliacao_geral_detalhes():
+    """API com o detalhe por usuário da avaliação geral
+    
+    Parâmetros: limite, cursor (proximo_cursor da página anterior), nivel, familia_id
+    e formato=ndjson para transmitir todos os usuários filtrados sem paginação (só
+    com login e no máximo DETALHES_TRANSMISSOES_MAX transmissões ao mesmo tempo)."""
     try:
+        nivel = request.args.get('nivel') or None
+        familia_id = request.args.get('familia_id', type=int)
+        usuario_logado_id = session.get('usuario_id')
+        
+        if request.args.get('formato') == 'ndjson':
+            if not usuario_logado_id:
+                return jsonify({'error': 'Não autenticado'}), 401
+            liberar = reservar_transmissao_detalhes()
+            if liberar is None:
+                logger.warning('Limite de transmissões ndjson atingido', extra={'rota': request.path})
+                resposta = jsonify({'success': False, 'error': 'Muitas exportações em andamento. Tente novamente em instantes.'})
+                resposta.headers['Retry-After'] = '5'
+                return resposta, 503
+            try:
+                sql, parametros = montar_consulta_detalhes(nivel, familia_id)
+                resposta = Response(stream_with_context(transmitir_detalhes_ndjson(sql, parametros, usuario_logado_id, liberar)),
+                                    mimetype='application/x-ndjson')
+            except BaseException:
+                liberar()
+                raise
+            # Ao fim da transmissão ou ao fechar a resposta, mesmo que o corpo nunca seja lido
+            # (o WsgiToAsgi do app_async não chama close())
+            resposta.call_on_close(liberar)
+            return resposta
+        
+        limite = request.args.get('limite', LIMITE_PADRAO_DETALHES, type=int)
+        limite = max(1, min(limite, LIMITE_MAXIMO_DETALHES))
+        
+        apos = None
+        if request.args.get('cursor'):
+            try:
+                apos = decodificar_cursor_detalhes(request.args['cursor'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Busca um registro a mais para saber se existe próxima página
+        sql, parametros = montar_consulta_detalhes(nivel, familia_id, apos, limite + 1)
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            
-            # Buscar TODOS os usuários do sistema
-            cursor.execute('''
-                SELECT 
-                    u.id,
-                    u.nome,
-                    u.relacionamento,
-                    u.familia_id,
-                    (SELECT pontuacao FROM diagnosticos 
-                     WHERE usuario_id = u.id 
-                     ORDER BY data_diagnostico DESC 
-                     LIMIT 1) as pontuacao,
-                    (SELECT nivel FROM diagnosticos 
-                     WHERE usuario_id = u.id 
-                     ORDER BY data_diagnostico DESC 
-                     LIMIT 1) as nivel,
-                    (SELECT data_diagnostico FROM diagnosticos 
-                     WHERE usuario_id = u.id 
-                     ORDER BY data_diagnostico DESC 
-                     LIMIT 1) as data_diagnostico
-                FROM usuarios u
-                ORDER BY u.familia_id, u.nome
-            ''')
-            
-            todos_usuarios = cursor.fetchall()
-            
-            # Processar dados para estatísticas
-            total_usuarios = len(todos_usuarios)
-            usuarios_avaliados = 0
-            pontuacoes_validas = []
-            contador_niveis = {
-                'Não dependente': 0,
-                'Moderado': 0,
-                'Dependente': 0,
-                'Não avaliado': 0
-            }
-            
-            detalhes = []
-            
-            for usuario in todos_usuarios:
-                usuario_dict = dict(usuario)
-                nivel = usuario_dict['nivel'] if usuario_dict['nivel'] else 'Não avaliado'
-                pontuacao = usuario_dict['pontuacao'] if usuario_dict['pontuacao'] is not None else None
-                
-                # Marcar se é o usuário logado (se houver)
-                usuario_logado_id = session.get('usuario_id')
-                is_usuario_logado = usuario_logado_id and usuario_dict['id'] == usuario_logado_id
-                categoria = 'Você' if is_usuario_logado else usuario_dict.get('relacionamento', 'Usuário')
-                
-                # Adicionar família ao nome para identificação
-                nome_com_familia = f"{usuario_dict['nome']} (Família {usuario_dict['familia_id']})"
-                
-                # Contar usuários avaliados
-                if pontuacao is not None:
-                    usuarios_avaliados += 1
-                    pontuacoes_validas.append(pontuacao)
-                
-                # Contar níveis
-                contador_niveis[nivel] = contador_niveis.get(nivel, 0) + 1
-                
-                # Adicionar aos detalhes
-                detalhes.append({
-                    'nome': nome_com_familia,
-                    'categoria': categoria,
-                    'pontuacao': pontuacao,
-                    'nivel': nivel,
-                    'data_diagnostico': usuario_dict['data_diagnostico'],
-                    'is_usuario_logado': is_usuario_logado
-                })
-            
-            # Calcular estatísticas
-            percentual_avaliados = 0
-            if total_usuarios > 0:
-                percentual_avaliados = round((usuarios_avaliados / total_usuarios) * 100, 1)
-            
-            media_geral = 0
-            if pontuacoes_validas:
-                media_geral = round(sum(pontuacoes_validas) / len(pontuacoes_validas), 1)
-            
-            # Encontrar nível mais comum (excluindo "Não avaliado")
-            niveis_avaliados = {k: v for k, v in contador_niveis.items() if k != 'Não avaliado' and v > 0}
-            nivel_mais_comum = 'N/A'
-            if niveis_avaliados:
-                nivel_mais_comum = max(niveis_avaliados, key=niveis_avaliados.get)
-            
-            # Preparar dados para o gráfico de pizza
-            dados_grafico = []
-            cores = {
-                'Não dependente': '#28a745',  # Verde
-                'Moderado': '#ffc107',        # Amarelo 
-                'Dependente': '#dc3545',      # Vermelho
-                'Não avaliado': '#6c757d'     # Cinza
-            }
-            
-            for nivel, quantidade in contador_niveis.items():
-                if quantidade > 0:
-                    percentual = round((quantidade / total_usuarios) * 100, 1) if total_usuarios > 0 else 0
-                    dados_grafico.append({
-                        'nivel': nivel,
-                        'quantidade': quantidade,
-                        'percentual': percentual,
-                        'cor': cores.get(nivel, '#6c757d')
-                    })
-            
-            # Ordenar dados do gráfico por quantidade (decrescente)
-            dados_grafico.sort(key=lambda x: x['quantidade'], reverse=True)
-            
-            print(f"📊 Avaliação Geral: {total_usuarios} usuários, {usuarios_avaliados} avaliados, Média: {media_geral}")
-            
-            return jsonify({
-                'success': True,
-                'estatisticas': {
-                    'total_usuarios': total_usuarios,
-                    'total_avaliados': usuarios_avaliados,
-                    'percentual_avaliados': percentual_avaliados,
-                    'media_geral': media_geral,
-                    'nivel_mais_comum': nivel_mais_comum,
-                    'descricao': 'Dados de todos os usuários do sistema'
-                },
-                'dados_grafico': {
-                    'niveis': dados_grafico
-                },
-                'detalhes': detalhes,
-                'usuario_logado_id': session.get('usuario_id'),
-                'modo_demo': False
-            })
+            cursor.execute(sql, parametros)
+            usuarios = cursor.fetchall()
+        
+        proximo_cursor = None
+        if len(usuarios) > limite:
+            usuarios = usuarios[:limite]
+            proximo_cursor = codificar_cursor_detalhes(usuarios[-1])
+        
+        return jsonify({
+            'success': True,
+            'detalhes': [formatar_detalhe(usuario, usuario_logado_id) for usuario in usuarios],
+            'proximo_cursor': proximo_cursor,
+            'usuario_logado_id': usuario_logado_id
+        })
             
     except Exception as e:
-        print(f"❌ Erro ao obter dados da avaliação geral: {e}")
+        logger.exception('Erro ao obter detalhes da avaliação geral')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ========== APIs CORRIGIDAS ==========
 
+COLUNAS_DIAGNOSTICO = ('id', 'usuario_id', 'pontuacao', 'nivel', 'data_diagnostico', 'respostas')
+# Colunas de usuarios que vão para o dashboard (e para o cache): nunca a senha
+COLUNAS_USUARIO_DASHBOARD = ('id', 'nome', 'idade', 'familia_id', 'email', 'relacionamento',
+                             'plano_acao', 'data_criacao')
+
+SQL_DASHBOARD = '''
+        SELECT %s,
+               ud.pontuacao as dash_membro_pontuacao,
+               ud.nivel as dash_membro_nivel,
+               %s
+        FROM usuarios u
+        LEFT JOIN ultimos_diagnosticos ud ON ud.usuario_id = u.id
+        LEFT JOIN diagnosticos d ON d.usuario_id = %%(usuario_id)s AND u.id = %%(usuario_id)s
+        WHERE u.id = %%(usuario_id)s
+           OR u.familia_id = (SELECT familia_id FROM usuarios WHERE id = %%(usuario_id)s)
+        ORDER BY u.id, d.data_diagnostico, d.id
+    ''' % (', '.join(f'u.{coluna}' for coluna in COLUNAS_USUARIO_DASHBOARD),
+           ',\n               '.join(f'd.{coluna} as dash_diag_{coluna}' for coluna in COLUNAS_DIAGNOSTICO))
+
+def montar_dashboard(cursor, usuario_id):
+    """Monta os dados do dashboard com uma única consulta.
+    
+    Cada linha traz um usuário da família (com seu último diagnóstico) e, para o
+    próprio usuário, uma linha por diagnóstico do histórico. Devolve None se o
+    usuário não existir."""
+    cursor.execute(SQL_DASHBOARD, {'usuario_id': usuario_id})
+    return processar_dashboard(cursor.fetchall(), usuario_id)
+
+def processar_dashboard(linhas, usuario_id):
+    """Converte as linhas de SQL_DASHBOARD (mapeamentos coluna -> valor) nos dados do dashboard"""
+    usuario = None
+    ultimo_diagnostico = None
+    historico = []
+    membros = {}
+    
+    for linha in linhas:
+        if linha['id'] not in membros:
+            membros[linha['id']] = {
+                'id': linha['id'],
+                'nome': linha['nome'],
+                'idade': linha['idade'],
+                'relacionamento': linha['relacionamento'],
+                'pontuacao': linha['dash_membro_pontuacao'],
+                'nivel': linha['dash_membro_nivel'],
+                'familia_id': linha['familia_id']
+            }
+        
+        if linha['id'] != usuario_id:
+            continue
+        
+        if usuario is None:
+            usuario = {chave: valor for chave, valor in linha.items() if not chave.startswith('dash_')}
+        
+        if linha['dash_diag_id'] is not None:
+            # Histórico em ordem crescente: a última linha é o diagnóstico mais recente
+            ultimo_diagnostico = {coluna: linha[f'dash_diag_{coluna}'] for coluna in COLUNAS_DIAGNOSTICO}
+            historico.append({
+                'pontuacao': ultimo_diagnostico['pontuacao'],
+                'nivel': ultimo_diagnostico['nivel'],
+                'data_diagnostico': ultimo_diagnostico['data_diagnostico']
+            })
+    
+    if usuario is None:
+        return None
+    
+    # O gráfico do dashboard recebe no máximo PONTOS_PADRAO_HISTORICO pontos; o detalhe fica em /api/historico
+    historico = reduzir_serie(historico, PONTOS_PADRAO_HISTORICO, x=x_diagnostico, y=y_diagnostico)
+    
+    logger.debug('Dashboard montado', extra={'usuario_id': usuario_id, 'familia_id': usuario.get('familia_id')})
+    
+    familia_id = usuario.get('familia_id')
+    if familia_id:
+        membros_familia = [membro for membro in membros.values() if membro.pop('familia_id') == familia_id]
+        familia_data = resumir_familia(membros_familia)
+    else:
+        # Sem família: obter_dados_familia responde sem consultar o banco
+        familia_data = obter_dados_familia(None, familia_id)
+    
+    # Dica do dia a partir do último diagnóstico já carregado
+    nivel = ultimo_diagnostico['nivel'] if ultimo_diagnostico and ultimo_diagnostico.get('nivel') else 'Moderado'
+    logger.debug('Dica do dia', extra={'usuario_id': usuario_id, 'nivel': nivel})
+    dica_do_dia = escolher_dica_do_dia(nivel)
+    
+    # Verificar necessidade de reavaliação
+    precisa_reavaliar = False
+    if ultimo_diagnostico:
+        precisa_reavaliar = ServicoDiagnostico.verificar_reavaliacao_necesaria(ultimo_diagnostico)
+    
+    return {
+        'success': True,
+        'usuario': usuario,
+        'ultimo_diagnostico': ultimo_diagnostico,
+        'historico': historico,
+        'familia_data': familia_data,
+        'dica_do_dia': dica_do_dia,
+        'precisa_reavaliar': precisa_reavaliar
+    }
+
+def dashboard_em_cache(usuario_id):
+    """Dashboard do cache, desde que a família (quando existe) também esteja nele; senão None"""
+    dashboard = cache_dashboard.obter(chave_dashboard(usuario_id))
+    if dashboard is not None:
+        familia_id = dashboard['usuario'].get('familia_id')
+        if not familia_id:
+            return dashboard
+        familia_data = cache_dashboard.obter(chave_familia(familia_id))
+        if familia_data is not None:
+            return {**dashboard, 'familia_data': familia_data}
+    return None
+
+def guardar_dashboard_em_cache(usuario_id, dashboard):
+    cache_dashboard.definir(chave_dashboard(usuario_id), dashboard)
+    familia_id = dashboard['usuario'].get('familia_id')
+    if familia_id:
+        cache_dashboard.definir(chave_familia(familia_id), dashboard['familia_data'])
+
+def obter_dashboard(usuario_id):
+    """Dashboard do usuário, servido do cache quando o usuário e a família estão nele"""
+    dashboard = dashboard_em_cache(usuario_id)
+    if dashboard is not None:
+        return dashboard
+    
+    with get_db_connection() as conn:
+        dashboard = montar_dashboard(conn.cursor(), usuario_id)
+    
+    if dashboard is not None:
+        guardar_dashboard_em_cache(usuario_id, dashboard)
+    return dashboard
+
 @app.route('/api/dashboard-data')
 def api_dashboard_data():
     """CORRIGIDA - API para dados do dashboard com melhor tratamento"""
@@ -475,67 +3298,182 @@ def api_dashboard_data():
     usuario_id = session.get('usuario_id')
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Dados do usuário
-            cursor.execute('SELECT * FROM usuarios WHERE id = %s', (usuario_id,))
-            usuario_result = cursor.fetchone()
-            
-            if not usuario_result:
-                return jsonify({'error': 'Usuário não encontrado'}), 404
-            
-            usuario = dict(usuario_result)
-            print(f"👤 Dashboard - Usuário: {usuario['nome']}, Família: {usuario.get('familia_id')}")
-            
-            # Último diagnóstico
-            cursor.execute('''
-                SELECT * FROM diagnosticos 
-                WHERE usuario_id = %s 
-                ORDER BY data_diagnostico DESC 
-                LIMIT 1
-            ''', (usuario_id,))
-            ultimo_diagnostico_result = cursor.fetchone()
-            ultimo_diagnostico = dict(ultimo_diagnostico_result) if ultimo_diagnostico_result else None
-            
-            # Histórico para gráfico
-            cursor.execute('''
-                SELECT pontuacao, nivel, data_diagnostico 
-                FROM diagnosticos 
-                WHERE usuario_id = %s 
-                ORDER BY data_diagnostico
-            ''', (usuario_id,))
-            historico_results = cursor.fetchall()
-            historico = [dict(item) for item in historico_results]
-            
-            # Dados da família - AGORA CORRIGIDO
-            familia_data = obter_dados_familia(cursor, usuario.get('familia_id'))
-            
-            # Dica do dia - AGORA CORRIGIDO
-            dica_do_dia = obter_dica_do_dia(cursor, usuario_id)
-            
-            # Verificar necessidade de reavaliação
-            precisa_reavaliar = False
-            if ultimo_diagnostico:
-                precisa_reavaliar = ServicoDiagnostico.verificar_reavaliacao_necesaria(ultimo_diagnostico)
+        dashboard = obter_dashboard(usuario_id)
+        
+        if dashboard is None:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        return jsonify(dashboard)
+        
+    except Exception:
+        logger.exception('Erro no dashboard-data')
+        return jsonify({
+            'success': False, 
+            'error': 'Erro ao carregar dados do dashboard',
+            'dica_do_dia': 'Mantenha o equilíbrio entre vida online e offline!'
+        }), 500
+
+# ========== HISTÓRICO DE PONTUAÇÃO ==========
+
+PONTOS_PADRAO_HISTORICO = 120
+PONTOS_MINIMO_HISTORICO = 3
+PONTOS_MAXIMO_HISTORICO = 1000
+
+# Início do período de cada agrupamento (semanas começam na segunda-feira nos dois bancos)
+AGRUPAMENTOS_HISTORICO = {'semana': 'week', 'mes': 'month', 'ano': 'year'}
+
+def x_diagnostico(ponto):
+    return ponto['data_diagnostico'].timestamp()
+
+def y_diagnostico(ponto):
+    return ponto['pontuacao'] or 0
+
+def x_periodo(ponto):
+    return ponto['periodo'].toordinal()
+
+def y_periodo(ponto):
+    return ponto['media'] or 0
+
+def reduzir_serie(pontos, limite, x, y):
+    """Reduz a série a no máximo `limite` pontos com Largest-Triangle-Three-Buckets.
+    
+    Mantém o primeiro e o último ponto e, de cada faixa intermediária, o ponto que
+    forma o maior triângulo com o escolhido antes e a média da faixa seguinte, o que
+    preserva picos e vales que uma média apagaria."""
+    total = len(pontos)
+    if total <= limite or limite < 3:
+        return list(pontos)
+    
+    faixas = limite - 2
+    reduzidos = [pontos[0]]
+    anterior = 0
+    for i in range(faixas):
+        inicio = i * (total - 2) // faixas + 1
+        fim = (i + 1) * (total - 2) // faixas + 1
+        seguinte = pontos[fim:(i + 2) * (total - 2) // faixas + 1] or pontos[-1:]
+        media_x = sum(x(ponto) for ponto in seguinte) / len(seguinte)
+        media_y = sum(y(ponto) for ponto in seguinte) / len(seguinte)
+        ax, ay = x(pontos[anterior]), y(pontos[anterior])
+        anterior = max(range(inicio, fim), key=lambda j: abs(
+            (ax - media_x) * (y(pontos[j]) - ay) - (ax - x(pontos[j])) * (media_y - ay)))
+        reduzidos.append(pontos[anterior])
+    reduzidos.append(pontos[-1])
+    return reduzidos
+
+def montar_consulta_historico(usuario_id, agrupamento=None, inicio=None, fim=None):
+    """SQL e parâmetros do histórico do usuário no intervalo [inicio, fim), cru ou agrupado por período.
+    
+    Em ambos os casos a leitura é coberta pelo índice (usuario_id, data_diagnostico)."""
+    condicoes = ['usuario_id = %s']
+    parametros = [usuario_id]
+    if inicio:
+        condicoes.append('data_diagnostico >= %s')
+        parametros.append(inicio)
+    if fim:
+        condicoes.append('data_diagnostico < %s')
+        parametros.append(fim)
+    where = ' AND '.join(condicoes)
+    
+    if agrupamento is None:
+        return f'''
+            SELECT pontuacao, nivel, data_diagnostico
+            FROM diagnosticos
+            WHERE {where}
+            ORDER BY data_diagnostico, id
+        ''', parametros
+    
+    periodo = db_pool.backend.truncar_data(AGRUPAMENTOS_HISTORICO[agrupamento], 'data_diagnostico')
+    return f'''
+        SELECT {periodo} as periodo,
+               COUNT(*) as diagnosticos,
+               AVG(pontuacao) as media,
+               MIN(pontuacao) as minima,
+               MAX(pontuacao) as maxima
+        FROM diagnosticos
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 1
+    ''', parametros
+
+def formatar_periodo(linha):
+    """Período agrupado com a data de início (o SQLite devolve texto) e a média arredondada"""
+    periodo = linha['periodo']
+    return {
+        'periodo': periodo if isinstance(periodo, date) else date.fromisoformat(periodo),
+        'diagnosticos': linha['diagnosticos'],
+        'media': round(float(linha['media']), 1) if linha['media'] is not None else None,
+        'minima': linha['minima'],
+        'maxima': linha['maxima']
+    }
+
+def ler_data_parametro(nome):
+    """Data YYYY-MM-DD da query string (ou None); ValueError com mensagem para o cliente"""
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'{nome} deve estar no formato AAAA-MM-DD')
+
+@app.route('/api/historico')
+def api_historico():
+    """API com o histórico de pontuação do usuário para gráficos
+    
+    Parâmetros opcionais: inicio e fim (AAAA-MM-DD, inclusivos), agrupar (semana, mes
+    ou ano: média, mínima e máxima por período) e pontos (quantidade máxima devolvida;
+    séries maiores são reduzidas com LTTB)."""
+    usuario_id = session.get('usuario_id')
+    if not usuario_id:
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    try:
+        agrupamento = request.args.get('agrupar') or None
+        if agrupamento is not None and agrupamento not in AGRUPAMENTOS_HISTORICO:
+            return jsonify({'success': False,
+                            'error': f"agrupar deve ser um de: {', '.join(AGRUPAMENTOS_HISTORICO)}"}), 400
+        try:
+            inicio = ler_data_parametro('inicio')
+            fim = ler_data_parametro('fim')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if inicio and fim and inicio > fim:
+            return jsonify({'success': False, 'error': 'inicio deve ser anterior a fim'}), 400
+        
+        pontos = request.args.get('pontos', PONTOS_PADRAO_HISTORICO, type=int)
+        pontos = max(PONTOS_MINIMO_HISTORICO, min(pontos, PONTOS_MAXIMO_HISTORICO))
+        
+        sql, parametros = montar_consulta_historico(
+            usuario_id, agrupamento,
+            datetime.combine(inicio, datetime.min.time()) if inicio else None,
+            datetime.combine(fim + timedelta(days=1), datetime.min.time()) if fim else None)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, parametros)
+            linhas = cursor.fetchall()
+        
+        if agrupamento is None:
+            serie = [dict(linha) for linha in linhas]
+            historico = reduzir_serie(serie, pontos, x=x_diagnostico, y=y_diagnostico)
+        else:
+            serie = [formatar_periodo(linha) for linha in linhas]
+            historico = reduzir_serie(serie, pontos, x=x_periodo, y=y_periodo)
+            for ponto in historico:
+                ponto['periodo'] = ponto['periodo'].isoformat()
         
         return jsonify({
             'success': True,
-            'usuario': usuario,
-            'ultimo_diagnostico': ultimo_diagnostico,
-            'historico': historico,
-            'familia_data': familia_data,
-            'dica_do_dia': dica_do_dia,
-            'precisa_reavaliar': precisa_reavaliar
+            'agrupamento': agrupamento,
+            'inicio': inicio.isoformat() if inicio else None,
+            'fim': fim.isoformat() if fim else None,
+            'total': len(serie),
+            'reduzido': len(historico) < len(serie),
+            'historico': historico
         })
         
     except Exception as e:
-        print(f"❌ Erro no dashboard-data: {e}")
-        return jsonify({
-            'success': False, 
-            'error': 'Erro ao carregar dados do dashboard',
-            'dica_do_dia': 'Mantenha o equilíbrio entre vida online e offline!'
-        }), 500
+        logger.exception('Erro ao obter histórico')
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 # ========== APIs FALTANTES QUE ESTAVAM COM ERRO 404 ==========
 
@@ -547,40 +3485,52 @@ def api_obter_familia():
         if not usuario_id:
             return jsonify({'error': 'Não autenticado'}), 401
         
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Obter familia_id do usuário
-            cursor.execute('SELECT familia_id FROM usuarios WHERE id = %s', (usuario_id,))
-            usuario_result = cursor.fetchone()
-            
-            if not usuario_result or not usuario_result['familia_id']:
-                return jsonify({'success': False, 'error': 'Usuário não pertence a uma família'}), 400
-            
-            familia_id = usuario_result['familia_id']
-            familia_data = obter_dados_familia(cursor, familia_id)
-            
+        # familia_id vem da sessão: com a família no cache, nenhuma consulta
+        familia_id = familia_da_sessao()
+        if not familia_id:
+            return jsonify({'success': False, 'error': 'Usuário não pertence a uma família'}), 400
+        
+        familia_data = cache_dashboard.obter(chave_familia(familia_id))
+        if familia_data is None:
+            with get_db_connection() as conn:
+                familia_data = obter_dados_familia(conn.cursor(), familia_id)
+            if familia_data['status'] != 'erro':
+                cache_dashboard.definir(chave_familia(familia_id), familia_data)
+        
         return jsonify({
             'success': True,
             'familia': familia_data
         })
         
     except Exception as e:
-        print(f"❌ Erro ao obter dados da família: {e}")
+        logger.exception('Erro ao obter dados da família')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/solucoes/<nivel>', methods=['GET'])
 def api_obter_solucoes(nivel):
-    """API para obter soluções por nível - ESTAVA FALTANDO"""
+    """API para obter soluções por nível (idioma por ?idioma= ou Accept-Language), com ETag"""
     try:
-        solucoes = ServicoDiagnostico.obter_solucoes_por_nivel(nivel)
-        return jsonify({
-            'success': True,
-            'nivel': nivel,
-            'solucoes': solucoes
-        })
+        idioma = idioma_da_requisicao()
+        solucoes = catalogo_conteudo.solucoes(idioma, nivel)
+        if solucoes is None:
+            return jsonify({
+                'success': True,
+                'nivel': nivel,
+                'solucoes': []
+            })
+        
+        _, corpo, etag, idioma_servido = solucoes
+        if request.if_none_match.contains(etag):
+            resposta = Response(status=304)
+        else:
+            resposta = Response(corpo, mimetype='application/json')
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = CACHE_CONTROL_CONTEUDO
+        resposta.headers['Content-Language'] = idioma_servido
+        resposta.vary.add('Accept-Language')
+        return resposta
     except Exception as e:
-        print(f"❌ Erro ao obter soluções: {e}")
+        logger.exception('Erro ao obter soluções')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/plano-acao', methods=['GET', 'POST'])
@@ -622,6 +3572,8 @@ def api_plano_acao():
                     UPDATE usuarios SET plano_acao = %s WHERE id = %s
                 ''', (json.dumps(plano_acao), usuario_id))
                 conn.commit()
+            
+            invalidar_cache_dashboard(usuario_id)
                 
             return jsonify({
                 'success': True,
@@ -629,7 +3581,7 @@ def api_plano_acao():
             })
             
     except Exception as e:
-        print(f"❌ Erro no plano de ação: {e}")
+        logger.exception('Erro no plano de ação')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ========== APIs PARA INSTITUIÇÕES E PROFISSIONAIS ==========
@@ -652,7 +3604,7 @@ def api_obter_instituicoes():
         })
         
     except Exception as e:
-        print(f"❌ Erro ao obter instituições: {e}")
+        logger.exception('Erro ao obter instituições')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/instituicoes/cadastrar', methods=['POST'])
@@ -668,8 +3620,7 @@ def api_cadastrar_instituicao():
         descricao = data.get('descricao')
         especialidades = data.get('especialidades')
         
-        print(f"📥 Recebendo requisição para cadastrar instituição...")
-        print(f"📊 Dados recebidos: {data}")
+        logger.debug('Cadastro de instituição recebido', extra={'dados': data})
         
         # Validações básicas
         if not nome or not tipo:
@@ -686,7 +3637,7 @@ def api_cadastrar_instituicao():
             instituicao_id = cursor.fetchone()['id']
             conn.commit()
             
-            print(f"✅ Instituição cadastrada com ID: {instituicao_id}")
+            logger.info('Instituição cadastrada', extra={'instituicao_id': instituicao_id})
             
         return jsonify({
             'success': True,
@@ -695,7 +3646,7 @@ def api_cadastrar_instituicao():
         })
         
     except Exception as e:
-        print(f"❌ Erro ao cadastrar instituição: {e}")
+        logger.exception('Erro ao cadastrar instituição')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/profissionais', methods=['GET'])
@@ -716,7 +3667,7 @@ def api_obter_profissionais():
         })
         
     except Exception as e:
-        print(f"❌ Erro ao obter profissionais: {e}")
+        logger.exception('Erro ao obter profissionais')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/profissionais/cadastrar', methods=['POST'])
@@ -734,8 +3685,7 @@ def api_cadastrar_profissional():
         abordagem = data.get('abordagem', '')
         descricao = data.get('descricao')
         
-        print(f"📥 Recebendo requisição para cadastrar profissional...")
-        print(f"📊 Dados recebidos: {data}")
+        logger.debug('Cadastro de profissional recebido', extra={'dados': data})
         
         # Validações básicas
         if not nome:
@@ -771,7 +3721,7 @@ def api_cadastrar_profissional():
                 
             conn.commit()
             
-            print(f"✅ Profissional cadastrado com ID: {profissional_id}")
+            logger.info('Profissional cadastrado', extra={'profissional_id': profissional_id})
             
         return jsonify({
             'success': True,
@@ -780,7 +3730,7 @@ def api_cadastrar_profissional():
         })
         
     except Exception as e:
-        print(f"❌ Erro ao cadastrar profissional: {e}")
+        logger.exception('Erro ao cadastrar profissional')
         return jsonify({'success': False, 'error': f'Erro interno do servidor: {str(e)}'}), 500
 
 @app.route('/api/instituicoes/<int:instituicao_id>', methods=['DELETE'])
@@ -793,7 +3743,7 @@ def api_excluir_instituicao(instituicao_id):
             cursor.execute('DELETE FROM instituicoes WHERE id = %s', (instituicao_id,))
             conn.commit()
             
-            print(f"✅ Instituição {instituicao_id} excluída com sucesso!")
+            logger.info('Instituição excluída', extra={'instituicao_id': instituicao_id})
             
         return jsonify({
             'success': True,
@@ -801,7 +3751,7 @@ def api_excluir_instituicao(instituicao_id):
         })
         
     except Exception as e:
-        print(f"❌ Erro ao excluir instituição: {e}")
+        logger.exception('Erro ao excluir instituição')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/profissionais/<int:profissional_id>', methods=['DELETE'])
@@ -814,7 +3764,7 @@ def api_excluir_profissional(profissional_id):
             cursor.execute('DELETE FROM profissionais WHERE id = %s', (profissional_id,))
             conn.commit()
             
-            print(f"✅ Profissional {profissional_id} excluído com sucesso!")
+            logger.info('Profissional excluído', extra={'profissional_id': profissional_id})
             
         return jsonify({
             'success': True,
@@ -822,51 +3772,315 @@ def api_excluir_profissional(profissional_id):
         })
         
     except Exception as e:
-        print(f"❌ Erro ao excluir profissional: {e}")
+        logger.exception('Erro ao excluir profissional')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ========== NOVA ROTA PARA INSTITUIÇÕES COM PROFISSIONAIS ==========
 
+LIMITE_MAXIMO_INSTITUICOES = 500
+
+def consulta_instituicoes(tipo=None, especialidade=None, limite=None, pagina=1):
+    """SQL e parâmetros da página de instituições (com limite, pede um registro a mais)"""
+    condicoes = []
+    parametros = []
+    if tipo:
+        condicoes.append('i.tipo = %s')
+        parametros.append(tipo)
+    if especialidade:
+        condicoes.append('''EXISTS (SELECT 1 FROM profissionais p
+                                  WHERE p.instituicao_id = i.id AND p.especialidade = %s)''')
+        parametros.append(especialidade)
+    
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    sql = f'SELECT i.* FROM instituicoes i {where} ORDER BY i.nome, i.id'
+    if limite:
+        # Um registro a mais indica se existe próxima página
+        sql += ' LIMIT %s OFFSET %s'
+        parametros.extend([limite + 1, (pagina - 1) * limite])
+    return sql, parametros
+
+def consulta_profissionais_das_instituicoes(instituicao_ids, especialidade=None):
+    """SQL e parâmetros do lote ANY com os profissionais das instituições da página"""
+    sql = 'SELECT * FROM profissionais WHERE instituicao_id = ANY(%s)'
+    parametros = [list(instituicao_ids)]
+    if especialidade:
+        sql += ' AND especialidade = %s'
+        parametros.append(especialidade)
+    return sql + ' ORDER BY nome', parametros
+
+def cortar_pagina(registros, limite):
+    """Remove o registro extra da página e diz se existe próxima página"""
+    if limite and len(registros) > limite:
+        return registros[:limite], True
+    return registros, False
+
+def agrupar_profissionais(instituicoes, profissionais):
+    """Anexa a cada instituição a lista dos seus profissionais (na ordem recebida)"""
+    profissionais_por_instituicao = {instituicao['id']: [] for instituicao in instituicoes}
+    for profissional in profissionais:
+        profissionais_por_instituicao[profissional['instituicao_id']].append(profissional)
+    
+    for instituicao in instituicoes:
+        instituicao['profissionais'] = profissionais_por_instituicao[instituicao['id']]
+    return instituicoes
+
+def listar_instituicoes_com_profissionais(cursor, tipo=None, especialidade=None, limite=None, pagina=1):
+    """Instituições com seus profissionais em duas consultas fixas (página de instituições + lote ANY).
+    
+    Com limite, devolve também se existe próxima página."""
+    cursor.execute(*consulta_instituicoes(tipo, especialidade, limite, pagina))
+    instituicoes, tem_mais = cortar_pagina([dict(instituicao) for instituicao in cursor.fetchall()], limite)
+    
+    profissionais = []
+    if instituicoes:
+        # Cursor de tuplas: o RealDictCursor custa caro em lotes de dezenas de milhares de linhas
+        with cursor.connection.cursor(cursor_factory=db_pool.backend.cursor_tuplas) as cursor_lote:
+            cursor_lote.execute(*consulta_profissionais_das_instituicoes(
+                [instituicao['id'] for instituicao in instituicoes], especialidade))
+            colunas = [coluna.name for coluna in cursor_lote.description]
+            profissionais = [dict(zip(colunas, linha)) for linha in cursor_lote.fetchall()]
+    
+    return agrupar_profissionais(instituicoes, profissionais), tem_mais
+
 @app.route('/api/instituicoes-com-profissionais', methods=['GET'])
 def api_obter_instituicoes_com_profissionais():
-    """API para obter instituições com seus profissionais"""
+    """API para obter instituições com seus profissionais
+    
+    Parâmetros opcionais: tipo, especialidade, limite e pagina (sem limite devolve todas)."""
     try:
+        tipo = request.args.get('tipo') or None
+        especialidade = request.args.get('especialidade') or None
+        limite = request.args.get('limite', type=int)
+        pagina = max(1, request.args.get('pagina', 1, type=int))
+        if limite is not None:
+            limite = max(1, min(limite, LIMITE_MAXIMO_INSTITUICOES))
+        
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            instituicoes_com_profissionais, tem_mais = listar_instituicoes_com_profissionais(
+                cursor, tipo, especialidade, limite, pagina)
             
-            # Buscar instituições
-            cursor.execute('''
-                SELECT * FROM instituicoes 
-                ORDER BY nome
-            ''')
-            instituicoes = cursor.fetchall()
-            
-            # Para cada instituição, buscar seus profissionais
-            instituicoes_com_profissionais = []
-            for instituicao in instituicoes:
-                instituicao_dict = dict(instituicao)
-                
-                cursor.execute('''
-                    SELECT * FROM profissionais 
-                    WHERE instituicao_id = %s 
-                    ORDER BY nome
-                ''', (instituicao['id'],))
-                
-                profissionais = cursor.fetchall()
-                instituicao_dict['profissionais'] = [dict(prof) for prof in profissionais]
-                instituicoes_com_profissionais.append(instituicao_dict)
-            
-            print(f"✅ Instituições com profissionais carregadas: {len(instituicoes_com_profissionais)} instituições")
-            
-        return jsonify({
+            logger.debug('Instituições com profissionais carregadas', extra={'instituicoes': len(instituicoes_com_profissionais)})
+        
+        resposta = {
             'success': True,
             'instituicoes': instituicoes_com_profissionais
-        })
+        }
+        if limite is not None:
+            resposta['paginacao'] = {
+                'pagina': pagina,
+                'limite': limite,
+                'tem_mais': tem_mais
+            }
+        return jsonify(resposta)
         
     except Exception as e:
-        print(f"❌ Erro ao obter instituições com profissionais: {e}")
+        logger.exception('Erro ao obter instituições com profissionais')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ========== IMPORTAÇÃO EM LOTE DE INSTITUIÇÕES E PROFISSIONAIS ==========
+
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+CAMPOS_IMPORTACAO = {
+    'instituicoes': ('nome', 'tipo', 'endereco', 'telefone', 'email', 'descricao', 'especialidades'),
+    'profissionais': ('nome', 'profissao', 'especialidade', 'telefone', 'email', 'instituicao_id',
+                      'registro_profissional', 'abordagem', 'descricao')
+}
+
+def ler_linhas_importacao(conteudo, formato):
+    """Converte CSV (com cabeçalho) ou NDJSON em [(numero_linha, dados ou None, erro ou None)]"""
+    if formato == 'csv':
+        leitor = csv.DictReader(io.StringIO(conteudo))
+        # Linha 1 é o cabeçalho
+        return [(numero, dados, None) for numero, dados in enumerate(leitor, start=2)]
+    
+    linhas = []
+    for numero, texto in enumerate(conteudo.splitlines(), start=1):
+        if not texto.strip():
+            continue
+        try:
+            dados = json.loads(texto)
+            if not isinstance(dados, dict):
+                raise ValueError('a linha deve ser um objeto JSON')
+            linhas.append((numero, dados, None))
+        except ValueError as e:
+            linhas.append((numero, None, f'JSON inválido: {e}'))
+    return linhas
+
+def validar_linha_importacao(tipo, dados):
+    """Aplica as mesmas regras das rotas de cadastro; devolve (valores, erro)"""
+    for campo in CAMPOS_IMPORTACAO[tipo]:
+        valor = dados.get(campo)
+        # Objetos e listas do NDJSON derrubariam o INSERT do lote inteiro
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (str, int, float))):
+            return None, f'{campo} deve ser texto ou número'
+    
+    valores = {campo: (dados.get(campo) or None) for campo in CAMPOS_IMPORTACAO[tipo]}
+    for campo, valor in valores.items():
+        if isinstance(valor, str):
+            valores[campo] = valor.strip() or None
+    
+    if tipo == 'instituicoes':
+        if not valores['nome'] or not valores['tipo']:
+            return None, 'Nome e tipo são obrigatórios'
+    else:
+        if not valores['nome']:
+            return None, 'Nome é obrigatório'
+        if not valores['especialidade']:
+            return None, 'Especialidade é obrigatória'
+        if valores['instituicao_id'] is not None:
+            try:
+                valores['instituicao_id'] = int(valores['instituicao_id'])
+            except (TypeError, ValueError):
+                return None, 'instituicao_id deve ser um número inteiro'
+        valores['registro_profissional'] = valores['registro_profissional'] or ''
+        valores['abordagem'] = valores['abordagem'] or ''
+    
+    return valores, None
+
+def importar_em_lote(cursor, tipo, linhas, tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """Valida e insere as linhas em lotes (INSERT de várias linhas); não faz commit.
+    
+    Para profissionais, e-mails já cadastrados (ou repetidos no arquivo) são
+    rejeitados com uma única consulta por lote, como na rota de cadastro."""
+    campos = CAMPOS_IMPORTACAO[tipo]
+    erros = []
+    ids = []
+    emails_no_arquivo = set()
+    
+    for inicio in range(0, len(linhas), tamanho_lote):
+        validas = []
+        for numero, dados, erro in linhas[inicio:inicio + tamanho_lote]:
+            if erro is None:
+                valores, erro = validar_linha_importacao(tipo, dados)
+            if erro:
+                erros.append({'linha': numero, 'erro': erro})
+            else:
+                validas.append((numero, valores))
+        
+        if tipo == 'profissionais':
+            emails = list({valores['email'] for _, valores in validas if valores['email']})
+            existentes = set()
+            if emails:
+                cursor.execute('SELECT email FROM profissionais WHERE email = ANY(%s)', (emails,))
+                existentes = {linha['email'] for linha in cursor.fetchall()}
+            
+            aceitas = []
+            for numero, valores in validas:
+                email = valores['email']
+                if email and (email in existentes or email in emails_no_arquivo):
+                    erros.append({'linha': numero, 'erro': 'Já existe um profissional com este email'})
+                    continue
+                if email:
+                    emails_no_arquivo.add(email)
+                aceitas.append((numero, valores))
+            validas = aceitas
+        
+        if not validas:
+            continue
+        
+        registros = [tuple(valores[campo] for campo in campos) for _, valores in validas]
+        ids.extend(linha['id'] for linha in db_pool.backend.inserir_varias(cursor, tipo, campos, registros))
+    
+    erros.sort(key=lambda erro: erro['linha'])
+    return ids, erros
+
+@app.route('/api/importacao/<tipo>', methods=['POST'])
+def api_importacao_em_lote(tipo):
+    """API para importar instituições ou profissionais em lote (CSV ou NDJSON)
+    
+    Aceita o arquivo no corpo (Content-Type text/csv ou application/x-ndjson) ou
+    em upload multipart no campo 'arquivo'; ?formato=csv|ndjson força o formato."""
+    if tipo not in CAMPOS_IMPORTACAO:
+        return jsonify({'success': False, 'error': 'Tipo deve ser instituicoes ou profissionais'}), 404
+    
+    try:
+        arquivo = request.files.get('arquivo')
+        try:
+            if arquivo:
+                conteudo = arquivo.read().decode('utf-8-sig')
+                nome_arquivo = arquivo.filename or ''
+            else:
+                conteudo = request.get_data().decode('utf-8')
+                nome_arquivo = ''
+        except UnicodeDecodeError:
+            return jsonify({'success': False, 'error': 'O arquivo deve estar em UTF-8'}), 400
+        
+        formato = request.args.get('formato')
+        if not formato:
+            csv_no_tipo = 'csv' in (request.mimetype or '') or nome_arquivo.lower().endswith('.csv')
+            formato = 'csv' if csv_no_tipo else 'ndjson'
+        if formato not in ('csv', 'ndjson'):
+            return jsonify({'success': False, 'error': 'Formato deve ser csv ou ndjson'}), 400
+        
+        linhas = ler_linhas_importacao(conteudo, formato)
+        logger.info('Importação recebida', extra={'tipo': tipo, 'linhas': len(linhas), 'formato': formato})
+        
+        with get_db_connection() as conn:
+            ids, erros = importar_em_lote(conn.cursor(), tipo, linhas)
+            conn.commit()
+        
+        logger.info('Importação concluída', extra={'tipo': tipo, 'inseridos': len(ids), 'com_erro': len(erros)})
+        
+        return jsonify({
+            'success': True,
+            'total_linhas': len(linhas),
+            'inseridos': len(ids),
+            'ids': ids,
+            'erros': erros
+        })
+        
+    except Exception:
+        logger.exception('Erro na importação', extra={'tipo': tipo})
+        return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
+
+@app.cli.command('importar')
+@click.argument('tipo', type=click.Choice(sorted(CAMPOS_IMPORTACAO)))
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson']), help='Padrão: pela extensão do arquivo')
+def comando_importar(tipo, arquivo, formato):
+    """Importa instituições ou profissionais de um arquivo CSV ou NDJSON"""
+    formato = formato or ('csv' if arquivo.lower().endswith('.csv') else 'ndjson')
+    with open(arquivo, encoding='utf-8-sig') as entrada:
+        linhas = ler_linhas_importacao(entrada.read(), formato)
+    
+    with get_db_connection() as conn:
+        ids, erros = importar_em_lote(conn.cursor(), tipo, linhas)
+        conn.commit()
+    
+    for erro in erros:
+        click.echo(f"❌ Linha {erro['linha']}: {erro['erro']}")
+    click.echo(f"✅ {len(ids)} de {len(linhas)} linhas importadas em {tipo}")
+
+# ========== SERVIDOR DE PRODUÇÃO ==========
+
+@app.cli.command('servir')
+@click.option('--workers', type=int, help='Padrão: WEB_WORKERS ou 2 x núcleos + 1 (com --asgi, 1 por núcleo)')
+@click.option('--bind', help='Padrão: WEB_BIND ou 0.0.0.0:5000')
+@click.option('--threads', type=int, help='Threads por worker WSGI (padrão: WEB_THREADS ou 4)')
+@click.option('--asgi', is_flag=True, help='Workers uvicorn servindo app_async (APIs de leitura assíncronas)')
+def comando_servir(workers, bind, threads, asgi):
+    """Sobe o app no gunicorn (pre-fork, vários workers); configuração em gunicorn.conf.py
+
+    kill -HUP no processo mestre recarrega o código sem derrubar conexões em andamento."""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise click.ClickException('O servidor de produção precisa do gunicorn: pip install gunicorn')
+    
+    for variavel, valor in (('WEB_WORKERS', workers), ('WEB_BIND', bind), ('WEB_THREADS', threads)):
+        if valor is not None:
+            os.environ[variavel] = str(valor)
+    if asgi:
+        os.environ['WEB_ASGI'] = '1'
+    
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    alvo = 'app_async:asgi_app' if asgi else 'app:app'
+    click.echo(f"🚀 Iniciando gunicorn ({alvo})...")
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '--chdir', diretorio,
+                              '--config', os.path.join(diretorio, 'gunicorn.conf.py'), alvo])
+
 # ========== APIs EXISTENTES CORRIGIDAS ==========
 
 @app.route('/api/familia/membros', methods=['POST'])
@@ -878,25 +4092,19 @@ def api_adicionar_membro_familia():
         idade = data.get('idade')
         relacionamento = data.get('relacionamento')
         
-        print(f"📥 Recebendo dados para novo membro: {nome}, {idade}, {relacionamento}")
+        logger.debug('Novo membro recebido', extra={'nome': nome, 'idade': idade, 'relacionamento': relacionamento})
         
         usuario_id = session.get('usuario_id')
         if not usuario_id:
             return jsonify({'success': False, 'error': 'Usuário não autenticado'}), 401
         
+        familia_id = familia_da_sessao()
+        if not familia_id:
+            return jsonify({'success': False, 'error': 'Usuário não pertence a uma família'}), 400
+        
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            # Obter familia_id do usuário atual
-            cursor.execute('SELECT familia_id FROM usuarios WHERE id = %s', (usuario_id,))
-            usuario_result = cursor.fetchone()
-            
-            if not usuario_result or not usuario_result['familia_id']:
-                return jsonify({'success': False, 'error': 'Usuário não pertence a uma família'}), 400
-            
-            familia_id = usuario_result['familia_id']
-            print(f"🏠 Familia ID encontrada: {familia_id}")
-            
             # Inserir novo membro
             cursor.execute('''
                 INSERT INTO usuarios (nome, idade, familia_id, relacionamento)
@@ -906,7 +4114,10 @@ def api_adicionar_membro_familia():
             novo_membro_id = cursor.fetchone()['id']
             conn.commit()
             
-            print(f"✅ Novo membro inserido com ID: {novo_membro_id}")
+            logger.info('Novo membro inserido', extra={'membro_id': novo_membro_id, 'familia_id': familia_id})
+        
+        agregados_avaliacao.registrar_usuario()
+        invalidar_cache_dashboard(familia_id=familia_id)
             
         return jsonify({
             'success': True,
@@ -915,7 +4126,7 @@ def api_adicionar_membro_familia():
         })
         
     except Exception as e:
-        print(f"❌ Erro ao adicionar membro: {str(e)}")
+        logger.exception('Erro ao adicionar membro')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/familia/membros/<int:membro_id>', methods=['DELETE'])
@@ -926,27 +4137,30 @@ def api_excluir_membro_familia(membro_id):
         if not usuario_id:
             return jsonify({'success': False, 'error': 'Usuário não autenticado'}), 401
         
+        familia_id = familia_da_sessao()
+        
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            # Verificar se o membro pertence à mesma família
-            cursor.execute('''
-                SELECT u1.familia_id as usuario_familia, u2.familia_id as membro_familia, u2.nome
-                FROM usuarios u1, usuarios u2 
-                WHERE u1.id = %s AND u2.id = %s
-            ''', (usuario_id, membro_id))
+            # Verificar se o membro pertence à mesma família (a do usuário vem da sessão)
+            cursor.execute('SELECT familia_id, nome FROM usuarios WHERE id = %s', (membro_id,))
             resultado = cursor.fetchone()
             
             if not resultado:
                 return jsonify({'success': False, 'error': 'Membro não encontrado'}), 404
             
-            if resultado['usuario_familia'] != resultado['membro_familia']:
+            if not familia_id or resultado['familia_id'] != familia_id:
                 return jsonify({'success': False, 'error': 'Você não tem permissão para excluir este membro'}), 403
             
             nome_membro = resultado['nome']
             
             # Excluir diagnósticos do membro
             cursor.execute('DELETE FROM diagnosticos WHERE usuario_id = %s', (membro_id,))
+            cursor.execute('''
+                DELETE FROM ultimos_diagnosticos WHERE usuario_id = %s
+                RETURNING pontuacao, nivel
+            ''', (membro_id,))
+            ultimo_diagnostico = cursor.fetchone() or {}
             
             # Excluir reflexões do membro
             cursor.execute('DELETE FROM reflexoes WHERE usuario_id = %s', (membro_id,))
@@ -956,15 +4170,18 @@ def api_excluir_membro_familia(membro_id):
             
             conn.commit()
             
-            print(f"✅ Membro {nome_membro} excluído com sucesso!")
-            
+            logger.info('Membro excluído', extra={'membro_id': membro_id})
+        
+        agregados_avaliacao.remover_usuario(ultimo_diagnostico.get('pontuacao'), ultimo_diagnostico.get('nivel'))
+        invalidar_cache_dashboard(membro_id, familia_id)
+        
         return jsonify({
             'success': True,
             'message': f'Membro {nome_membro} excluído com sucesso!'
         })
         
     except Exception as e:
-        print(f"❌ Erro ao excluir membro: {str(e)}")
+        logger.exception('Erro ao excluir membro')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/familia/membros/<int:membro_id>/diagnostico', methods=['POST'])
@@ -978,17 +4195,14 @@ def api_salvar_diagnostico_familiar(membro_id):
         if not usuario_id:
             return jsonify({'success': False, 'error': 'Usuário não autenticado'}), 401
         
-        # Verificar se o membro pertence à mesma família
+        # Verificar se o membro pertence à mesma família (a do usuário vem da sessão)
+        familia_id = familia_da_sessao()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT u1.familia_id as usuario_familia, u2.familia_id as membro_familia
-                FROM usuarios u1, usuarios u2 
-                WHERE u1.id = %s AND u2.id = %s
-            ''', (usuario_id, membro_id))
+            cursor.execute('SELECT familia_id FROM usuarios WHERE id = %s', (membro_id,))
             resultado = cursor.fetchone()
             
-            if not resultado or resultado['usuario_familia'] != resultado['membro_familia']:
+            if not familia_id or not resultado or resultado['familia_id'] != familia_id:
                 return jsonify({'success': False, 'error': 'Sem permissão para este membro'}), 403
         
         # Calcular pontuação total
@@ -1000,16 +4214,17 @@ def api_salvar_diagnostico_familiar(membro_id):
         # Salvar diagnóstico
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO diagnosticos (usuario_id, pontuacao, nivel, respostas)
-                VALUES (%s, %s, %s, %s) RETURNING id
-            ''', (membro_id, pontuacao_total, nivel, json.dumps(respostas)))
-            
-            diagnostico_id = cursor.fetchone()['id']
+            diagnostico = inserir_diagnostico(cursor, membro_id, pontuacao_total, nivel, respostas)
             conn.commit()
         
+        agregados_avaliacao.registrar_diagnostico(pontuacao_total, nivel,
+                                                  diagnostico['pontuacao_anterior'],
+                                                  diagnostico['nivel_anterior'])
+        invalidar_cache_dashboard(membro_id, diagnostico['familia_id'])
+        diagnostico_id = diagnostico['id']
+        
         # Obter soluções recomendadas
-        solucoes = ServicoDiagnostico.obter_solucoes_por_nivel(nivel)
+        solucoes = ServicoDiagnostico.obter_solucoes_por_nivel(nivel, idioma_da_requisicao())
         
         return jsonify({
             'success': True,
@@ -1022,8 +4237,112 @@ def api_salvar_diagnostico_familiar(membro_id):
             'solucoes': solucoes
         })
     
-    except Exception as e:
-        print(f"❌ Erro ao salvar diagnóstico familiar: {e}")
+    except Exception:
+        logger.exception('Erro ao salvar diagnóstico familiar')
+        return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
+
+def agrupar_reflexoes(reflexoes):
+    """Reflexões indexadas pela pergunta, a partir das linhas (pergunta, resposta, data_criacao)"""
+    reflexoes_dict = {}
+    for reflexao in reflexoes:
+        reflexoes_dict[reflexao['pergunta']] = {
+            'resposta': reflexao['resposta'],
+            'data_criacao': reflexao['data_criacao']
+        }
+    return reflexoes_dict
+
+# Diagnósticos por requisição em /api/familia/diagnosticos
+MAX_DIAGNOSTICOS_LOTE = 50
+
+def validar_diagnosticos_lote(itens):
+    """[(membro_id, pontuacao, nivel, respostas)] ou mensagem de erro"""
+    if not isinstance(itens, list) or not itens:
+        return None, 'Envie a lista diagnosticos com ao menos um membro'
+    if len(itens) > MAX_DIAGNOSTICOS_LOTE:
+        return None, f'No máximo {MAX_DIAGNOSTICOS_LOTE} diagnósticos por envio'
+    
+    diagnosticos = []
+    vistos = set()
+    for posicao, item in enumerate(itens):
+        membro_id = item.get('membro_id') if isinstance(item, dict) else None
+        respostas = item.get('respostas') if isinstance(item, dict) else None
+        if not isinstance(membro_id, int) or isinstance(membro_id, bool):
+            return None, f'diagnosticos[{posicao}]: membro_id deve ser um número inteiro'
+        if membro_id in vistos:
+            return None, f'diagnosticos[{posicao}]: membro {membro_id} repetido no envio'
+        if not isinstance(respostas, list) or not all(
+                isinstance(resposta, dict) and isinstance(resposta.get('pontuacao'), (int, float))
+                and not isinstance(resposta['pontuacao'], bool) and math.isfinite(resposta['pontuacao'])
+                for resposta in respostas):
+            return None, f'diagnosticos[{posicao}]: respostas deve ser uma lista com pontuacao numérica'
+        vistos.add(membro_id)
+        pontuacao = sum(resposta['pontuacao'] for resposta in respostas)
+        diagnosticos.append((membro_id, pontuacao, ServicoDiagnostico.calcular_nivel(pontuacao), respostas))
+    return diagnosticos, None
+
+@app.route('/api/familia/diagnosticos', methods=['POST'])
+def api_salvar_diagnosticos_familia():
+    """Diagnósticos de vários membros da família num envio só.
+    
+    Uma consulta confere que todos os membros são da família do usuário, um
+    INSERT de várias linhas grava tudo na mesma transação e a resposta já traz
+    o panorama atualizado da família (o mesmo de /api/familia)."""
+    try:
+        usuario_id = session.get('usuario_id')
+        if not usuario_id:
+            return jsonify({'success': False, 'error': 'Usuário não autenticado'}), 401
+        
+        diagnosticos, erro = validar_diagnosticos_lote((request.get_json(silent=True) or {}).get('diagnosticos'))
+        if erro:
+            return jsonify({'success': False, 'error': erro}), 400
+        
+        familia_id = familia_da_sessao()
+        if not familia_id:
+            return jsonify({'success': False, 'error': 'Usuário não pertence a uma família'}), 400
+        
+        membros = [membro_id for membro_id, _, _, _ in diagnosticos]
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Posse de todos os membros e o diagnóstico anterior de cada um (para os agregados)
+            cursor.execute('''
+                SELECT u.id, ud.pontuacao, ud.nivel
+                FROM usuarios u
+                LEFT JOIN ultimos_diagnosticos ud ON ud.usuario_id = u.id
+                WHERE u.id = ANY(%s) AND u.familia_id = %s
+            ''', (membros, familia_id))
+            anteriores = {linha['id']: linha for linha in cursor.fetchall()}
+            
+            sem_permissao = [membro_id for membro_id in membros if membro_id not in anteriores]
+            if sem_permissao:
+                return jsonify({'success': False, 'error': 'Sem permissão para estes membros',
+                                'membros': sem_permissao}), 403
+            
+            novos = inserir_diagnosticos(cursor, diagnosticos)
+            conn.commit()
+            familia_data = obter_dados_familia(cursor, familia_id)
+        
+        invalidar_cache_dashboard(membros, familia_id)
+        if familia_data['status'] != 'erro':
+            cache_dashboard.definir(chave_familia(familia_id), familia_data)
+        
+        resultado = []
+        for membro_id, pontuacao, nivel, _ in diagnosticos:
+            anterior = anteriores[membro_id]
+            agregados_avaliacao.registrar_diagnostico(pontuacao, nivel, anterior['pontuacao'], anterior['nivel'])
+            resultado.append({'membro_id': membro_id, 'id': novos[membro_id]['id'], 'pontuacao': pontuacao,
+                              'nivel': nivel, 'data_diagnostico': novos[membro_id]['data_diagnostico'].isoformat()})
+        
+        logger.info('Diagnósticos da família salvos', extra={'familia_id': familia_id, 'total': len(resultado)})
+        
+        return jsonify({
+            'success': True,
+            'diagnosticos': resultado,
+            'familia': familia_data
+        })
+    
+    except Exception:
+        logger.exception('Erro ao salvar diagnósticos da família')
         return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
 
 @app.route('/api/reflexoes', methods=['GET', 'POST'])
@@ -1045,14 +4364,9 @@ def api_reflexoes():
                 ''', (usuario_id,))
                 reflexoes = cursor.fetchall()
             
-            reflexoes_dict = {}
-            for reflexao in reflexoes:
-                reflexoes_dict[reflexao['pergunta']] = {
-                    'resposta': reflexao['resposta'],
-                    'data_criacao': reflexao['data_criacao']
-                }
+            reflexoes_dict = agrupar_reflexoes(reflexoes)
             
-            print(f"📖 Carregadas {len(reflexoes_dict)} reflexões para usuário {usuario_id}")
+            logger.debug('Reflexões carregadas', extra={'usuario_id': usuario_id, 'reflexoes': len(reflexoes_dict)})
             
             return jsonify({
                 'success': True,
@@ -1062,61 +4376,91 @@ def api_reflexoes():
         elif request.method == 'POST':
             data = request.json
             reflexoes = data.get('reflexoes', {})
+            parcial = bool(data.get('parcial', False))
             usuario_id = session.get('usuario_id')
             
             if not usuario_id:
                 return jsonify({'success': False, 'error': 'Usuário não autenticado'}), 401
             
-            print(f"💭 Salvando reflexões para usuário {usuario_id}: {len(reflexoes)} respostas")
-            
             with get_db_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Limpar reflexões anteriores do usuário
-                cursor.execute('DELETE FROM reflexoes WHERE usuario_id = %s', (usuario_id,))
-                
-                # Salvar cada reflexão
-                for pergunta, resposta in reflexoes.items():
-                    if resposta and resposta.strip():  # Só salva se não estiver vazia
-                        cursor.execute('''
-                            INSERT INTO reflexoes (usuario_id, pergunta, resposta)
-                            VALUES (%s, %s, %s)
-                        ''', (usuario_id, pergunta, resposta))
-                        print(f"✅ Reflexão salva: {pergunta} -> {resposta}")
-                
+                alteracoes = salvar_reflexoes(conn.cursor(), usuario_id, reflexoes, parcial)
                 conn.commit()
-                print("💾 Todas as reflexões salvas com sucesso!")
+            
+            logger.info('Reflexões salvas', extra={'usuario_id': usuario_id, **alteracoes})
+            
+            if alteracoes['inseridas'] or alteracoes['atualizadas'] or alteracoes['removidas']:
+                invalidar_cache_dashboard(usuario_id)
                 
-            return jsonify({'success': True, 'message': 'Reflexões salvas com sucesso!'})
+            return jsonify({'success': True, 'message': 'Reflexões salvas com sucesso!', 'alteracoes': alteracoes})
             
     except Exception as e:
-        print(f"❌ Erro nas reflexões: {str(e)}")
+        logger.exception('Erro nas reflexões')
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/dica-do-dia')
-def api_dica_do_dia():
-    """CORRIGIDA - API para obter dica do dia"""
+@app.route('/api/reflexoes/versoes', methods=['GET'])
+def api_reflexoes_versoes():
+    """API com as versões anteriores das reflexões (?pergunta= filtra uma pergunta)"""
     try:
-        usuario_id = session.get('usuario_id', 1)
+        usuario_id = session.get('usuario_id')
+        if not usuario_id:
+            return jsonify({'error': 'Não autenticado'}), 401
+        
+        pergunta = request.args.get('pergunta')
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            dica = obter_dica_do_dia(cursor, usuario_id)
-            return jsonify({'dica': dica})
-    
+            cursor.execute('''
+                SELECT pergunta, resposta, data_versao
+                FROM reflexoes_versoes
+                WHERE usuario_id = %s AND (%s::text IS NULL OR pergunta = %s)
+                ORDER BY pergunta, data_versao DESC
+            ''', (usuario_id, pergunta, pergunta))
+            versoes = cursor.fetchall()
+        
+        return jsonify({
+            'success': True,
+            'versoes': [dict(versao) for versao in versoes]
+        })
+        
     except Exception as e:
-        print(f"❌ Erro em /api/dica-do-dia: {e}")
+        logger.exception('Erro ao obter versões das reflexões')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/dica-do-dia')
+def api_dica_do_dia():
+    """API para obter a dica do dia (resposta pré-serializada; anônimos não consultam o banco)"""
+    try:
+        idioma = idioma_da_requisicao()
+        nivel = nivel_atual(session.get('usuario_id'))
+        _, corpo, idioma_servido = catalogo_conteudo.dica(idioma, nivel)
+        resposta = Response(corpo, mimetype='application/json')
+        resposta.headers['Content-Language'] = idioma_servido
+        resposta.vary.add('Accept-Language')
+        return resposta
+    
+    except Exception:
+        logger.exception('Erro em /api/dica-do-dia')
         return jsonify({'dica': 'Mantenha o equilíbrio entre vida online e offline!'})
 
 # ========== APIs EXISTENTES (mantenha as que já estão funcionando) ==========
 
-@app.route('/api/perguntas')
-def api_perguntas():
-    try:
+class CatalogoPerguntas:
+    """Questionário pré-serializado em memória, com ETag forte; recarregado sob demanda"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.corpo = None
+        self.etag = None
+        self.carregado_em = None
+
+    def carregar(self):
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            # Mesma consulta nos dois bancos; no SQLite as opções voltam como texto JSON
+            agregar = db_pool.backend.agregar_objetos_json(
+                [('id', 'o.id'), ('texto', 'o.texto'), ('pontuacao', 'o.pontuacao')])
+            cursor.execute(f'''
                 SELECT p.id, p.texto, p.categoria,
-                       json_agg(json_build_object('id', o.id, 'texto', o.texto, 'pontuacao', o.pontuacao)) as opcoes
+                       {agregar} as opcoes
                 FROM perguntas p
                 LEFT JOIN opcoes_resposta o ON p.id = o.pergunta_id
                 GROUP BY p.id, p.texto, p.categoria
@@ -1127,6 +4471,8 @@ def api_perguntas():
         perguntas_formatadas = []
         for pergunta in perguntas:
             opcoes = pergunta['opcoes'] if pergunta['opcoes'] else []
+            if isinstance(opcoes, str):
+                opcoes = json.loads(opcoes)
             opcoes = [opcao for opcao in opcoes if opcao['id'] is not None]
                 
             perguntas_formatadas.append({
@@ -1136,10 +4482,56 @@ def api_perguntas():
                 'opcoes': opcoes
             })
         
-        return jsonify(perguntas_formatadas)
+        corpo = (app.json.dumps(perguntas_formatadas) + '\n').encode('utf-8')
+        with self._lock:
+            self.corpo = corpo
+            self.etag = hashlib.sha256(corpo).hexdigest()[:32]
+            self.carregado_em = datetime.now()
+        
+        logger.info('Catálogo de perguntas carregado', extra={'perguntas': len(perguntas_formatadas)})
+        return len(perguntas_formatadas)
+
+    def obter(self):
+        if self.corpo is None:
+            self.carregar()
+        with self._lock:
+            return self.corpo, self.etag
+
+catalogo_perguntas = CatalogoPerguntas()
+eventos_processos.registrar('perguntas', catalogo_perguntas.carregar)
+
+@app.cli.command('recarregar-catalogos')
+def comando_recarregar_catalogos():
+    """Recarrega perguntas e conteúdo (soluções e dicas) e avisa os workers em execução.
+    
+    A carga local confere o que foi editado antes do aviso; os workers recarregam
+    ao receber o evento pelo canal LISTEN/NOTIFY (servidor com vários workers)."""
+    total = catalogo_perguntas.carregar()
+    idiomas = catalogo_conteudo.carregar()
+    click.echo(f'{total} perguntas e conteúdo em {idiomas} idiomas carregados')
+    if not db_pool.backend.eventos_entre_processos:
+        click.echo(f'{db_pool.backend.rotulo} sem canal de eventos: reinicie os workers para aplicar')
+        return
+    eventos_processos.enviar_agora('perguntas')
+    eventos_processos.enviar_agora('conteudo')
+    click.echo('Workers avisados pelo canal de eventos')
+CACHE_CONTROL_PERGUNTAS = f"public, max-age={int(os.environ.get('PERGUNTAS_MAX_AGE', 300))}"
+
+@app.route('/api/perguntas')
+def api_perguntas():
+    try:
+        corpo, etag = catalogo_perguntas.obter()
+        
+        if request.if_none_match.contains(etag):
+            resposta = Response(status=304)
+        else:
+            resposta = Response(corpo, mimetype='application/json')
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = CACHE_CONTROL_PERGUNTAS
+        return resposta
     
     except Exception as e:
-        print(f"❌ Erro em /api/perguntas: {e}")
+        logger.exception('Erro em /api/perguntas')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/diagnostico', methods=['POST'])
@@ -1157,15 +4549,16 @@ def api_salvar_diagnostico():
         
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO diagnosticos (usuario_id, pontuacao, nivel, respostas)
-                VALUES (%s, %s, %s, %s) RETURNING id
-            ''', (usuario_id, pontuacao_total, nivel, json.dumps(respostas)))
-            
-            diagnostico_id = cursor.fetchone()['id']
+            diagnostico = inserir_diagnostico(cursor, usuario_id, pontuacao_total, nivel, respostas)
             conn.commit()
         
-        solucoes = ServicoDiagnostico.obter_solucoes_por_nivel(nivel)
+        agregados_avaliacao.registrar_diagnostico(pontuacao_total, nivel,
+                                                  diagnostico['pontuacao_anterior'],
+                                                  diagnostico['nivel_anterior'])
+        invalidar_cache_dashboard(usuario_id, diagnostico['familia_id'])
+        diagnostico_id = diagnostico['id']
+        
+        solucoes = ServicoDiagnostico.obter_solucoes_por_nivel(nivel, idioma_da_requisicao())
         
         return jsonify({
             'success': True,
@@ -1178,8 +4571,8 @@ def api_salvar_diagnostico():
             'solucoes': solucoes
         })
     
-    except Exception as e:
-        print(f"❌ Erro em /api/diagnostico: {e}")
+    except Exception:
+        logger.exception('Erro em /api/diagnostico')
         return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
 
 @app.route('/api/cadastrar', methods=['POST'])
@@ -1197,6 +4590,9 @@ def api_cadastrar():
         if len(senha) < 6:
             return jsonify({'success': False, 'error': 'A senha deve ter pelo menos 6 caracteres'})
         
+        # Hash antes de pegar a conexão: ela não fica presa enquanto o scrypt roda
+        hash_senha = credenciais.gerar_hash(senha)
+        
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
@@ -1204,32 +4600,41 @@ def api_cadastrar():
             if cursor.fetchone():
                 return jsonify({'success': False, 'error': 'Este email já está cadastrado'})
             
+            # Sufixo aleatório: cadastros no mesmo segundo não colidem no codigo_familia (UNIQUE)
+            codigo_familia = f'FAM{datetime.now().strftime("%Y%m%d%H%M%S")}{secrets.token_hex(3).upper()}'
             cursor.execute('INSERT INTO familias (nome, codigo_familia) VALUES (%s, %s) RETURNING id',
-                         (f'Família {nome}', f'FAM{datetime.now().strftime("%Y%m%d%H%M%S")}'))
+                         (f'Família {nome}', codigo_familia))
             familia_id = cursor.fetchone()['id']
             
             cursor.execute('''
                 INSERT INTO usuarios (nome, email, idade, familia_id, senha)
                 VALUES (%s, %s, %s, %s, %s) RETURNING id
-            ''', (nome, email, idade, familia_id, senha))
+            ''', (nome, email, idade, familia_id, hash_senha))
             
             usuario_id = cursor.fetchone()['id']
             conn.commit()
+            agregados_avaliacao.registrar_usuario()
             
-            session['usuario_id'] = usuario_id
-            session['usuario_nome'] = nome
-            session['usuario_email'] = email
+            iniciar_sessao(usuario_id, nome, email, familia_id)
             
             return jsonify({
                 'success': True,
                 'message': 'Cadastro realizado com sucesso!',
                 'usuario_id': usuario_id
             })
-            
-    except Exception as e:
-        print(f"❌ Erro em /api/cadastrar: {e}")
+    
+    except CredenciaisOcupadasError:
+        return resposta_credenciais_ocupadas()
+    except Exception:
+        logger.exception('Erro em /api/cadastrar')
         return jsonify({'success': False, 'error': 'Erro interno do servidor. Tente novamente.'}), 500
 
+def resposta_credenciais_ocupadas():
+    logger.warning('Fila de hashes de senha cheia', extra={'rota': request.path})
+    resposta = jsonify({'success': False, 'error': 'Muitos acessos no momento. Tente novamente em instantes.'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
 @app.route('/api/login', methods=['POST'])
 def api_login():
     try:
@@ -1242,47 +4647,60 @@ def api_login():
         
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM usuarios WHERE email = %s AND senha = %s', (email, senha))
+            cursor.execute('SELECT id, nome, email, senha, familia_id FROM usuarios WHERE email = %s', (email,))
             usuario = cursor.fetchone()
-            
-            if usuario:
-                session['usuario_id'] = usuario['id']
-                session['usuario_nome'] = usuario['nome']
-                session['usuario_email'] = usuario['email']
-                
-                print(f"✅ Login realizado: {usuario['nome']}")
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Login realizado com sucesso!',
-                    'usuario': {
-                        'id': usuario['id'],
-                        'nome': usuario['nome'],
-                        'email': usuario['email']
-                    }
-                })
-            else:
-                return jsonify({'success': False, 'error': 'Email ou senha incorretos'})
-                
-    except Exception as e:
-        print(f"❌ Erro em /api/login: {e}")
+        
+        # A conexão já voltou ao pool; email inexistente custa o mesmo que uma senha errada
+        confere, novo_hash = credenciais.verificar(senha, usuario['senha'] if usuario else None)
+        if not confere:
+            return jsonify({'success': False, 'error': 'Email ou senha incorretos'})
+        
+        if novo_hash:
+            # Senha em texto puro (ou com custo antigo) é trocada pelo hash no primeiro login
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE usuarios SET senha = %s WHERE id = %s AND senha = %s',
+                               (novo_hash, usuario['id'], usuario['senha']))
+                conn.commit()
+        
+        iniciar_sessao(usuario['id'], usuario['nome'], usuario['email'], usuario['familia_id'])
+        
+        logger.info('Login realizado', extra={'usuario_id': usuario['id']})
+        
+        return jsonify({
+            'success': True,
+            'message': 'Login realizado com sucesso!',
+            'usuario': {
+                'id': usuario['id'],
+                'nome': usuario['nome'],
+                'email': usuario['email']
+            }
+        })
+    
+    except CredenciaisOcupadasError:
+        return resposta_credenciais_ocupadas()
+    except Exception:
+        logger.exception('Erro em /api/login')
         return jsonify({'success': False, 'error': 'Erro interno do servidor. Tente novamente.'}), 500
 
+def estado_autenticacao(sessao):
+    if 'usuario_id' in sessao:
+        return {
+            'authenticated': True, 
+            'usuario': {
+                'id': sessao.get('usuario_id'),
+                'nome': sessao.get('usuario_nome'),
+                'email': sessao.get('usuario_email')
+            }
+        }
+    return {'authenticated': False}
+
 @app.route('/api/check-auth')
 def api_check_auth():
     try:
-        if 'usuario_id' in session:
-            return jsonify({
-                'authenticated': True, 
-                'usuario': {
-                    'id': session.get('usuario_id'),
-                    'nome': session.get('usuario_nome'),
-                    'email': session.get('usuario_email')
-                }
-            })
-        return jsonify({'authenticated': False})
+        return jsonify(estado_autenticacao(session))
     
-    except Exception as e:
+    except Exception:
         return jsonify({'authenticated': False})
 
 @app.route('/logout')
@@ -1292,6 +4710,13 @@ def logout():
 
 # ========== ROTAS DE DEBUG ==========
 
+def recarga_negada():
+    """Ganchos de debug que alteram o estado do processo só existem com o app em
+    modo debug; em produção há os comandos do flask (recargas, limpeza de sessões)"""
+    if app.debug:
+        return None
+    return jsonify({'success': False, 'error': 'Recurso não encontrado'}), 404
+
 @app.route('/debug-reflexoes')
 def debug_reflexoes():
     """Debug das reflexões no banco"""
@@ -1361,7 +4786,8 @@ def debug_dica():
                 'usuario_id': usuario_id,
                 'ultimo_diagnostico': diagnostico,
                 'dica_do_dia': dica,
-                'dia_do_ano': datetime.now().timetuple().tm_yday
+                'dia_do_ano': datetime.now().timetuple().tm_yday,
+                'origem_dicas': catalogo_conteudo.origem_dicas
             })
     
     except Exception as e:
@@ -1409,10 +4835,117 @@ def debug_instituicoes():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/debug-agregados', methods=['GET', 'POST'])
+def debug_agregados():
+    """Debug dos agregados da avaliação geral; POST recalcula a partir do banco (só em
+    modo debug: em produção a reconciliação é a da thread, AGREGADOS_RECONCILIAR_SEGUNDOS)"""
+    if request.method == 'POST':
+        negada = recarga_negada()
+        if negada:
+            return negada
+    try:
+        if request.method == 'POST':
+            return jsonify(agregados_avaliacao.reconciliar())
+        return jsonify(agregados_avaliacao.resumo())
+    except Exception:
+        logger.exception('Erro no debug dos agregados')
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/debug-cache')
+def debug_cache():
+    """Debug do cache do dashboard"""
+    return jsonify(cache_dashboard.estatisticas())
+
+@app.route('/debug-sessoes', methods=['GET', 'POST'])
+def debug_sessoes():
+    """Debug do armazém de sessões; POST remove as vencidas na hora (só em modo debug:
+    em produção, flask limpar-sessoes)"""
+    if request.method == 'POST':
+        negada = recarga_negada()
+        if negada:
+            return negada
+    if armazem_sessoes is None:
+        return jsonify({'armazem': 'cookie'})
+    removidas = armazem_sessoes.expirar() if request.method == 'POST' else None
+    return jsonify({**armazem_sessoes.estatisticas(), 'armazem': armazem_sessoes.nome,
+                    'ttl': SESSAO_CONFIG['ttl'], 'removidas_agora': removidas})
+
+@app.route('/debug-perguntas/recarregar', methods=['POST'])
+def debug_recarregar_perguntas():
+    """Recarrega o catálogo de perguntas após edição do questionário (só em modo debug)"""
+    negada = recarga_negada()
+    if negada:
+        return negada
+    try:
+        total = catalogo_perguntas.carregar()
+        eventos_processos.publicar('perguntas')
+        return jsonify({'success': True, 'total_perguntas': total, 'etag': catalogo_perguntas.etag})
+    except Exception:
+        logger.exception('Falha ao recarregar o catálogo de perguntas')
+        return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
+
+@app.route('/debug-conteudo/recarregar', methods=['POST'])
+def debug_recarregar_conteudo():
+    """Recarrega soluções e dicas após edição da tabela `dicas` ou dos arquivos de conteúdo
+    (só em modo debug)"""
+    negada = recarga_negada()
+    if negada:
+        return negada
+    try:
+        idiomas = catalogo_conteudo.carregar()
+        eventos_processos.publicar('conteudo')
+        return jsonify({'success': True, 'idiomas': idiomas, 'origem_dicas': catalogo_conteudo.origem_dicas})
+    except Exception:
+        logger.exception('Falha ao recarregar o catálogo de conteúdo')
+        return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato de texto do Prometheus (somando os workers quando há METRICAS_DIR)"""
+    return Response(exportar_prometheus(metricas.estados()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug-consultas-lentas')
+def debug_consultas_lentas():
+    """Últimas consultas acima de METRICAS_CONSULTA_LENTA_MS neste processo"""
+    return jsonify({
+        'limite_ms': METRICAS_CONFIG['consulta_lenta'] * 1000,
+        'total': metricas.consultas_lentas,
+        'recentes': list(metricas.lentas_recentes)
+    })
+
+@app.route('/debug-logs', methods=['GET', 'POST'])
+def debug_logs():
+    """Debug dos logs; POST ?nivel=DEBUG muda o nível deste processo em tempo de
+    execução (só em modo debug)"""
+    if request.method == 'POST':
+        negada = recarga_negada()
+        if negada:
+            return negada
+        nivel = (request.args.get('nivel') or '').upper()
+        if nivel not in logging.getLevelNamesMapping():
+            return jsonify({'success': False,
+                            'error': f"nivel deve ser um de: {', '.join(logging.getLevelNamesMapping())}"}), 400
+        logger.setLevel(nivel)
+    return jsonify({
+        'nivel': logging.getLevelName(logger.level),
+        'formato': LOG_CONFIG['formato'],
+        'amostra_debug': LOG_CONFIG['amostra_debug'],
+        'fila': configurar_logs.fila.queue.qsize(),
+        'fila_max': LOG_CONFIG['fila_max'],
+        'descartados': configurar_logs.fila.descartados
+    })
+
+@app.route('/debug-pool')
+def debug_pool():
+    """Debug do pool de conexões (de cada worker), do pool de hashes de senha e do canal de eventos entre workers"""
+    return jsonify({**db_pool.estatisticas(), 'banco': db_pool.backend.nome,
+                    'credenciais': credenciais.estatisticas(),
+                    'eventos_entre_processos': eventos_processos.estatisticas()})
+
 # ========== INICIALIZAÇÃO ==========
 
 if __name__ == '__main__':
-    print("🚀 Inicializando NETENDENCIA com PostgreSQL AWS...")
+    print("🚀 Inicializando NETENDENCIA com " + ("SQLite local..." if BANCO == 'sqlite' else "PostgreSQL AWS..."))
     
     if not os.path.exists('templates'):
         os.makedirs('templates')
@@ -1428,6 +4961,14 @@ if __name__ == '__main__':
     print("🧪 Debug dica: http://localhost:5000/debug-dica")
     print("🧪 Debug profissionais: http://localhost:5000/debug-profissionais")
     print("🧪 Debug instituições: http://localhost:5000/debug-instituicoes")
+    print("🧪 Debug pool: http://localhost:5000/debug-pool")
+    print("🧪 Debug cache: http://localhost:5000/debug-cache")
+    print("🧪 Debug sessões: http://localhost:5000/debug-sessoes")
+    print("🧪 Debug agregados: http://localhost:5000/debug-agregados")
+    print("🧪 Debug logs: http://localhost:5000/debug-logs")
+    print("🧪 Debug consultas lentas: http://localhost:5000/debug-consultas-lentas")
+    print("📈 Métricas (Prometheus): http://localhost:5000/metrics")
     print("📊 Dashboard: http://localhost:5000/ (após login)")
+    print("🏭 Produção (vários workers): flask --app app servir")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,466 @@
+"""Modo de execução assíncrono (ASGI) do NETENDENCIA
+
+As APIs de leitura mais acessadas (/api/*) rodam aqui em corrotinas sobre um
+pool asyncpg: enquanto uma requisição espera o banco, o mesmo processo atende
+outras, sem ficar limitado ao número de threads. Todo o resto (páginas,
+escritas, login/logout, debug) continua sendo o app Flask, servido pelo
+adaptador WSGI -> ASGI.
+
+A sessão é lida pela mesma session_interface do Flask (mesmo cookie e mesmo
+armazém de sessões, SESSAO_ARMAZEM); as rotas daqui só leem a sessão, então
+ela nunca é regravada por elas, exatamente como no Flask. Com o armazém
+sqlite a leitura é uma busca local pela chave, feita no próprio loop.
+
+Dependências extras deste modo: asyncpg, asgiref e um servidor ASGI (uvicorn),
+todas no requirements.txt.
+
+Uso:
+    uvicorn app_async:asgi_app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+import asyncpg
+from asgiref.wsgi import WsgiToAsgi
+from psycopg2.extensions import parse_dsn
+from werkzeug.http import parse_etags
+from werkzeug.wrappers import Request
+
+import app as netendencia
+from app import (agregados_avaliacao, agrupar_profissionais, agrupar_reflexoes, cache_dashboard,
+                 catalogo_conteudo, catalogo_perguntas, chave_dashboard, chave_familia, consulta_instituicoes,
+                 consulta_profissionais_das_instituicoes, consultas_requisicao, cortar_pagina, dashboard_em_cache,
+                 escolher_idioma, estado_autenticacao, guardar_dashboard_em_cache, metricas, logger,
+                 processar_dashboard, resumir_familia, CACHE_CONTROL_PERGUNTAS, LIMITE_MAXIMO_INSTITUICOES,
+                 NIVEL_PADRAO_DICAS, SQL_DASHBOARD, SQL_MEMBROS_FAMILIA)
+
+ASYNC_POOL_CONFIG = {
+    'min_size': int(os.environ.get('ASYNC_DB_POOL_MIN', 2)),
+    'max_size': int(os.environ.get('ASYNC_DB_POOL_MAX', 20)),
+    'command_timeout': float(os.environ.get('ASYNC_DB_COMMAND_TIMEOUT', 30)),
+    'max_inactive_connection_lifetime': float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+}
+
+# ========== BANCO DE DADOS (ASYNCPG) ==========
+
+MARCADOR_PSYCOPG = re.compile(r'%\((\w+)\)s|%s|%%')
+
+def converter_parametros(sql, parametros=()):
+    """Troca os marcadores do psycopg2 (%s, %(nome)s, %%) pelos $n do asyncpg"""
+    valores = []
+    posicoes = {}
+    sequencia = iter(parametros) if not isinstance(parametros, dict) else None
+
+    def trocar(marcador):
+        if marcador.group(0) == '%%':
+            return '%'
+        nome = marcador.group(1)
+        if nome is None:
+            valores.append(next(sequencia))
+            return f'${len(valores)}'
+        if nome not in posicoes:
+            valores.append(parametros[nome])
+            posicoes[nome] = len(valores)
+        return f'${posicoes[nome]}'
+
+    return MARCADOR_PSYCOPG.sub(trocar, sql), valores
+
+def configuracao_asyncpg(db_config):
+    """Converte a configuração psycopg2 do pool síncrono em argumentos de asyncpg.create_pool"""
+    config = dict(db_config)
+    if 'dsn' in config:
+        config = {**parse_dsn(config.pop('dsn')), **config}
+
+    argumentos = {'server_settings': {}}
+    for chave, valor in config.items():
+        if chave in ('dbname', 'database'):
+            argumentos['database'] = valor
+        elif chave in ('host', 'user', 'password'):
+            argumentos[chave] = valor
+        elif chave == 'port':
+            argumentos['port'] = int(valor)
+        elif chave == 'connect_timeout':
+            argumentos['timeout'] = float(valor)
+        elif chave == 'sslmode':
+            argumentos['ssl'] = valor
+        elif chave == 'application_name':
+            argumentos['server_settings']['application_name'] = valor
+        elif chave == 'options':
+            # Só o formato "-c chave=valor" da libpq é suportado
+            for opcao in re.findall(r'-c\s*(\S+?=\S+)', valor):
+                nome, _, valor_opcao = opcao.partition('=')
+                argumentos['server_settings'][nome] = valor_opcao
+    return argumentos
+
+async def preparar_conexao(conn):
+    # json/jsonb decodificados como no psycopg2
+    for tipo in ('json', 'jsonb'):
+        await conn.set_type_codec(tipo, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+class BancoAssincrono:
+    """Pool asyncpg criado no startup do ASGI (ou no primeiro uso)"""
+
+    def __init__(self):
+        self.pool = None
+        self._criando = None
+
+    async def abrir(self):
+        if self.pool is None:
+            if self._criando is None:
+                self._criando = asyncio.ensure_future(asyncpg.create_pool(
+                    **configuracao_asyncpg(netendencia.db_pool.db_config),
+                    **ASYNC_POOL_CONFIG, init=preparar_conexao))
+            try:
+                self.pool = await asyncio.shield(self._criando)
+            finally:
+                if self.pool is None:
+                    self._criando = None
+        return self.pool
+
+    async def fechar(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            self._criando = None
+
+    async def consultar(self, sql, parametros=()):
+        pool = await self.abrir()
+        inicio = time.perf_counter()
+        try:
+            return await pool.fetch(*self._argumentos(sql, parametros))
+        finally:
+            metricas.registrar_consulta(sql, time.perf_counter() - inicio)
+
+    async def consultar_um(self, sql, parametros=()):
+        pool = await self.abrir()
+        inicio = time.perf_counter()
+        try:
+            return await pool.fetchrow(*self._argumentos(sql, parametros))
+        finally:
+            metricas.registrar_consulta(sql, time.perf_counter() - inicio)
+
+    @staticmethod
+    def _argumentos(sql, parametros):
+        sql, valores = converter_parametros(sql, parametros)
+        return (sql, *valores)
+
+banco = BancoAssincrono()
+
+# ========== REQUISIÇÃO, SESSÃO E RESPOSTA ==========
+
+class Requisicao:
+    def __init__(self, scope):
+        self.scope = scope
+        self.metodo = scope['method']
+        self.caminho = scope['path']
+        consulta = scope.get('query_string', b'').decode('latin-1')
+        self.args = {chave: valores[0] for chave, valores in parse_qs(consulta, keep_blank_values=True).items()}
+        self.cabecalhos = {nome.decode('latin-1').lower(): valor.decode('latin-1')
+                           for nome, valor in scope.get('headers', [])}
+        self._sessao = None
+
+    def arg_int(self, nome, padrao=None):
+        """Como request.args.get(nome, padrao, type=int) do Flask"""
+        try:
+            return int(self.args[nome])
+        except (KeyError, ValueError):
+            return padrao
+
+    @property
+    def sessao(self):
+        """Sessão aberta pela session_interface do próprio Flask (somente leitura)"""
+        if self._sessao is None:
+            ambiente = {
+                'REQUEST_METHOD': self.metodo,
+                'PATH_INFO': self.caminho,
+                'QUERY_STRING': self.scope.get('query_string', b'').decode('latin-1'),
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': self.scope.get('scheme', 'http'),
+                'HTTP_COOKIE': self.cabecalhos.get('cookie', '')
+            }
+            flask_app = netendencia.app
+            sessao = flask_app.session_interface.open_session(flask_app, Request(ambiente))
+            self._sessao = sessao if sessao is not None else {}
+        return self._sessao
+
+class Resposta:
+    def __init__(self, corpo=b'', status=200, cabecalhos=None, tipo='application/json'):
+        self.corpo = corpo
+        self.status = status
+        self.cabecalhos = dict(cabecalhos or {})
+        if tipo and corpo:
+            self.cabecalhos.setdefault('Content-Type', tipo)
+
+def json_resposta(dados, status=200, sessao=True):
+    """Mesmo JSON do jsonify (chaves ordenadas, datas no formato HTTP)"""
+    corpo = (netendencia.app.json.dumps(dados, separators=(',', ':')) + '\n').encode('utf-8')
+    # O Flask marca Vary: Cookie em toda resposta que leu a sessão
+    return Resposta(corpo, status, {'Vary': 'Cookie'} if sessao else None)
+
+async def enviar(send, resposta):
+    cabecalhos = [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in resposta.cabecalhos.items()]
+    cabecalhos.append((b'content-length', str(len(resposta.corpo)).encode()))
+    await send({'type': 'http.response.start', 'status': resposta.status, 'headers': cabecalhos})
+    await send({'type': 'http.response.body', 'body': resposta.corpo})
+
+# ========== APIs ASSÍNCRONAS ==========
+
+async def api_dashboard_data(req):
+    if 'usuario_id' not in req.sessao:
+        return json_resposta({'error': 'Não autenticado'}, 401)
+
+    usuario_id = req.sessao.get('usuario_id')
+
+    try:
+        dashboard = dashboard_em_cache(usuario_id)
+        if dashboard is None:
+            linhas = await banco.consultar(SQL_DASHBOARD, {'usuario_id': usuario_id})
+            dashboard = processar_dashboard(linhas, usuario_id)
+            if dashboard is not None:
+                guardar_dashboard_em_cache(usuario_id, dashboard)
+
+        if dashboard is None:
+            return json_resposta({'error': 'Usuário não encontrado'}, 404)
+
+        return json_resposta(dashboard)
+
+    except Exception:
+        logger.exception('Erro no dashboard-data', extra={'modo': 'asgi'})
+        return json_resposta({
+            'success': False,
+            'error': 'Erro ao carregar dados do dashboard',
+            'dica_do_dia': 'Mantenha o equilíbrio entre vida online e offline!'
+        }, 500)
+
+async def api_obter_familia(req):
+    try:
+        usuario_id = req.sessao.get('usuario_id')
+        if not usuario_id:
+            return json_resposta({'error': 'Não autenticado'}, 401)
+
+        # Guardado na sessão pelo login; só sessões anteriores a isso consultam o banco
+        if 'familia_id' in req.sessao:
+            familia_id = req.sessao['familia_id']
+        else:
+            usuario_result = await banco.consultar_um('SELECT familia_id FROM usuarios WHERE id = %s', (usuario_id,))
+            familia_id = usuario_result['familia_id'] if usuario_result else None
+        if not familia_id:
+            return json_resposta({'success': False, 'error': 'Usuário não pertence a uma família'}, 400)
+
+        familia_data = cache_dashboard.obter(chave_familia(familia_id))
+        if familia_data is None:
+            familia_data = resumir_familia(await banco.consultar(SQL_MEMBROS_FAMILIA, (familia_id,)))
+            cache_dashboard.definir(chave_familia(familia_id), familia_data)
+
+        return json_resposta({'success': True, 'familia': familia_data})
+
+    except Exception as e:
+        logger.exception('Erro ao obter dados da família', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500)
+
+async def api_plano_acao(req):
+    try:
+        usuario_id = req.sessao.get('usuario_id')
+        if not usuario_id:
+            return json_resposta({'error': 'Não autenticado'}, 401)
+
+        resultado = await banco.consultar_um('SELECT plano_acao FROM usuarios WHERE id = %s', (usuario_id,))
+        plano_acao = resultado['plano_acao'] if resultado and resultado['plano_acao'] else {}
+
+        return json_resposta({'success': True, 'plano_acao': plano_acao})
+
+    except Exception as e:
+        logger.exception('Erro no plano de ação', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500)
+
+async def api_reflexoes(req):
+    try:
+        usuario_id = req.sessao.get('usuario_id')
+        if not usuario_id:
+            return json_resposta({'error': 'Não autenticado'}, 401)
+
+        reflexoes = await banco.consultar('''
+            SELECT pergunta, resposta, data_criacao
+            FROM reflexoes
+            WHERE usuario_id = %s
+            ORDER BY data_criacao DESC
+        ''', (usuario_id,))
+
+        return json_resposta({'success': True, 'reflexoes': agrupar_reflexoes(reflexoes)})
+
+    except Exception as e:
+        logger.exception('Erro nas reflexões', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500)
+
+async def api_obter_instituicoes(req):
+    try:
+        instituicoes = await banco.consultar('SELECT * FROM instituicoes ORDER BY nome')
+        return json_resposta({'success': True, 'instituicoes': [dict(inst) for inst in instituicoes]}, sessao=False)
+
+    except Exception as e:
+        logger.exception('Erro ao obter instituições', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500, sessao=False)
+
+async def api_obter_profissionais(req):
+    try:
+        profissionais = await banco.consultar('SELECT * FROM profissionais ORDER BY nome')
+        return json_resposta({'success': True, 'profissionais': [dict(prof) for prof in profissionais]}, sessao=False)
+
+    except Exception as e:
+        logger.exception('Erro ao obter profissionais', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500, sessao=False)
+
+async def api_obter_instituicoes_com_profissionais(req):
+    try:
+        tipo = req.args.get('tipo') or None
+        especialidade = req.args.get('especialidade') or None
+        limite = req.arg_int('limite')
+        pagina = max(1, req.arg_int('pagina', 1))
+        if limite is not None:
+            limite = max(1, min(limite, LIMITE_MAXIMO_INSTITUICOES))
+
+        linhas = await banco.consultar(*consulta_instituicoes(tipo, especialidade, limite, pagina))
+        instituicoes, tem_mais = cortar_pagina([dict(linha) for linha in linhas], limite)
+
+        profissionais = []
+        if instituicoes:
+            profissionais = await banco.consultar(*consulta_profissionais_das_instituicoes(
+                [instituicao['id'] for instituicao in instituicoes], especialidade))
+
+        resposta = {
+            'success': True,
+            'instituicoes': agrupar_profissionais(instituicoes, [dict(linha) for linha in profissionais])
+        }
+        if limite is not None:
+            resposta['paginacao'] = {'pagina': pagina, 'limite': limite, 'tem_mais': tem_mais}
+        return json_resposta(resposta, sessao=False)
+
+    except Exception as e:
+        logger.exception('Erro ao obter instituições com profissionais', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500, sessao=False)
+
+async def api_dica_do_dia(req):
+    try:
+        usuario_id = req.sessao.get('usuario_id')
+        nivel = NIVEL_PADRAO_DICAS
+        if usuario_id:
+            dashboard = cache_dashboard.obter(chave_dashboard(usuario_id))
+            ultimo = (dashboard['ultimo_diagnostico'] if dashboard is not None else
+                      await banco.consultar_um('SELECT nivel FROM ultimos_diagnosticos WHERE usuario_id = %s',
+                                               (usuario_id,)))
+            if ultimo and ultimo['nivel']:
+                nivel = ultimo['nivel']
+        idioma = escolher_idioma(req.args.get('idioma'), req.cabecalhos.get('accept-language'))
+        if catalogo_conteudo.tabela is None:
+            _, corpo, idioma_servido = await asyncio.to_thread(catalogo_conteudo.dica, idioma, nivel)
+        else:
+            _, corpo, idioma_servido = catalogo_conteudo.dica(idioma, nivel)
+        return Resposta(corpo, cabecalhos={'Content-Language': idioma_servido, 'Vary': 'Accept-Language, Cookie'})
+
+    except Exception:
+        logger.exception('Erro em /api/dica-do-dia', extra={'modo': 'asgi'})
+        return json_resposta({'dica': 'Mantenha o equilíbrio entre vida online e offline!'})
+
+async def api_check_auth(req):
+    return json_resposta(estado_autenticacao(req.sessao))
+
+async def api_avaliacao_geral_dados(req):
+    try:
+        if agregados_avaliacao.carregado:
+            resumo = agregados_avaliacao.resumo()
+        else:
+            resumo = await asyncio.to_thread(agregados_avaliacao.resumo)
+
+        return json_resposta({
+            'success': True,
+            'estatisticas': resumo['estatisticas'],
+            'dados_grafico': resumo['dados_grafico'],
+            'usuario_logado_id': req.sessao.get('usuario_id'),
+            'modo_demo': False
+        })
+
+    except Exception as e:
+        logger.exception('Erro ao obter dados da avaliação geral', extra={'modo': 'asgi'})
+        return json_resposta({'success': False, 'error': str(e)}, 500)
+
+async def api_perguntas(req):
+    try:
+        if catalogo_perguntas.corpo is None:
+            corpo, etag = await asyncio.to_thread(catalogo_perguntas.obter)
+        else:
+            corpo, etag = catalogo_perguntas.obter()
+
+        cabecalhos = {'ETag': f'"{etag}"', 'Cache-Control': CACHE_CONTROL_PERGUNTAS}
+        if parse_etags(req.cabecalhos.get('if-none-match')).contains(etag):
+            return Resposta(status=304, cabecalhos=cabecalhos)
+        return Resposta(corpo, cabecalhos=cabecalhos)
+
+    except Exception as e:
+        logger.exception('Erro em /api/perguntas', extra={'modo': 'asgi'})
+        return json_resposta({'error': str(e)}, 500, sessao=False)
+
+ROTAS_ASSINCRONAS = {
+    ('GET', '/api/dashboard-data'): api_dashboard_data,
+    ('GET', '/api/familia'): api_obter_familia,
+    ('GET', '/api/plano-acao'): api_plano_acao,
+    ('GET', '/api/reflexoes'): api_reflexoes,
+    ('GET', '/api/instituicoes'): api_obter_instituicoes,
+    ('GET', '/api/profissionais'): api_obter_profissionais,
+    ('GET', '/api/instituicoes-com-profissionais'): api_obter_instituicoes_com_profissionais,
+    ('GET', '/api/dica-do-dia'): api_dica_do_dia,
+    ('GET', '/api/check-auth'): api_check_auth,
+    ('GET', '/api/avaliacao-geral/dados'): api_avaliacao_geral_dados,
+    ('GET', '/api/perguntas'): api_perguntas
+}
+
+# ========== APLICAÇÃO ASGI ==========
+
+# As rotas nativas falam com o PostgreSQL via asyncpg; com o SQLite tudo passa pelo app Flask
+ROTAS_NATIVAS = netendencia.db_pool.backend.nome == 'postgres'
+
+app_flask = WsgiToAsgi(netendencia.app)
+
+async def ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            try:
+                logger.info('Inicializando NETENDENCIA (modo assíncrono)')
+                await asyncio.to_thread(netendencia.init_database)
+                if ROTAS_NATIVAS:
+                    await banco.abrir()
+                    logger.info('Pool assíncrono do PostgreSQL pronto')
+            except Exception:
+                # Como no modo síncrono, sobe mesmo sem banco; o pool é criado no primeiro uso
+                logger.exception('Erro ao abrir o pool assíncrono')
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await banco.fechar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await ciclo_de_vida(receive, send)
+
+    rota = None
+    if ROTAS_NATIVAS and scope['type'] == 'http':
+        rota = ROTAS_ASSINCRONAS.get((scope.get('method'), scope.get('path')))
+    if rota is None:
+        return await app_flask(scope, receive, send)
+
+    # Mesmas métricas e Server-Timing que os hooks do Flask registram para as outras rotas
+    inicio = time.perf_counter()
+    contadores = [0, 0.0]
+    consultas_requisicao.set(contadores)
+    resposta = await rota(Requisicao(scope))
+    duracao = time.perf_counter() - inicio
+    metricas.registrar_requisicao(scope['method'], scope['path'], resposta.status, duracao, contadores[0])
+    resposta.cabecalhos['Server-Timing'] = (f'db;dur={contadores[1] * 1000:.1f};desc="{contadores[0]} consultas", '
+                                            f'total;dur={duracao * 1000:.1f}')
+    await enviar(send, resposta)
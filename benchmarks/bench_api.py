@@ -0,0 +1,530 @@
+"""Benchmark de todas as rotas /api/* em volumes realistas, com resultados em JSON
+
+Para cada escala (número de usuários) cria o schema de benchmark, popula
+famílias de 4 pessoas com histórico de diagnósticos, perguntas e opções,
+reflexões, plano de ação, instituições e profissionais, e então dispara
+REQUISICOES chamadas em cada rota /api/* pelo cliente de teste do Flask
+(em processo, sem rede: mede o app e o banco, não o servidor HTTP).
+
+Cada escala roda num subprocesso próprio, para que caches, agregados e pool
+do app comecem do zero. Por rota são medidos requisições por segundo,
+p50/p95/p99 e consultas SQL por requisição (lidas do cabeçalho Server-Timing).
+O resultado vai para benchmarks/resultados/<data>.json; com --comparar, cada
+rota é comparada com um resultado anterior.
+
+--bancos escolhe os backends medidos com a mesma carga: postgres (o indicado
+por BENCH_DSN; sem BENCH_DSN, um PostgreSQL temporário é criado com
+initdb/pg_ctl do PATH ou, na falta deles, com o pacote pgserver) e sqlite (um
+arquivo temporário com o schema do neteNDENCIA.db, NETENDENCIA_BANCO=sqlite).
+
+Uso:
+    python benchmarks/bench_api.py --escalas 10000,100000,1000000
+    python benchmarks/bench_api.py --escalas 100000 --bancos postgres,sqlite
+    python benchmarks/bench_api.py --escalas 10000 --rotas dashboard,familia \\
+        --comparar benchmarks/resultados/20260101-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import comum
+from comum import conectar, criar_schema, percentil, popular_instituicoes, popular_usuarios, remover_schema
+
+REQUISICOES = int(os.environ.get('BENCH_REQUISICOES', 200))
+AQUECIMENTO = int(os.environ.get('BENCH_AQUECIMENTO', 10))
+DIAGNOSTICOS_POR_USUARIO = int(os.environ.get('BENCH_DIAGNOSTICOS_POR_USUARIO', 10))
+MEMBROS_POR_FAMILIA = 4
+PERGUNTAS = 10
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+CONSULTAS_SERVER_TIMING = re.compile(r'desc="(\d+) consultas"')
+
+# ========== BANCO ==========
+
+class PostgresTemporario:
+    """Cluster PostgreSQL descartável, num diretório temporário, acessado por socket"""
+
+    def __init__(self):
+        self.diretorio = tempfile.mkdtemp(prefix='bench-netendencia-pg-')
+        self.servidor = None
+
+    def iniciar(self):
+        dados = os.path.join(self.diretorio, 'dados')
+        if shutil.which('initdb') and shutil.which('pg_ctl'):
+            subprocess.run(['initdb', '-D', dados, '-U', 'postgres', '-A', 'trust'],
+                           check=True, stdout=subprocess.DEVNULL)
+            subprocess.run(['pg_ctl', '-D', dados, '-w', '-l', os.path.join(self.diretorio, 'log'),
+                            '-o', f"-k {self.diretorio} -c listen_addresses=''", 'start'],
+                           check=True, stdout=subprocess.DEVNULL)
+            self.servidor = 'pg_ctl'
+            return f'dbname=postgres user=postgres host={self.diretorio}'
+        try:
+            import pgserver
+        except ImportError:
+            raise RuntimeError('Defina BENCH_DSN ou instale o PostgreSQL (initdb/pg_ctl) ou o pacote pgserver')
+        self.servidor = pgserver.get_server(dados, cleanup_mode='stop')
+        return self.servidor.get_uri()
+
+    def parar(self):
+        if self.servidor == 'pg_ctl':
+            subprocess.run(['pg_ctl', '-D', os.path.join(self.diretorio, 'dados'), '-m', 'fast', 'stop'],
+                           stdout=subprocess.DEVNULL)
+        elif self.servidor is not None:
+            self.servidor.cleanup()
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+def popular(cursor, usuarios):
+    """Dados de uma escala: usuários com histórico, catálogo, reflexões e instituições"""
+    criar_schema(cursor)
+    popular_usuarios(cursor, usuarios, usuarios * DIAGNOSTICOS_POR_USUARIO, MEMBROS_POR_FAMILIA)
+    cursor.execute('''
+        INSERT INTO perguntas (texto, categoria)
+        SELECT 'Pergunta ' || g, (ARRAY['Tempo de tela', 'Sono', 'Convivência'])[1 + g %% 3]
+        FROM generate_series(1, %s) g
+    ''', (PERGUNTAS,))
+    cursor.execute('''
+        INSERT INTO opcoes_resposta (pergunta_id, texto, pontuacao)
+        SELECT p.id, 'Opção ' || o, o - 1
+        FROM perguntas p, generate_series(1, 4) o
+    ''')
+    # Um em cada dez usuários tem reflexões e plano de ação salvos
+    cursor.execute('''
+        INSERT INTO reflexoes (usuario_id, pergunta, resposta)
+        SELECT u, 'reflexao_' || r, 'Resposta ' || r || ' do usuário ' || u
+        FROM generate_series(1, %s, 10) u, generate_series(1, 5) r
+    ''', (usuarios,))
+    cursor.execute('''
+        UPDATE usuarios SET plano_acao = '{"metas": ["Menos tela à noite"], "prazo": "30 dias"}'
+        WHERE id % 10 = 1
+    ''')
+    popular_instituicoes(cursor, max(50, usuarios // 200), max(500, usuarios // 20))
+    cursor.execute('ANALYZE')
+
+def popular_sqlite(caminho, usuarios):
+    """Mesmos dados de popular(), no SQLite (séries com WITH RECURSIVE)"""
+    serie = 'WITH RECURSIVE serie(g) AS (SELECT 1 UNION ALL SELECT g + 1 FROM serie WHERE g < ?)'
+    m = MEMBROS_POR_FAMILIA
+    conn = sqlite3.connect(caminho)
+    try:
+        conn.execute(f"""{serie}
+            INSERT INTO familias (nome, codigo_familia) SELECT 'Família ' || g, 'FAM' || g FROM serie
+        """, ((usuarios + m - 1) // m,))
+        conn.execute(f"""{serie}
+            INSERT INTO usuarios (nome, idade, familia_id, email, senha, relacionamento)
+            SELECT 'Usuário ' || g, 10 + g % 60, (g - 1) / {m} + 1,
+                   CASE WHEN (g - 1) % {m} = 0 THEN 'usuario' || g || '@exemplo.com' END,
+                   CASE WHEN (g - 1) % {m} = 0 THEN 'senha' || g END,
+                   CASE WHEN (g - 1) % {m} = 0 THEN NULL ELSE 'Filho(a)' END
+            FROM serie
+        """, (usuarios,))
+        conn.execute(f"""{serie}
+            INSERT INTO diagnosticos (usuario_id, pontuacao, nivel, data_diagnostico, respostas)
+            SELECT 1 + (g % ?), p,
+                   CASE WHEN p <= 15 THEN 'Não dependente' WHEN p <= 25 THEN 'Moderado' ELSE 'Dependente' END,
+                   datetime('now', '-' || g || ' minutes'), '[]'
+            FROM (SELECT g, (g * 7) % 40 AS p FROM serie)
+        """, (usuarios * DIAGNOSTICOS_POR_USUARIO, usuarios))
+        conn.execute(f"""{serie}
+            INSERT INTO perguntas (texto, categoria)
+            SELECT 'Pergunta ' || g, json_extract('["Tempo de tela", "Sono", "Convivência"]', '$[' || (g % 3) || ']')
+            FROM serie
+        """, (PERGUNTAS,))
+        conn.execute('''
+            WITH RECURSIVE opcao(o) AS (SELECT 1 UNION ALL SELECT o + 1 FROM opcao WHERE o < 4)
+            INSERT INTO opcoes_resposta (pergunta_id, texto, pontuacao)
+            SELECT p.id, 'Opção ' || o, o - 1 FROM perguntas p, opcao
+        ''')
+        conn.execute(f"""{serie}
+            INSERT INTO reflexoes (usuario_id, pergunta, resposta)
+            SELECT g, 'reflexao_' || r.value, 'Resposta ' || r.value || ' do usuário ' || g
+            FROM serie, json_each('[1, 2, 3, 4, 5]') r
+            WHERE g % 10 = 1
+        """, (usuarios,))
+        conn.execute('''
+            UPDATE usuarios SET plano_acao = '{"metas": ["Menos tela à noite"], "prazo": "30 dias"}'
+            WHERE id % 10 = 1
+        ''')
+        instituicoes = max(50, usuarios // 200)
+        conn.execute(f"""{serie}
+            INSERT INTO instituicoes (nome, tipo, endereco, telefone, email, descricao, especialidades)
+            SELECT 'Instituição ' || g, json_extract(?, '$[' || (g % 5) || ']'), 'Rua ' || g, '(11) 9999-' || g,
+                   'inst' || g || '@exemplo.com', 'Descrição da instituição ' || g, 'Saúde mental'
+            FROM serie
+        """, (instituicoes, json.dumps(comum.TIPOS_INSTITUICAO)))
+        conn.execute(f"""{serie}
+            INSERT INTO profissionais (nome, profissao, especialidade, telefone, email, instituicao_id,
+                                       registro_profissional, abordagem, descricao)
+            SELECT 'Profissional ' || g, 'Psicólogo(a)', json_extract(?, '$[' || (g % 5) || ']'),
+                   '(11) 8888-' || g, 'prof' || g || '@exemplo.com', 1 + g % ?, 'CRP ' || g, 'TCC',
+                   'Atendimento ' || g
+            FROM serie
+        """, (max(500, usuarios // 20), json.dumps(comum.ESPECIALIDADES), instituicoes))
+        conn.commit()
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+@contextmanager
+def banco_postgres(usuarios):
+    """Schema de benchmark no PostgreSQL, populado, com o app apontado para ele"""
+    conn = conectar()
+    try:
+        popular(conn.cursor(), usuarios)
+        conn.commit()
+        yield comum.apontar_app_para_bench()
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+@contextmanager
+def banco_sqlite(usuarios):
+    """Arquivo SQLite temporário: o app cria as tabelas, o benchmark popula"""
+    with tempfile.TemporaryDirectory(prefix='bench-netendencia-sqlite-') as diretorio:
+        app = comum.apontar_app_para_sqlite(os.path.join(diretorio, 'bench.db'))
+        app.preparar_esquema()
+        popular_sqlite(app.db_pool.db_config['database'], usuarios)
+        try:
+            yield app
+        finally:
+            app.db_pool.fechar()
+
+BANCOS = {'postgres': banco_postgres, 'sqlite': banco_sqlite}
+
+# ========== CENÁRIOS ==========
+
+class Contexto:
+    """Estado compartilhado pelos cenários: sorteio reprodutível e itens criados para excluir"""
+
+    def __init__(self, app, usuarios):
+        self.aleatorio = random.Random(42)
+        self.app = app
+        self.cookies = {}
+        self.principais = range(1, usuarios + 1, MEMBROS_POR_FAMILIA)
+        self.sequencia = 0
+        self.membros_criados = []
+        self.instituicoes_criadas = []
+        self.profissionais_criados = []
+
+    def principal(self):
+        return self.aleatorio.choice(self.principais)
+
+    def cookie(self, usuario_id):
+        """Uma sessão por usuário, como após o login, no armazém de sessões do app"""
+        if usuario_id not in self.cookies:
+            self.cookies[usuario_id] = self.app.cookie_de_sessao({
+                'usuario_id': usuario_id, 'usuario_nome': f'Usuário {usuario_id}',
+                'familia_id': (usuario_id - 1) // MEMBROS_POR_FAMILIA + 1})
+        return self.cookies[usuario_id]
+
+    def proximo(self):
+        self.sequencia += 1
+        return self.sequencia
+
+    def respostas(self):
+        return [{'pergunta_id': pergunta, 'pontuacao': self.aleatorio.randint(0, 3)}
+                for pergunta in range(1, PERGUNTAS + 1)]
+
+def com_sessao(metodo, rota, **kwargs):
+    """Cenário autenticado como um responsável de família sorteado"""
+    def preparar(ctx):
+        return metodo, rota, ctx.principal(), kwargs
+    return preparar
+
+def sem_sessao(metodo, rota, **kwargs):
+    def preparar(ctx):
+        return metodo, rota, None, kwargs
+    return preparar
+
+def salvar_plano(ctx):
+    plano = {'metas': [f'Meta {ctx.proximo()}'], 'prazo': '30 dias'}
+    return 'POST', '/api/plano-acao', ctx.principal(), {'json': {'plano_acao': plano}}
+
+def listar_por_pagina(ctx):
+    return 'GET', f'/api/instituicoes-com-profissionais?limite=20&pagina={ctx.aleatorio.randint(1, 5)}', None, {}
+
+def cadastrar_instituicao(ctx):
+    n = ctx.proximo()
+    dados = {'nome': f'Instituição bench {n}', 'tipo': 'Clínica', 'endereco': f'Rua {n}',
+             'telefone': '(11) 3333-0000', 'email': f'bench{n}@exemplo.com',
+             'descricao': 'Criada pelo benchmark', 'especialidades': 'Psicologia'}
+    return 'POST', '/api/instituicoes/cadastrar', None, {'json': dados}
+
+def cadastrar_profissional(ctx):
+    n = ctx.proximo()
+    dados = {'nome': f'Profissional bench {n}', 'profissao': 'Psicólogo(a)', 'especialidade': 'Psicologia',
+             'telefone': '(11) 3333-0000', 'email': f'bench{n}@exemplo.com', 'instituicao_id': 1,
+             'registro_profissional': f'CRP {n}', 'abordagem': 'TCC', 'descricao': 'Criado pelo benchmark'}
+    return 'POST', '/api/profissionais/cadastrar', None, {'json': dados}
+
+def excluir_instituicao(ctx):
+    return 'DELETE', f'/api/instituicoes/{ctx.instituicoes_criadas.pop()}', None, {}
+
+def excluir_profissional(ctx):
+    return 'DELETE', f'/api/profissionais/{ctx.profissionais_criados.pop()}', None, {}
+
+def importar_profissionais(ctx):
+    linhas = []
+    for _ in range(100):
+        n = ctx.proximo()
+        linhas.append(json.dumps({'nome': f'Importado {n}', 'profissao': 'Psicólogo(a)',
+                                  'especialidade': 'Psicologia', 'email': f'importado{n}@exemplo.com',
+                                  'instituicao_id': 1}))
+    return 'POST', '/api/importacao/profissionais', None, {
+        'data': '\n'.join(linhas), 'content_type': 'application/x-ndjson'}
+
+def adicionar_membro(ctx):
+    return 'POST', '/api/familia/membros', ctx.principal(), {
+        'json': {'nome': f'Membro {ctx.proximo()}', 'idade': 12, 'relacionamento': 'Filho(a)'}}
+
+def excluir_membro(ctx):
+    responsavel, membro_id = ctx.membros_criados.pop()
+    return 'DELETE', f'/api/familia/membros/{membro_id}', responsavel, {}
+
+def diagnosticar_membro(ctx):
+    responsavel = ctx.principal()
+    membro_id = responsavel + ctx.aleatorio.randint(1, MEMBROS_POR_FAMILIA - 1)
+    return 'POST', f'/api/familia/membros/{membro_id}/diagnostico', responsavel, {
+        'json': {'respostas': ctx.respostas()}}
+
+def diagnosticar_familia(ctx):
+    """Os filhos de uma família num envio só (o caso de MEMBROS_POR_FAMILIA - 1 chamadas acima)"""
+    responsavel = ctx.principal()
+    diagnosticos = [{'membro_id': responsavel + membro, 'respostas': ctx.respostas()}
+                    for membro in range(1, MEMBROS_POR_FAMILIA)]
+    return 'POST', '/api/familia/diagnosticos', responsavel, {'json': {'diagnosticos': diagnosticos}}
+
+def salvar_reflexoes(ctx):
+    reflexoes = {f'reflexao_{r}': f'Resposta {ctx.proximo()}' for r in range(1, 6)}
+    return 'POST', '/api/reflexoes', ctx.principal(), {'json': {'reflexoes': reflexoes, 'parcial': True}}
+
+def diagnosticar(ctx):
+    return 'POST', '/api/diagnostico', ctx.principal(), {'json': {'respostas': ctx.respostas()}}
+
+def cadastrar(ctx):
+    n = ctx.proximo()
+    return 'POST', '/api/cadastrar', None, {
+        'json': {'nome': f'Novo {n}', 'email': f'novo{n}-{time.time_ns()}@exemplo.com',
+                 'senha': 'senha123', 'idade': 30}}
+
+def entrar(ctx):
+    usuario_id = ctx.principal()
+    return 'POST', '/api/login', None, {
+        'json': {'email': f'usuario{usuario_id}@exemplo.com', 'senha': f'senha{usuario_id}'}}
+
+def registrar_criado(lista, chave):
+    """Guarda o id devolvido pela criação para o cenário de exclusão correspondente"""
+    def registrar(ctx, responsavel, corpo):
+        lista(ctx).append(corpo[chave] if responsavel is None else (responsavel, corpo[chave]))
+    return registrar
+
+# (nome, preparar, registrar) na ordem de execução: cada exclusão roda depois da criação que a alimenta
+CENARIOS = [
+    ('avaliacao-geral/dados', sem_sessao('GET', '/api/avaliacao-geral/dados'), None),
+    ('avaliacao-geral/detalhes', com_sessao('GET', '/api/avaliacao-geral/detalhes?limite=50'), None),
+    ('dashboard-data', com_sessao('GET', '/api/dashboard-data'), None),
+    ('historico', com_sessao('GET', '/api/historico?agrupar=semana&pontos=60'), None),
+    ('familia', com_sessao('GET', '/api/familia'), None),
+    ('solucoes', sem_sessao('GET', '/api/solucoes/Moderado'), None),
+    ('plano-acao GET', com_sessao('GET', '/api/plano-acao'), None),
+    ('plano-acao POST', salvar_plano, None),
+    ('instituicoes', sem_sessao('GET', '/api/instituicoes'), None),
+    ('instituicoes/cadastrar', cadastrar_instituicao,
+     registrar_criado(lambda ctx: ctx.instituicoes_criadas, 'instituicao_id')),
+    ('instituicoes DELETE', excluir_instituicao, None),
+    ('profissionais', sem_sessao('GET', '/api/profissionais'), None),
+    ('profissionais/cadastrar', cadastrar_profissional,
+     registrar_criado(lambda ctx: ctx.profissionais_criados, 'profissional_id')),
+    ('profissionais DELETE', excluir_profissional, None),
+    ('instituicoes-com-profissionais', listar_por_pagina, None),
+    ('importacao', importar_profissionais, None),
+    ('familia/membros POST', adicionar_membro, registrar_criado(lambda ctx: ctx.membros_criados, 'membro_id')),
+    ('familia/membros DELETE', excluir_membro, None),
+    ('familia/membros/diagnostico', diagnosticar_membro, None),
+    ('familia/diagnosticos', diagnosticar_familia, None),
+    ('reflexoes GET', com_sessao('GET', '/api/reflexoes'), None),
+    ('reflexoes POST', salvar_reflexoes, None),
+    ('reflexoes/versoes', com_sessao('GET', '/api/reflexoes/versoes'), None),
+    ('dica-do-dia', com_sessao('GET', '/api/dica-do-dia'), None),
+    ('perguntas', sem_sessao('GET', '/api/perguntas'), None),
+    ('diagnostico', diagnosticar, None),
+    ('cadastrar', cadastrar, None),
+    ('login', entrar, None),
+    ('check-auth', com_sessao('GET', '/api/check-auth'), None),
+]
+
+# Exclusões consomem o que a criação correspondente registrou
+DEPENDENCIAS = {
+    'instituicoes DELETE': 'instituicoes/cadastrar',
+    'profissionais DELETE': 'profissionais/cadastrar',
+    'familia/membros DELETE': 'familia/membros POST',
+}
+
+# ========== EXECUÇÃO ==========
+
+def executar_cenario(cliente, ctx, preparar, registrar):
+    """Uma requisição: devolve (segundos, consultas, status)"""
+    metodo, rota, usuario_id, kwargs = preparar(ctx)
+    if usuario_id is None:
+        cliente.delete_cookie('session')
+    else:
+        cliente.set_cookie('session', ctx.cookie(usuario_id))
+    inicio = time.perf_counter()
+    resposta = cliente.open(rota, method=metodo, **kwargs)
+    duracao = time.perf_counter() - inicio
+    if registrar is not None and resposta.status_code == 200:
+        registrar(ctx, usuario_id, resposta.get_json())
+    consultas = CONSULTAS_SERVER_TIMING.search(resposta.headers.get('Server-Timing', ''))
+    return duracao, int(consultas.group(1)) if consultas else None, resposta.status_code
+
+def selecionar_cenarios(rotas):
+    """Cenários cujo nome (sem o método) está em rotas, mais as criações de que dependem"""
+    if not rotas:
+        return CENARIOS
+    nomes = {nome for nome, _, _ in CENARIOS if nome.split()[0] in rotas}
+    nomes |= {DEPENDENCIAS[nome] for nome in nomes if nome in DEPENDENCIAS}
+    return [cenario for cenario in CENARIOS if cenario[0] in nomes]
+
+def medir_escala(banco, usuarios, rotas):
+    """Subprocesso de uma escala: popula, aponta o app para o banco e mede cada cenário"""
+    inicio = time.perf_counter()
+    with BANCOS[banco](usuarios) as app:
+        carga = time.perf_counter() - inicio
+        print(f"🌱 {usuarios} usuários populados em {carga:.1f} s ({banco})", file=sys.stderr)
+
+        app.init_database()
+        cliente = app.app.test_client()
+        ctx = Contexto(app, usuarios)
+
+        resultados = {}
+        for nome, preparar, registrar in selecionar_cenarios(rotas):
+            for _ in range(AQUECIMENTO):
+                executar_cenario(cliente, ctx, preparar, registrar)
+            tempos, consultas, erros = [], [], {}
+            inicio = time.perf_counter()
+            for _ in range(REQUISICOES):
+                duracao, n, status = executar_cenario(cliente, ctx, preparar, registrar)
+                tempos.append(duracao)
+                if n is not None:
+                    consultas.append(n)
+                if status >= 400:
+                    erros[str(status)] = erros.get(str(status), 0) + 1
+            total = time.perf_counter() - inicio
+            tempos.sort()
+            resultados[nome] = {
+                'requisicoes': REQUISICOES,
+                'req_s': round(REQUISICOES / total, 1),
+                'p50_ms': round(percentil(tempos, 50) * 1000, 2),
+                'p95_ms': round(percentil(tempos, 95) * 1000, 2),
+                'p99_ms': round(percentil(tempos, 99) * 1000, 2),
+                'consultas_por_requisicao': round(sum(consultas) / len(consultas), 2) if consultas else None,
+                'erros': erros,
+            }
+            print(f"  {nome:32} {resultados[nome]['req_s']:8.1f} req/s  "
+                  f"p50 {resultados[nome]['p50_ms']:8.2f} ms  p99 {resultados[nome]['p99_ms']:8.2f} ms",
+                  file=sys.stderr)
+        return {'carga_s': round(carga, 1), 'rotas': resultados}
+
+def rodar_escala(banco, usuarios, rotas):
+    """Roda uma escala num subprocesso limpo e lê o JSON que ele grava"""
+    ambiente = dict(os.environ, BENCH_DSN=comum.DSN, LOG_NIVEL=os.environ.get('LOG_NIVEL', 'ERROR'))
+    with tempfile.TemporaryDirectory() as diretorio:
+        saida = os.path.join(diretorio, 'escala.json')
+        comando = [sys.executable, __file__, '--escala', str(usuarios), '--bancos', banco, '--saida', saida]
+        if rotas:
+            comando += ['--rotas', ','.join(rotas)]
+        subprocess.run(comando, env=ambiente, check=True, stdout=subprocess.DEVNULL)
+        with open(saida, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+def metadados():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'nucleos': os.cpu_count(),
+        'requisicoes_por_rota': REQUISICOES,
+        'aquecimento': AQUECIMENTO,
+        'diagnosticos_por_usuario': DIAGNOSTICOS_POR_USUARIO,
+        'cache_dashboard_ttl': os.environ.get('CACHE_DASHBOARD_TTL'),
+    }
+
+def comparar(atual, anterior):
+    """Variação de req/s e p99 por banco, escala e rota em relação a um resultado anterior"""
+    print(f"\n📊 Comparação com {anterior['metadados']['data']} ({anterior['metadados'].get('commit')})")
+    for banco, escalas in atual['bancos'].items():
+        for escala, medicao in escalas.items():
+            rotas_anteriores = anterior['bancos'].get(banco, {}).get(escala, {}).get('rotas', {})
+            for nome, rota in medicao['rotas'].items():
+                antes = rotas_anteriores.get(nome)
+                if not antes:
+                    continue
+                variacao_vazao = (rota['req_s'] / antes['req_s'] - 1) * 100 if antes['req_s'] else 0
+                variacao_p99 = (rota['p99_ms'] / antes['p99_ms'] - 1) * 100 if antes['p99_ms'] else 0
+                alerta = ' ⚠️' if variacao_vazao < -10 or variacao_p99 > 10 else ''
+                print(f"  {banco:8} {escala:>8} {nome:32} req/s {variacao_vazao:+7.1f}%  "
+                      f"p99 {variacao_p99:+7.1f}%{alerta}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', default='10000,100000,1000000',
+                        help='números de usuários separados por vírgula')
+    parser.add_argument('--bancos', default='postgres', help='backends separados por vírgula: postgres, sqlite')
+    parser.add_argument('--rotas', help='só estes cenários (nomes da saída, sem o método), separados por vírgula')
+    parser.add_argument('--saida', help='arquivo JSON de resultado (padrão: benchmarks/resultados/<data>.json)')
+    parser.add_argument('--comparar', help='resultado JSON anterior para comparar')
+    parser.add_argument('--escala', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    rotas = set(args.rotas.split(',')) if args.rotas else None
+    bancos = args.bancos.split(',')
+    for banco in bancos:
+        if banco not in BANCOS:
+            parser.error(f'banco desconhecido: {banco}')
+
+    if args.escala:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(medir_escala(bancos[0], args.escala, rotas), arquivo)
+        return
+
+    postgres = None
+    if 'postgres' in bancos and 'BENCH_DSN' not in os.environ:
+        postgres = PostgresTemporario()
+        comum.DSN = postgres.iniciar()
+    try:
+        resultado = {'metadados': metadados(), 'bancos': {banco: {} for banco in bancos}}
+        for usuarios in (int(escala) for escala in args.escalas.split(',')):
+            for banco in bancos:
+                print(f"🚀 Escala de {usuarios} usuários ({banco})")
+                resultado['bancos'][banco][str(usuarios)] = rodar_escala(banco, usuarios, rotas)
+    finally:
+        if postgres is not None:
+            postgres.parar()
+
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"💾 Resultado salvo em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            comparar(resultado, json.load(arquivo))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Benchmark de carga: Flask (servidor threaded) x modo ASGI (app_async + uvicorn)
+
+Sobe cada servidor num processo próprio apontado para o schema de benchmark e
+dispara CLIENTES conexões keep-alive simultâneas por DURACAO segundos contra
+/api/dashboard-data (cada cliente com a sessão de um usuário diferente, cache
+desligado) e /api/instituicoes-com-profissionais. Mede requisições por
+segundo, p50 e p99.
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_asgi.py
+"""
+import asyncio
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from comum import (apontar_app_para_bench, conectar, criar_schema, percentil, popular_instituicoes,
+                   popular_usuarios, remover_schema)
+
+USUARIOS = int(os.environ.get('BENCH_USUARIOS', 10_000))
+DIAGNOSTICOS = int(os.environ.get('BENCH_DIAGNOSTICOS', 100_000))
+CLIENTES = int(os.environ.get('BENCH_CLIENTES', 500))
+DURACAO = float(os.environ.get('BENCH_DURACAO', 15))
+PORTA = int(os.environ.get('BENCH_PORTA', 5099))
+MEMBROS_POR_FAMILIA = 4
+
+ROTAS = ('/api/dashboard-data', '/api/instituicoes-com-profissionais?limite=20&pagina=3')
+
+def servir(modo):
+    """Processo servidor: app Flask threaded ou app_async no uvicorn"""
+    os.environ['CACHE_DASHBOARD_TTL'] = '0'
+    apontar_app_para_bench()
+    if modo == 'flask':
+        import app
+        app.init_database()
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app.app.run(host='127.0.0.1', port=PORTA, threaded=True)
+    else:
+        import uvicorn
+        import app_async
+        uvicorn.run(app_async.asgi_app, host='127.0.0.1', port=PORTA, log_level='warning')
+
+def cookie_de_sessao(usuario_id):
+    """Cookie de uma sessão igual à que o login criaria, no armazém de sessões configurado"""
+    import app
+    return app.cookie_de_sessao({'usuario_id': usuario_id, 'usuario_nome': f'Usuário {usuario_id}',
+                                 'familia_id': (usuario_id - 1) // MEMBROS_POR_FAMILIA + 1})
+
+async def cliente(indice, cookie, prazo, tempos, erros):
+    leitor = escritor = None
+    while time.perf_counter() < prazo:
+        if escritor is None:
+            try:
+                leitor, escritor = await asyncio.open_connection('127.0.0.1', PORTA)
+            except OSError:
+                erros['conexao'] += 1
+                await asyncio.sleep(0.05)
+                continue
+        rota = ROTAS[indice % len(ROTAS)]
+        requisicao = (f'GET {rota} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                      f'Cookie: session={cookie}\r\n\r\n').encode()
+        inicio = time.perf_counter()
+        try:
+            escritor.write(requisicao)
+            cabecalho = await leitor.readuntil(b'\r\n\r\n')
+            linhas = cabecalho.decode('latin-1').split('\r\n')
+            status = int(linhas[0].split()[1])
+            campos = {linha.split(':', 1)[0].lower(): linha.split(':', 1)[1].strip()
+                      for linha in linhas[1:] if ':' in linha}
+            await leitor.readexactly(int(campos.get('content-length', 0)))
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            erros['conexao'] += 1
+            escritor.close()
+            leitor = escritor = None
+            continue
+        tempos.append(time.perf_counter() - inicio)
+        if status != 200:
+            erros[status] = erros.get(status, 0) + 1
+        if campos.get('connection', '').lower() == 'close':
+            escritor.close()
+            leitor = escritor = None
+    if escritor is not None:
+        escritor.close()
+
+async def carga(cookies):
+    tempos = []
+    erros = {'conexao': 0}
+    prazo = time.perf_counter() + DURACAO
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i, cookies[i], prazo, tempos, erros) for i in range(CLIENTES)))
+    return sorted(tempos), erros, time.perf_counter() - inicio
+
+def aguardar_porta(timeout=60):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection('127.0.0.1', PORTA), 1))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Servidor não respondeu na porta {PORTA}')
+
+def main():
+    # As sessões são criadas aqui e lidas pelos servidores: precisam de um armazém compartilhado
+    pasta_sessoes = tempfile.mkdtemp(prefix='bench-netendencia-sessoes-')
+    os.environ['SESSAO_ARMAZEM'] = 'sqlite'
+    os.environ['SESSAO_SQLITE'] = os.path.join(pasta_sessoes, 'sessoes.db')
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        print(f"🌱 Populando {USUARIOS} usuários e {DIAGNOSTICOS} diagnósticos...")
+        criar_schema(cursor)
+        popular_usuarios(cursor, USUARIOS, DIAGNOSTICOS)
+        popular_instituicoes(cursor, 500, 5_000)
+        cursor.execute('CREATE INDEX ON diagnosticos (usuario_id, data_diagnostico)')
+        cursor.execute('CREATE INDEX ON usuarios (familia_id)')
+        cursor.execute('CREATE INDEX ON profissionais (instituicao_id)')
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+        cookies = [cookie_de_sessao(random.randint(1, USUARIOS)) for _ in range(CLIENTES)]
+
+        for modo in ('flask', 'asgi'):
+            servidor = subprocess.Popen([sys.executable, __file__, '--servidor', modo],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                aguardar_porta()
+                tempos, erros, duracao = asyncio.run(carga(cookies))
+            finally:
+                servidor.terminate()
+                servidor.wait()
+            if not tempos:
+                print(f"{modo:6} nenhuma requisição concluída, erros {erros}")
+                continue
+            print(f"{modo:6} {CLIENTES} clientes: {len(tempos) / duracao:8.0f} req/s  "
+                  f"p50 {percentil(tempos, 50)*1000:7.1f} ms  p99 {percentil(tempos, 99)*1000:7.1f} ms  "
+                  f"erros {erros}")
+    finally:
+        remover_schema(conn)
+        conn.close()
+        shutil.rmtree(pasta_sessoes, ignore_errors=True)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--servidor':
+        servir(sys.argv[2])
+    else:
+        main()
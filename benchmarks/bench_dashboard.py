@@ -0,0 +1,105 @@
+"""Benchmark: dashboard em várias consultas sequenciais x montar_dashboard (uma consulta)
+
+Popula usuários, famílias e diagnósticos, confere que os dois caminhos geram o
+mesmo JSON e compara a latência por requisição. BENCH_LATENCIA_MS simula o
+round-trip de rede até o banco (RDS) em cada consulta; use 0 para medir só o
+PostgreSQL local.
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_dashboard.py
+"""
+import os
+import random
+import time
+
+from comum import conectar, criar_schema, medir, percentil, popular_usuarios, remover_schema
+from app import (app, criar_ultimos_diagnosticos, escolher_dica_do_dia, montar_dashboard,
+                 obter_dados_familia, ServicoDiagnostico)
+
+USUARIOS = int(os.environ.get('BENCH_USUARIOS', 10_000))
+DIAGNOSTICOS = int(os.environ.get('BENCH_DIAGNOSTICOS', 100_000))
+REPETICOES = int(os.environ.get('BENCH_REPETICOES', 500))
+LATENCIA = float(os.environ.get('BENCH_LATENCIA_MS', 1)) / 1000
+
+class CursorComLatencia:
+    """Cursor que soma LATENCIA a cada round-trip, como numa rede até o RDS"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        time.sleep(LATENCIA)
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+def dashboard_antigo(cursor, usuario_id):
+    """Sequência de consultas do api_dashboard_data anterior"""
+    cursor.execute('SELECT * FROM usuarios WHERE id = %s', (usuario_id,))
+    usuario = dict(cursor.fetchone())
+    cursor.execute('''
+        SELECT * FROM diagnosticos WHERE usuario_id = %s
+        ORDER BY data_diagnostico DESC LIMIT 1
+    ''', (usuario_id,))
+    resultado = cursor.fetchone()
+    ultimo_diagnostico = dict(resultado) if resultado else None
+    cursor.execute('''
+        SELECT pontuacao, nivel, data_diagnostico FROM diagnosticos
+        WHERE usuario_id = %s ORDER BY data_diagnostico
+    ''', (usuario_id,))
+    historico = [dict(item) for item in cursor.fetchall()]
+    familia_data = obter_dados_familia(cursor, usuario.get('familia_id'))
+    cursor.execute('''
+        SELECT nivel FROM diagnosticos WHERE usuario_id = %s
+        ORDER BY data_diagnostico DESC LIMIT 1
+    ''', (usuario_id,))
+    resultado = cursor.fetchone()
+    dica_do_dia = escolher_dica_do_dia(resultado['nivel'] if resultado and resultado.get('nivel') else 'Moderado')
+    precisa_reavaliar = False
+    if ultimo_diagnostico:
+        precisa_reavaliar = ServicoDiagnostico.verificar_reavaliacao_necesaria(ultimo_diagnostico)
+    return {
+        'success': True,
+        'usuario': usuario,
+        'ultimo_diagnostico': ultimo_diagnostico,
+        'historico': historico,
+        'familia_data': familia_data,
+        'dica_do_dia': dica_do_dia,
+        'precisa_reavaliar': precisa_reavaliar
+    }
+
+def main():
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        print(f"🌱 Populando {USUARIOS} usuários e {DIAGNOSTICOS} diagnósticos...")
+        criar_schema(cursor)
+        popular_usuarios(cursor, USUARIOS, DIAGNOSTICOS)
+        cursor.execute('CREATE INDEX ON diagnosticos (usuario_id, data_diagnostico DESC)')
+        cursor.execute('CREATE INDEX ON usuarios (familia_id)')
+        criar_ultimos_diagnosticos(cursor)
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+        sorteio = random.Random(42)
+        amostra = [sorteio.randint(1, USUARIOS) for _ in range(50)]
+        with app.app_context():
+            for usuario_id in amostra:
+                antigo = app.json.dumps(dashboard_antigo(cursor, usuario_id))
+                novo = app.json.dumps(montar_dashboard(cursor, usuario_id))
+                assert antigo == novo, f'JSON diferente para o usuário {usuario_id}'
+        print(f"✅ JSON idêntico nos {len(amostra)} usuários conferidos")
+
+        cursor_rede = CursorComLatencia(cursor) if LATENCIA else cursor
+        print(f"Latência simulada por consulta: {LATENCIA*1000:.1f} ms")
+        for nome, funcao in (('Consultas sequenciais', dashboard_antigo), ('montar_dashboard', montar_dashboard)):
+            tempos = medir(lambda: funcao(cursor_rede, sorteio.randint(1, USUARIOS)), REPETICOES)
+            print(f"{nome:22} p50 {percentil(tempos, 50)*1000:.2f} ms  p95 {percentil(tempos, 95)*1000:.2f} ms  "
+                  f"p99 {percentil(tempos, 99)*1000:.2f} ms")
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
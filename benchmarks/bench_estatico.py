@@ -0,0 +1,135 @@
+"""Benchmark do servidor estático: Main.py novo x o handler antigo (SimpleHTTPRequestHandler)
+
+Sobe cada servidor num processo próprio servindo a raiz do projeto e dispara
+CLIENTES conexões simultâneas por DURACAO segundos, alternando entre as páginas
+e o CSS, com Accept-Encoding de navegador (gzip, deflate, br). Mede
+requisições por segundo, p50, p99 e bytes transferidos por requisição. O
+handler antigo fecha a conexão a cada resposta (HTTP/1.0); o cliente reconecta
+sem contar isso como erro.
+
+Uso:
+    python benchmarks/bench_estatico.py
+"""
+import asyncio
+import http.server
+import os
+import socketserver
+import subprocess
+import sys
+import time
+
+from comum import percentil
+
+CLIENTES = int(os.environ.get('BENCH_CLIENTES', 50))
+DURACAO = float(os.environ.get('BENCH_DURACAO', 10))
+PORTA = int(os.environ.get('BENCH_PORTA', 5098))
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROTAS = ('/', '/landing.html', '/avaliacao-geral.html', '/style.css')
+
+class ManipuladorLegado(http.server.SimpleHTTPRequestHandler):
+    """O handler do Main.py original: reescreve o caminho para o nome do arquivo"""
+
+    def do_GET(self):
+        if self.path != '/':
+            self.path = '/' + self.path.split('/')[-1]
+        return http.server.SimpleHTTPRequestHandler.do_GET(self)
+
+    def log_message(self, formato, *args):
+        pass
+
+def servir(modo):
+    os.chdir(RAIZ)
+    if modo == 'legado':
+        socketserver.TCPServer.allow_reuse_address = True
+        with socketserver.TCPServer(('127.0.0.1', PORTA), ManipuladorLegado) as httpd:
+            httpd.serve_forever()
+    else:
+        sys.path.insert(0, RAIZ)
+        import Main
+        with Main.ServidorEstatico(('127.0.0.1', PORTA), RAIZ) as httpd:
+            httpd.serve_forever()
+
+async def cliente(indice, prazo, tempos, bytes_recebidos, erros):
+    leitor = escritor = None
+    rodada = indice
+    while time.perf_counter() < prazo:
+        if escritor is None:
+            try:
+                leitor, escritor = await asyncio.open_connection('127.0.0.1', PORTA)
+            except OSError:
+                erros['conexao'] += 1
+                await asyncio.sleep(0.05)
+                continue
+        rota = ROTAS[rodada % len(ROTAS)]
+        rodada += 1
+        requisicao = (f'GET {rota} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                      f'Accept-Encoding: gzip, deflate, br\r\n\r\n').encode()
+        inicio = time.perf_counter()
+        try:
+            escritor.write(requisicao)
+            cabecalho = await leitor.readuntil(b'\r\n\r\n')
+            linhas = cabecalho.decode('latin-1').split('\r\n')
+            versao, status = linhas[0].split()[:2]
+            campos = {linha.split(':', 1)[0].lower(): linha.split(':', 1)[1].strip()
+                      for linha in linhas[1:] if ':' in linha}
+            if 'content-length' in campos:
+                corpo = await leitor.readexactly(int(campos['content-length']))
+            else:
+                corpo = await leitor.read()
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            erros['conexao'] += 1
+            escritor.close()
+            leitor = escritor = None
+            continue
+        tempos.append(time.perf_counter() - inicio)
+        bytes_recebidos.append(len(cabecalho) + len(corpo))
+        if status != '200':
+            erros[status] = erros.get(status, 0) + 1
+        if versao == 'HTTP/1.0' or campos.get('connection', '').lower() == 'close':
+            escritor.close()
+            leitor = escritor = None
+    if escritor is not None:
+        escritor.close()
+
+async def carga():
+    tempos = []
+    bytes_recebidos = []
+    erros = {'conexao': 0}
+    prazo = time.perf_counter() + DURACAO
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i, prazo, tempos, bytes_recebidos, erros) for i in range(CLIENTES)))
+    return sorted(tempos), bytes_recebidos, erros, time.perf_counter() - inicio
+
+def aguardar_porta(timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection('127.0.0.1', PORTA), 1))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Servidor não respondeu na porta {PORTA}')
+
+def main():
+    for modo in ('legado', 'novo'):
+        servidor = subprocess.Popen([sys.executable, __file__, '--servidor', modo],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            aguardar_porta()
+            tempos, bytes_recebidos, erros, duracao = asyncio.run(carga())
+        finally:
+            servidor.terminate()
+            servidor.wait()
+        if not tempos:
+            print(f"{modo:7} nenhuma requisição concluída, erros {erros}")
+            continue
+        print(f"{modo:7} {CLIENTES} clientes: {len(tempos) / duracao:8.0f} req/s  "
+              f"p50 {percentil(tempos, 50)*1000:7.1f} ms  p99 {percentil(tempos, 99)*1000:7.1f} ms  "
+              f"{sum(bytes_recebidos) / len(bytes_recebidos) / 1024:6.1f} KiB/req  erros {erros}")
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--servidor':
+        servir(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,59 @@
+"""Benchmark: cadastro de profissionais linha a linha x /api/importacao/profissionais
+
+Mede a vazão (linhas/s) da rota /api/profissionais/cadastrar chamada uma vez
+por profissional e da importação em lote de um NDJSON, ambas pelo cliente de
+teste do Flask contra um PostgreSQL local.
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_importacao.py
+"""
+import json
+import os
+import time
+
+from comum import apontar_app_para_bench, conectar, criar_schema, remover_schema
+
+POR_LINHA = int(os.environ.get('BENCH_POR_LINHA', 2_000))
+EM_LOTE = int(os.environ.get('BENCH_EM_LOTE', 50_000))
+
+def profissional(indice):
+    return {
+        'nome': f'Profissional {indice}',
+        'profissao': 'Psicólogo(a)',
+        'especialidade': 'Dependência digital',
+        'telefone': f'(11) 9999-{indice}',
+        'email': f'prof{indice}@exemplo.com',
+        'registro_profissional': f'CRP {indice}',
+        'abordagem': 'TCC',
+        'descricao': 'Atendimento'
+    }
+
+def main():
+    conn = conectar()
+    try:
+        criar_schema(conn.cursor())
+        conn.commit()
+        app = apontar_app_para_bench()
+        cliente = app.app.test_client()
+
+        inicio = time.perf_counter()
+        for indice in range(POR_LINHA):
+            resposta = cliente.post('/api/profissionais/cadastrar', json=profissional(indice))
+            assert resposta.json['success']
+        por_linha = POR_LINHA / (time.perf_counter() - inicio)
+
+        corpo = '\n'.join(json.dumps(profissional(POR_LINHA + indice)) for indice in range(EM_LOTE))
+        inicio = time.perf_counter()
+        resposta = cliente.post('/api/importacao/profissionais', data=corpo, content_type='application/x-ndjson')
+        em_lote = EM_LOTE / (time.perf_counter() - inicio)
+        assert resposta.json['inseridos'] == EM_LOTE, resposta.json
+
+        print(f"Linha a linha ({POR_LINHA} chamadas): {por_linha:10.0f} linhas/s")
+        print(f"Importação em lote ({EM_LOTE} linhas): {em_lote:10.0f} linhas/s")
+        print(f"Ganho: {em_lote / por_linha:.0f}x")
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
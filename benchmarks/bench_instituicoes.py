@@ -0,0 +1,59 @@
+"""Benchmark: N+1 de /api/instituicoes-com-profissionais x consulta em lote (ANY)
+
+Popula 5 mil instituições e 50 mil profissionais e compara a montagem antiga
+(uma consulta de profissionais por instituição) com
+listar_instituicoes_com_profissionais, com e sem paginação.
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_instituicoes.py
+"""
+import os
+
+from comum import conectar, criar_schema, medir, percentil, popular_instituicoes, remover_schema
+from app import listar_instituicoes_com_profissionais
+
+INSTITUICOES = int(os.environ.get('BENCH_INSTITUICOES', 5_000))
+PROFISSIONAIS = int(os.environ.get('BENCH_PROFISSIONAIS', 50_000))
+REPETICOES = int(os.environ.get('BENCH_REPETICOES', 5))
+
+def montagem_antiga(cursor):
+    cursor.execute('SELECT * FROM instituicoes ORDER BY nome')
+    resultado = []
+    for instituicao in cursor.fetchall():
+        instituicao_dict = dict(instituicao)
+        cursor.execute('SELECT * FROM profissionais WHERE instituicao_id = %s ORDER BY nome',
+                       (instituicao['id'],))
+        instituicao_dict['profissionais'] = [dict(prof) for prof in cursor.fetchall()]
+        resultado.append(instituicao_dict)
+    return resultado
+
+def main():
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        print(f"🌱 Populando {INSTITUICOES} instituições e {PROFISSIONAIS} profissionais...")
+        criar_schema(cursor)
+        popular_instituicoes(cursor, INSTITUICOES, PROFISSIONAIS)
+        cursor.execute('CREATE INDEX ON profissionais (instituicao_id)')
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+        antigo = montagem_antiga(cursor)
+        novo, _ = listar_instituicoes_com_profissionais(cursor)
+        assert [i['id'] for i in antigo] == [i['id'] for i in novo]
+        assert sum(len(i['profissionais']) for i in antigo) == sum(len(i['profissionais']) for i in novo)
+
+        casos = (
+            (f'N+1 ({INSTITUICOES + 1} consultas)', lambda: montagem_antiga(cursor)),
+            ('Lote ANY (2 consultas)', lambda: listar_instituicoes_com_profissionais(cursor)),
+            ('Lote ANY, página de 50', lambda: listar_instituicoes_com_profissionais(cursor, limite=50, pagina=10)),
+        )
+        for nome, funcao in casos:
+            tempos = medir(funcao, REPETICOES)
+            print(f"{nome:28} p50 {percentil(tempos, 50)*1000:8.1f} ms  p95 {percentil(tempos, 95)*1000:8.1f} ms")
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Benchmark de login em rajada: hash de senha (scrypt) no pool de credenciais
+
+Sobe o app Flask (servidor threaded) num processo próprio, apontado para o
+schema de benchmark, com senhas ainda em texto puro, e dispara LOGINS logins
+de usuários distintos com CLIENTES conexões simultâneas, duas vezes:
+
+- migração: primeiro login de cada usuário (confere o texto puro, gera o
+  hash e grava no lugar);
+- hash: os mesmos usuários de novo (só a verificação do scrypt).
+
+Repete para cada tamanho de pool em --trabalhadores (0 = hash na própria
+thread da requisição, o modo sem pool) e mede logins aceitos por segundo,
+p50 e p99 deles e as respostas 503 (fila de hashes cheia). SENHA_CUSTO e
+SENHA_FILA_MAX do ambiente valem para o servidor.
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --trabalhadores 0,1,2,4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from comum import apontar_app_para_bench, conectar, criar_schema, percentil, popular_usuarios, remover_schema
+
+USUARIOS = int(os.environ.get('BENCH_USUARIOS', 4_000))
+LOGINS = int(os.environ.get('BENCH_LOGINS', 500))
+CLIENTES = int(os.environ.get('BENCH_CLIENTES', 50))
+PORTA = int(os.environ.get('BENCH_PORTA', 5097))
+MEMBROS_POR_FAMILIA = 4
+
+def servir():
+    apontar_app_para_bench()
+    import app
+    app.init_database()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.app.run(host='127.0.0.1', port=PORTA, threaded=True)
+
+async def cliente(fila, tempos, erros):
+    leitor = escritor = None
+    while fila:
+        usuario_id = fila.pop()
+        if escritor is None:
+            try:
+                leitor, escritor = await asyncio.open_connection('127.0.0.1', PORTA)
+            except OSError:
+                erros['conexao'] += 1
+                await asyncio.sleep(0.05)
+                continue
+        corpo = json.dumps({'email': f'usuario{usuario_id}@exemplo.com',
+                            'senha': f'senha{usuario_id}'}).encode()
+        requisicao = (f'POST /api/login HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                      f'Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n\r\n').encode() + corpo
+        inicio = time.perf_counter()
+        try:
+            escritor.write(requisicao)
+            cabecalho = await leitor.readuntil(b'\r\n\r\n')
+            linhas = cabecalho.decode('latin-1').split('\r\n')
+            versao, status = linhas[0].split()[:2]
+            campos = {linha.split(':', 1)[0].lower(): linha.split(':', 1)[1].strip()
+                      for linha in linhas[1:] if ':' in linha}
+            if 'content-length' in campos:
+                resposta = await leitor.readexactly(int(campos['content-length']))
+            else:
+                resposta = await leitor.read()
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            erros['conexao'] += 1
+            escritor.close()
+            leitor = escritor = None
+            continue
+        if status != '200':
+            erros[status] = erros.get(status, 0) + 1
+        elif not json.loads(resposta).get('success'):
+            erros['recusado'] = erros.get('recusado', 0) + 1
+        else:
+            tempos.append(time.perf_counter() - inicio)
+        if versao == 'HTTP/1.0' or campos.get('connection', '').lower() == 'close':
+            escritor.close()
+            leitor = escritor = None
+    if escritor is not None:
+        escritor.close()
+
+async def rajada(usuarios):
+    fila = list(usuarios)
+    tempos = []
+    erros = {'conexao': 0}
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(fila, tempos, erros) for _ in range(CLIENTES)))
+    return sorted(tempos), erros, time.perf_counter() - inicio
+
+def aguardar_porta(timeout=60):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection('127.0.0.1', PORTA), 1))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Servidor não respondeu na porta {PORTA}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trabalhadores', default=f'0,{os.cpu_count() or 1}',
+                        help='tamanhos do pool de credenciais, separados por vírgula (0 = sem pool)')
+    args = parser.parse_args()
+
+    # Só os responsáveis (um por família) têm email e senha
+    usuarios = list(range(1, USUARIOS + 1, MEMBROS_POR_FAMILIA))[:LOGINS]
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        print(f"🌱 Populando {USUARIOS} usuários...")
+        criar_schema(cursor)
+        popular_usuarios(cursor, USUARIOS, 0, MEMBROS_POR_FAMILIA)
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+        print(f"{len(usuarios)} logins por rajada, {CLIENTES} clientes, "
+              f"custo 2^{os.environ.get('SENHA_CUSTO', 14)}")
+        for trabalhadores in [int(t) for t in args.trabalhadores.split(',')]:
+            # Cada rodada começa com as senhas em texto puro de novo
+            cursor.execute("UPDATE usuarios SET senha = 'senha' || id WHERE senha IS NOT NULL")
+            conn.commit()
+            ambiente = dict(os.environ, SENHA_TRABALHADORES=str(trabalhadores))
+            servidor = subprocess.Popen([sys.executable, __file__, '--servidor'], env=ambiente,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                aguardar_porta()
+                for fase in ('migração', 'hash'):
+                    tempos, erros, duracao = asyncio.run(rajada(usuarios))
+                    rotulo = f"pool {trabalhadores}" if trabalhadores else 'sem pool'
+                    if not tempos:
+                        print(f"{rotulo:9} {fase:9}: nenhum login aceito, erros {erros}")
+                        continue
+                    print(f"{rotulo:9} {fase:9}: {len(tempos) / duracao:7.1f} logins/s  "
+                          f"p50 {percentil(tempos, 50)*1000:7.1f} ms  p99 {percentil(tempos, 99)*1000:7.1f} ms  "
+                          f"erros {erros}")
+            finally:
+                servidor.terminate()
+                servidor.wait()
+
+        cursor.execute("SELECT count(*) AS migradas FROM usuarios WHERE senha LIKE 'scrypt$%%'")
+        print(f"Senhas com hash ao final: {cursor.fetchone()['migradas']}")
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--servidor']:
+        servir()
+    else:
+        main()
@@ -0,0 +1,68 @@
+"""Benchmark: subconsultas correlacionadas x tabela ultimos_diagnosticos
+
+Popula 100 mil usuários e 1 milhão de diagnósticos e compara a consulta antiga
+da avaliação geral com a nova (LEFT JOIN em ultimos_diagnosticos).
+
+Uso:
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python benchmarks/bench_ultimo_diagnostico.py
+"""
+import os
+
+from comum import conectar, criar_schema, medir, popular_usuarios, remover_schema
+from app import criar_ultimos_diagnosticos
+
+USUARIOS = int(os.environ.get('BENCH_USUARIOS', 100_000))
+DIAGNOSTICOS = int(os.environ.get('BENCH_DIAGNOSTICOS', 1_000_000))
+REPETICOES = int(os.environ.get('BENCH_REPETICOES', 5))
+
+CONSULTA_ANTIGA = '''
+    SELECT u.id, u.nome, u.relacionamento, u.familia_id,
+        (SELECT pontuacao FROM diagnosticos WHERE usuario_id = u.id
+         ORDER BY data_diagnostico DESC LIMIT 1) as pontuacao,
+        (SELECT nivel FROM diagnosticos WHERE usuario_id = u.id
+         ORDER BY data_diagnostico DESC LIMIT 1) as nivel,
+        (SELECT data_diagnostico FROM diagnosticos WHERE usuario_id = u.id
+         ORDER BY data_diagnostico DESC LIMIT 1) as data_diagnostico
+    FROM usuarios u
+    ORDER BY u.familia_id, u.nome
+'''
+
+CONSULTA_NOVA = '''
+    SELECT u.id, u.nome, u.relacionamento, u.familia_id,
+           ud.pontuacao, ud.nivel, ud.data_diagnostico
+    FROM usuarios u
+    LEFT JOIN ultimos_diagnosticos ud ON ud.usuario_id = u.id
+    ORDER BY u.familia_id, u.nome
+'''
+
+def main():
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        print(f"🌱 Populando {USUARIOS} usuários e {DIAGNOSTICOS} diagnósticos...")
+        criar_schema(cursor)
+        popular_usuarios(cursor, USUARIOS, DIAGNOSTICOS)
+        # Índice usado pelas subconsultas antigas, para uma comparação justa
+        cursor.execute('CREATE INDEX ON diagnosticos (usuario_id, data_diagnostico DESC)')
+        criar_ultimos_diagnosticos(cursor)
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+        def executar(consulta):
+            cursor.execute(consulta)
+            cursor.fetchall()
+
+        antiga = medir(lambda: executar(CONSULTA_ANTIGA), REPETICOES)
+        nova = medir(lambda: executar(CONSULTA_NOVA), REPETICOES)
+        mediana_antiga = antiga[len(antiga) // 2]
+        mediana_nova = nova[len(nova) // 2]
+
+        print(f"Subconsultas correlacionadas: min {antiga[0]*1000:.1f} ms, mediana {mediana_antiga*1000:.1f} ms")
+        print(f"ultimos_diagnosticos:         min {nova[0]*1000:.1f} ms, mediana {mediana_nova*1000:.1f} ms")
+        print(f"Ganho (mediana): {mediana_antiga / mediana_nova:.1f}x")
+    finally:
+        remover_schema(conn)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Utilitários compartilhados pelos benchmarks: conexão, schema temporário e carga de dados
+
+Todos os benchmarks rodam num schema próprio (bench_netendencia) de um
+PostgreSQL local, indicado por BENCH_DSN, e removem o schema ao final.
+"""
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = os.environ.get('BENCH_DSN', 'dbname=postgres user=postgres host=localhost')
+SCHEMA = 'bench_netendencia'
+
+TABELAS = '''
+    CREATE TABLE familias (
+        id SERIAL PRIMARY KEY,
+        nome TEXT NOT NULL,
+        codigo_familia TEXT UNIQUE
+    );
+    CREATE TABLE usuarios (
+        id SERIAL PRIMARY KEY,
+        nome TEXT NOT NULL,
+        idade INTEGER,
+        familia_id INTEGER REFERENCES familias (id),
+        email TEXT UNIQUE,
+        senha TEXT,
+        relacionamento TEXT,
+        plano_acao TEXT,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE perguntas (
+        id SERIAL PRIMARY KEY,
+        texto TEXT NOT NULL,
+        categoria TEXT
+    );
+    CREATE TABLE opcoes_resposta (
+        id SERIAL PRIMARY KEY,
+        pergunta_id INTEGER REFERENCES perguntas (id),
+        texto TEXT NOT NULL,
+        pontuacao INTEGER
+    );
+    CREATE TABLE diagnosticos (
+        id SERIAL PRIMARY KEY,
+        usuario_id INTEGER,
+        pontuacao INTEGER,
+        nivel TEXT,
+        data_diagnostico TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        respostas TEXT
+    );
+    CREATE TABLE reflexoes (
+        id SERIAL PRIMARY KEY,
+        usuario_id INTEGER,
+        pergunta TEXT,
+        resposta TEXT,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE instituicoes (
+        id SERIAL PRIMARY KEY,
+        nome TEXT NOT NULL,
+        tipo TEXT,
+        endereco TEXT,
+        telefone TEXT,
+        email TEXT,
+        descricao TEXT,
+        especialidades TEXT,
+        data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE profissionais (
+        id SERIAL PRIMARY KEY,
+        nome TEXT NOT NULL,
+        profissao TEXT,
+        especialidade TEXT,
+        telefone TEXT,
+        email TEXT,
+        instituicao_id INTEGER,
+        registro_profissional TEXT,
+        abordagem TEXT,
+        descricao TEXT,
+        data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+def conectar():
+    conn = psycopg2.connect(DSN)
+    conn.cursor_factory = RealDictCursor
+    return conn
+
+def criar_schema(cursor):
+    cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+    usar_schema(cursor)
+    cursor.execute(TABELAS)
+
+def usar_schema(cursor):
+    cursor.execute(f'SET search_path TO {SCHEMA}')
+
+def remover_schema(conn):
+    conn.rollback()
+    conn.cursor().execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    conn.commit()
+
+def popular_usuarios(cursor, usuarios, diagnosticos, membros_por_familia=4):
+    """Famílias de membros_por_familia usuários e diagnósticos distribuídos entre eles"""
+    familias = (usuarios + membros_por_familia - 1) // membros_por_familia
+    cursor.execute('''
+        INSERT INTO familias (nome, codigo_familia)
+        SELECT 'Família ' || g, 'FAM' || g FROM generate_series(1, %s) g
+    ''', (familias,))
+    cursor.execute('''
+        INSERT INTO usuarios (nome, idade, familia_id, email, senha, relacionamento)
+        SELECT 'Usuário ' || g, 10 + g %% 60, (g - 1) / %s + 1,
+               CASE WHEN (g - 1) %% %s = 0 THEN 'usuario' || g || '@exemplo.com' END,
+               CASE WHEN (g - 1) %% %s = 0 THEN 'senha' || g END,
+               CASE WHEN (g - 1) %% %s = 0 THEN NULL ELSE 'Filho(a)' END
+        FROM generate_series(1, %s) g
+    ''', (membros_por_familia, membros_por_familia, membros_por_familia, membros_por_familia, usuarios))
+    cursor.execute('''
+        INSERT INTO diagnosticos (usuario_id, pontuacao, nivel, data_diagnostico, respostas)
+        SELECT 1 + (g %% %s), p,
+               CASE WHEN p <= 15 THEN 'Não dependente' WHEN p <= 25 THEN 'Moderado' ELSE 'Dependente' END,
+               now() - (g || ' minutes')::interval,
+               '[]'
+        FROM (SELECT g, (g * 7) %% 40 AS p FROM generate_series(1, %s) g) s
+    ''', (usuarios, diagnosticos))
+
+def medir(funcao, repeticoes):
+    """Executa funcao repeticoes vezes e devolve os tempos em segundos, ordenados"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return sorted(tempos)
+
+def percentil(tempos_ordenados, p):
+    indice = min(len(tempos_ordenados) - 1, int(round(p / 100 * (len(tempos_ordenados) - 1))))
+    return tempos_ordenados[indice]
+
+ESPECIALIDADES = ('Psicologia', 'Psiquiatria', 'Terapia familiar', 'Dependência digital', 'Neuropsicologia')
+TIPOS_INSTITUICAO = ('Clínica', 'Hospital', 'ONG', 'CAPS', 'Consultório')
+
+def popular_instituicoes(cursor, instituicoes, profissionais):
+    cursor.execute('''
+        INSERT INTO instituicoes (nome, tipo, endereco, telefone, email, descricao, especialidades)
+        SELECT 'Instituição ' || g, (%s::text[])[1 + g %% 5], 'Rua ' || g, '(11) 9999-' || g,
+               'inst' || g || '@exemplo.com', 'Descrição da instituição ' || g, 'Saúde mental'
+        FROM generate_series(1, %s) g
+    ''', (list(TIPOS_INSTITUICAO), instituicoes))
+    cursor.execute('''
+        INSERT INTO profissionais (nome, profissao, especialidade, telefone, email, instituicao_id,
+                                   registro_profissional, abordagem, descricao)
+        SELECT 'Profissional ' || g, 'Psicólogo(a)', (%s::text[])[1 + g %% 5], '(11) 8888-' || g,
+               'prof' || g || '@exemplo.com', 1 + g %% %s, 'CRP ' || g, 'TCC', 'Atendimento ' || g
+        FROM generate_series(1, %s) g
+    ''', (list(ESPECIALIDADES), instituicoes, profissionais))
+
+def apontar_app_para_bench():
+    """Faz o pool do app usar o banco de benchmark, no schema temporário"""
+    import app
+    app.db_pool.fechar()
+    app.db_pool.backend = app.BackendPostgres()
+    app.db_pool.db_config = {'dsn': DSN, 'options': f'-c search_path={SCHEMA}'}
+    return app
+
+def apontar_app_para_sqlite(caminho):
+    """Faz o pool do app usar um arquivo SQLite (backend embutido)"""
+    import app
+    app.db_pool.fechar()
+    app.db_pool.backend = app.BackendSQLite(**app.SQLITE_CONFIG)
+    app.db_pool.db_config = {'database': caminho}
+    return app
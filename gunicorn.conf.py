@@ -0,0 +1,84 @@
+"""Configuração do gunicorn para produção (usada por `flask --app app servir`)
+
+Também funciona direto: gunicorn -c gunicorn.conf.py app:app
+(ou, no modo assíncrono, WEB_ASGI=1 gunicorn -c gunicorn.conf.py app_async:asgi_app).
+
+- Cada worker importa o app depois do fork (sem preload): tem seu próprio pool
+  de conexões, e kill -HUP no mestre recarrega o código de forma graciosa.
+- O esquema é preparado uma única vez, no mestre, por um processo à parte.
+- Com mais de um worker, caches e agregados em memória são sincronizados
+  pelo canal LISTEN/NOTIFY (EventosEntreProcessos em app.py), e as métricas
+  de cada worker são gravadas em METRICAS_DIR para o /metrics somar (o arquivo
+  de um worker que sai é removido pelo mestre).
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+
+asgi = os.environ.get('WEB_ASGI') == '1'
+nucleos = multiprocessing.cpu_count()
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', nucleos if asgi else 2 * nucleos + 1))
+worker_class = 'uvicorn.workers.UvicornWorker' if asgi else 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+backlog = int(os.environ.get('WEB_BACKLOG', 2048))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', max_requests // 10))
+accesslog = os.environ.get('WEB_ACCESS_LOG')
+preload_app = False
+
+# Pool por worker: sem DB_POOL_MAX explícito, no máximo uma conexão por thread
+if not asgi:
+    os.environ.setdefault('DB_POOL_MIN', '1')
+    os.environ.setdefault('DB_POOL_MAX', str(threads))
+# Hashes de senha (scrypt) simultâneos: os núcleos divididos entre os workers
+os.environ.setdefault('SENHA_TRABALHADORES', str(max(1, nucleos // workers)))
+if workers > 1:
+    os.environ.setdefault('NETENDENCIA_EVENTOS_ENTRE_PROCESSOS', '1')
+    # Sessões no arquivo SQLite compartilhado: o LRU em memória seria um por worker
+    os.environ.setdefault('SESSAO_ARMAZEM', 'sqlite')
+    # /metrics soma o estado gravado por todos os workers
+    os.environ.setdefault('METRICAS_DIR', tempfile.mkdtemp(prefix='netendencia-metricas-'))
+os.environ['NETENDENCIA_ESQUEMA_PRONTO'] = '1'
+
+def preparar_esquema(server):
+    # Processo à parte: o mestre não importa o app, senão o HUP não recarregaria o código
+    resultado = subprocess.run([sys.executable, '-c', 'import app; app.preparar_esquema()'],
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if resultado.returncode != 0:
+        server.log.error('Falha ao preparar o esquema do banco')
+
+def on_starting(server):
+    preparar_esquema(server)
+
+def on_reload(server):
+    preparar_esquema(server)
+
+def post_worker_init(worker):
+    # Workers WSGI iniciam o estado do processo aqui; os ASGI, no lifespan do app_async
+    if not asgi:
+        import app
+        app.init_database()
+
+def worker_exit(server, worker):
+    app = sys.modules.get('app')
+    if app is not None:
+        app.db_pool.fechar()
+
+def child_exit(server, worker):
+    # No mestre, também quando o worker morre sem sair direito: o estado gravado por
+    # ele deixaria de crescer, mas continuaria somado no /metrics para sempre
+    diretorio = os.environ.get('METRICAS_DIR')
+    if not diretorio:
+        return
+    for nome in (f'{worker.pid}.json', f'{worker.pid}.json.tmp'):
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,47 @@
+"""As consultas quentes usam índice depois das migrações (app.consultas_quentes)
+
+Sempre roda num SQLite temporário; no PostgreSQL só com BENCH_DSN definido,
+no schema temporário dos benchmarks (removido ao final).
+
+Uso:
+    python -m pytest -q tests
+    BENCH_DSN="dbname=bench user=postgres host=localhost" python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import app
+import comum
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def conexao(request, tmp_path):
+    if request.param == 'sqlite':
+        comum.apontar_app_para_sqlite(str(tmp_path / 'planos.db'))
+    else:
+        if not os.environ.get('BENCH_DSN'):
+            pytest.skip('BENCH_DSN não definido')
+        admin = comum.conectar()
+        comum.criar_schema(admin.cursor())
+        admin.commit()
+        request.addfinalizer(lambda: (comum.remover_schema(admin), admin.close()))
+        comum.apontar_app_para_bench()
+    request.addfinalizer(app.db_pool.fechar)
+
+    with app.get_db_connection() as conn:
+        app.aplicar_migracoes(conn)
+        yield conn
+
+def test_migracoes_idempotentes(conexao):
+    versao = app.aplicar_migracoes(conexao)
+    assert versao == app.aplicar_migracoes(conexao)
+
+@pytest.mark.parametrize('nome', [consulta[0] for consulta in app.consultas_quentes()])
+def test_consulta_quente_usa_indice(conexao, nome):
+    planos = {plano['consulta']: plano for plano in app.verificar_planos(conexao)}
+    assert planos[nome]['usa_indice'], f"{nome} varre {', '.join(planos[nome]['varreduras'])} sem índice"
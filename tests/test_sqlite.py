@@ -0,0 +1,107 @@
+"""Camada de dialeto do SQLite: tradução do SQL no estilo psycopg2 e o diff das reflexões
+
+As traduções são as que o app usa (marcadores, ANY de listas, casts, %%);
+os demais testes rodam os comandos traduzidos num SQLite temporário.
+
+Uso:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import app
+import comum
+
+@pytest.mark.parametrize('sql, esperado', [
+    ('SELECT * FROM usuarios WHERE id = %s', 'SELECT * FROM usuarios WHERE id = ?'),
+    ('SELECT * FROM usuarios WHERE id = %(usuario_id)s', 'SELECT * FROM usuarios WHERE id = :usuario_id'),
+    ("SELECT * FROM usuarios WHERE senha LIKE 'scrypt$%%'", "SELECT * FROM usuarios WHERE senha LIKE 'scrypt$%'"),
+    ("strftime('%%Y-%%m-01', data_diagnostico)", "strftime('%Y-%m-01', data_diagnostico)"),
+    ('SELECT email FROM profissionais WHERE email = ANY(%s)',
+     'SELECT email FROM profissionais WHERE email IN (SELECT value FROM json_each(?))'),
+    ('WHERE pergunta = ANY(%(vazias)s::text[])', 'WHERE pergunta IN (SELECT value FROM json_each(:vazias))'),
+    ('WHERE id =ANY(%s::int[])', 'WHERE id IN (SELECT value FROM json_each(?))'),
+    ('SELECT %s::date, %(n)s::int', 'SELECT ?, :n'),
+    ('INSERT INTO dicas (texto) VALUES (%s) RETURNING id', 'INSERT INTO dicas (texto) VALUES (?) RETURNING id'),
+    ('ON CONFLICT (usuario_id) DO UPDATE SET nivel = excluded.nivel',
+     'ON CONFLICT (usuario_id) DO UPDATE SET nivel = excluded.nivel'),
+])
+def test_traduzir_sql_sqlite(sql, esperado):
+    assert app.traduzir_sql_sqlite(sql) == esperado
+
+@pytest.mark.parametrize('parametros, esperado', [
+    (None, ()),
+    ((1, 'a'), [1, 'a']),
+    (([1, 2],), ['[1, 2]']),
+    ({'vazias': ['a'], 'n': 1}, {'vazias': '["a"]', 'n': 1}),
+])
+def test_adaptar_parametros_sqlite(parametros, esperado):
+    assert app.adaptar_parametros_sqlite(parametros) == esperado
+
+@pytest.fixture
+def cursor(tmp_path):
+    comum.apontar_app_para_sqlite(str(tmp_path / 'dialeto.db'))
+    with app.get_db_connection() as conn:
+        app.aplicar_migracoes(conn)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO familias (nome) VALUES ('F') RETURNING id")
+        familia_id = cursor.fetchone()['id']
+        cursor.execute("INSERT INTO usuarios (nome, familia_id) VALUES ('A', %s), ('B', %s)",
+                       (familia_id, familia_id))
+        yield cursor
+        conn.rollback()
+    app.db_pool.fechar()
+
+def test_any_de_lista(cursor):
+    cursor.execute('SELECT nome FROM usuarios WHERE nome = ANY(%s) ORDER BY nome', (['B', 'X'],))
+    assert [linha['nome'] for linha in cursor.fetchall()] == ['B']
+
+def test_inserir_varias_divide_em_comandos(cursor, monkeypatch):
+    monkeypatch.setattr(app.db_pool.backend, 'max_parametros', 4)
+    linhas = app.db_pool.backend.inserir_varias(cursor, 'instituicoes', ('nome', 'tipo'),
+                                                [(f'I{n}', 'ONG') for n in range(5)], retorno='id, nome')
+    assert [linha['nome'] for linha in linhas] == [f'I{n}' for n in range(5)]
+    assert len({linha['id'] for linha in linhas}) == 5
+
+def test_inserir_diagnosticos_atualiza_ultimos(cursor):
+    primeiro = app.inserir_diagnostico(cursor, 1, 10, 'Moderado', {})
+    segundo = app.inserir_diagnostico(cursor, 1, 30, 'Dependente', {})
+    assert (primeiro['pontuacao_anterior'], segundo['pontuacao_anterior']) == (None, 10)
+    assert segundo['nivel_anterior'] == 'Moderado'
+    cursor.execute('SELECT diagnostico_id, pontuacao FROM ultimos_diagnosticos WHERE usuario_id = 1')
+    assert dict(cursor.fetchone()) == {'diagnostico_id': segundo['id'], 'pontuacao': 30}
+
+def reflexoes_salvas(cursor):
+    cursor.execute('SELECT pergunta, resposta FROM reflexoes WHERE usuario_id = 1')
+    return {linha['pergunta']: linha['resposta'] for linha in cursor.fetchall()}
+
+def test_diff_das_reflexoes(cursor, monkeypatch):
+    monkeypatch.setattr(app, 'VERSIONAR_REFLEXOES', False)
+    alteracoes = app.salvar_reflexoes(cursor, 1, {'p1': 'a', 'p2': 'b', 'p3': ' '})
+    assert alteracoes == {'inseridas': 2, 'atualizadas': 0, 'removidas': 0, 'versoes': 0}
+
+    alteracoes = app.salvar_reflexoes(cursor, 1, {'p1': 'a', 'p2': 'c'})
+    assert alteracoes == {'inseridas': 0, 'atualizadas': 1, 'removidas': 0, 'versoes': 0}
+
+    alteracoes = app.salvar_reflexoes(cursor, 1, {'p3': 'd'}, parcial=True)
+    assert alteracoes == {'inseridas': 1, 'atualizadas': 0, 'removidas': 0, 'versoes': 0}
+    assert reflexoes_salvas(cursor) == {'p1': 'a', 'p2': 'c', 'p3': 'd'}
+
+    alteracoes = app.salvar_reflexoes(cursor, 1, {'p1': '', 'p2': 'c'})
+    assert alteracoes == {'inseridas': 0, 'atualizadas': 0, 'removidas': 2, 'versoes': 0}
+    assert reflexoes_salvas(cursor) == {'p2': 'c'}
+
+@pytest.mark.parametrize('janela, versoes', [(-3600, 1), (3600, 0)])
+def test_versoes_das_reflexoes_respeitam_a_janela(cursor, monkeypatch, janela, versoes):
+    monkeypatch.setattr(app, 'VERSIONAR_REFLEXOES', True)
+    monkeypatch.setattr(app, 'JANELA_VERSAO_REFLEXOES', janela)
+    app.salvar_reflexoes(cursor, 1, {'p1': 'a'})
+    assert app.salvar_reflexoes(cursor, 1, {'p1': 'b'})['versoes'] == versoes
+    cursor.execute('SELECT resposta FROM reflexoes_versoes WHERE usuario_id = 1')
+    assert [linha['resposta'] for linha in cursor.fetchall()] == ['a'] * versoes